@@ -3,10 +3,10 @@
 import os
 import sys
 import pprint
-from itertools import repeat
+import marshal
 from collections import namedtuple
 from collections.abc import Mapping
-from ast import parse, walk, literal_eval, Import, ImportFrom
+from ast import parse, get_docstring, Import, ImportFrom
 
 ModNode = namedtuple('ModNode', ['name', 'pkgdeps', 'extdeps'])
 ModNode.__doc__ = """Module node for dependency graph.
@@ -113,179 +113,105 @@ def depsort(graph):
     return seder
 
 
-LAZY_IMPORTS = """
-from sys import modules as _modules
+LAZY_MODULES = """
+from sys import modules as _modules, implementation as _implementation
+from os.path import join as _join, dirname as _dirname
 from types import ModuleType as _ModuleType
-from importlib import import_module as _import_module
+from _thread import RLock as _RLock
+from marshal import loads as _loads
+from importlib.machinery import ModuleSpec as _ModuleSpec
+from importlib.machinery import SourceFileLoader as _SourceFileLoader
+try:
+    # used by importlib to point the code in .pyc files at their sources
+    from _imp import _fix_co_filename
+except ImportError:
+    def _fix_co_filename(code, path):
+        pass
 
+if _implementation.cache_tag != {cache_tag!r}:
+    raise ImportError('{pkg} was amalgamated by a different version of Python')
 
-class _LazyModule(_ModuleType):
+_PKG = __name__.rpartition('.')[0]
+_PKGDIR = _dirname(__file__)
+_LOCK = _RLock()
 
-    def __init__(self, pkg, mod, asname=None):
-        '''Lazy module 'pkg.mod' in package 'pkg'.'''
-        self.__dct__ = {
-            'loaded': False,
-            'pkg': pkg,  # pkg
-            'mod': mod,  # pkg.mod
-            'asname': asname,  # alias
-            }
-
-    @classmethod
-    def load(cls, pkg, mod, asname=None):
-        if mod in _modules:
-            return _modules[pkg]
-        else:
-            return cls(pkg, mod, asname)
-
-    def __getattribute__(self, name):
-        if name == '__dct__':
-            return super().__getattribute__(name)
-        dct = self.__dct__
-        mod = dct['mod']
-        if dct['loaded']:
-            m = _modules[mod]
-        else:
-            m = _import_module(mod)
-            glbs = globals()
-            pkg = dct['pkg']
-            asname = dct['asname']
-            if asname is None:
-                glbs[pkg] = _modules[pkg]
-            else:
-                glbs[asname] = m
-            dct['loaded'] = True
-        return getattr(m, name)
+
+class _LazyModule(_ModuleType):
+    '''A module whose code is run when one of its attributes is first used,
+    at which point it becomes a regular module.
+    '''
+
+    def __getattr__(self, name):
+        with _LOCK:
+            if type(self) is _LazyModule:
+                _run(self)
+        return getattr(self, name)
+
+
+def _run(mod):
+    '''Runs the code of a lazy module in its own namespace.'''
+    name = mod.__name__
+    base = name.rpartition('.')[2]
+    mod.__class__ = _ModuleType
+    try:
+        code = _loads(_CODES.pop(base)[1])
+        _fix_co_filename(code, mod.__file__)
+        exec(code, mod.__dict__)
+    except BaseException:
+        # as after a failed import, the next import starts over from the file
+        if _modules.get(name) is mod:
+            del _modules[name]
+        if getattr(_modules.get(_PKG), base, None) is mod:
+            delattr(_modules[_PKG], base)
+        raise
+
+
+def lazy_module(name):
+    '''Returns the lazy module for a module of the amalgamation, after
+    putting it in sys.modules.
+    '''
+    fullname = _PKG + '.' + name
+    mod = _LazyModule(fullname, _CODES[name][0])
+    fname = _join(_PKGDIR, name + '.py')
+    loader = _SourceFileLoader(fullname, fname)
+    mod.__spec__ = _ModuleSpec(fullname, loader, origin=fname)
+    mod.__spec__.has_location = True
+    mod.__loader__ = loader
+    mod.__file__ = fname
+    mod.__package__ = _PKG
+    _modules[fullname] = mod
+    return mod
 
 """
 
-def get_lineno(node, default=0):
-    """Gets the lineno of a node or returns the default."""
-    return getattr(node, 'lineno', default)
-
-
-def min_line(node):
-    """Computes the minimum lineno."""
-    node_line = get_lineno(node)
-    return min(map(get_lineno, walk(node), repeat(node_line)))
-
-
-def format_import(names):
-    """Format an import line"""
-    parts = []
-    for _, name, asname in names:
-        if asname is None:
-            parts.append(name)
-        else:
-            parts.append(name + ' as ' + asname)
-    line = 'import ' + ', '.join(parts) + '\n'
-    return line
-
-
-def format_lazy_import(names):
-    """Formats lazy import lines"""
-    lines = ''
-    for _, name, asname in names:
-        pkg, _, _ = name.partition('.')
-        target = asname or pkg
-        if asname is None:
-            line = '{pkg} = _LazyModule.load({pkg!r}, {mod!r})\n'
-        else:
-            line = '{asname} = _LazyModule.load({pkg!r}, {mod!r}, {asname!r})\n'
-        lines += line.format(pkg=pkg, mod=name, asname=asname)
-    return lines
-
-
-def format_from_import(names):
-    """Format a from import line"""
-    parts = []
-    for _, module, name, asname in names:
-        if asname is None:
-            parts.append(name)
-        else:
-            parts.append(name + ' as ' + asname)
-    line = 'from ' + module
-    line += ' import ' + ', '.join(parts) + '\n'
-    return line
-
-
-def rewrite_imports(name, pkg, order, imps):
-    """Rewrite the global imports in the file given the amalgamation."""
-    pkgdot = pkg + '.'
+
+def compile_module(name, pkg):
+    """Compiles the source code of a module, and returns its docstring and
+    its marshalled code.
+    """
     raw = SOURCES[pkg, name]
-    tree = parse(raw, filename=name)
-    replacements = []  # list of (startline, stopline, str) tuples
-    # collect replacements in forward direction
-    for a, b in zip(tree.body, tree.body[1:] + [None]):
-        if not isinstance(a, (Import, ImportFrom)):
-            continue
-        start = min_line(a) - 1
-        stop = len(tree.body) if b is None else min_line(b) - 1
-        if isinstance(a, Import):
-            keep = []
-            for n in a.names:
-                p, dot, m = n.name.rpartition('.')
-                if p == pkg and m in order:
-                    msg = ('Cannot amalgamate almagate import of '
-                           'amalgamated module:\n\n  import {0}.{1}\n'
-                           '\nin {0}/{2}.py').format(pkg, n.name, name)
-                    raise RuntimeError(msg)
-                imp = (Import, n.name, n.asname)
-                if imp not in imps:
-                    imps.add(imp)
-                    keep.append(imp)
-            if len(keep) == 0:
-                s = ', '.join(n.name for n in  a.names)
-                s = '# amalgamated ' + s + '\n'
-            else:
-                s = format_lazy_import(keep)
-            replacements.append((start, stop, s))
-        elif isinstance(a, ImportFrom):
-            p, dot, m = a.module.rpartition('.')
-            if a.module == pkg:
-                for n in a.names:
-                    if n.name in order:
-                        msg = ('Cannot amalgamate import of '
-                               'amalgamated module:\n\n  from {0} import {1}\n'
-                               '\nin {0}/{2}.py').format(pkg, n.name, name)
-                        raise RuntimeError(msg)
-            elif a.module.startswith(pkgdot) and p == pkg and m in order:
-                replacements.append((start, stop,
-                                     '# amalgamated ' + a.module + '\n'))
-            else:
-                keep = []
-                for n in a.names:
-                    imp = (ImportFrom, a.module, n.name, n.asname)
-                    if imp not in imps:
-                        imps.add(imp)
-                        keep.append(imp)
-                if len(keep) == len(a.names):
-                    continue  # all new imports
-                elif len(keep) == 0:
-                    s = ', '.join(n.name for n in a.names)
-                    s = '# amalgamated from ' + a.module + ' import ' + s + '\n'
-                else:
-                    s = format_from_import(keep)
-                replacements.append((start, stop, s))
-    # apply replacements in reverse
-    lines = raw.splitlines(keepends=True)
-    for start, stop, s in replacements[::-1]:
-        lines[start] = s
-        for i in range(stop - start - 1):
-            del lines[start+1]
-    return ''.join(lines)
+    fname = pkg.replace('.', '/') + '/' + name + '.py'
+    tree = parse(raw, filename=fname)
+    code = compile(tree, fname, 'exec', dont_inherit=True)
+    return get_docstring(tree, clean=False), marshal.dumps(code)
 
 
 def amalgamate(order, graph, pkg):
-    """Create amalgamated source."""
+    """Create amalgamated source. The code of every module is compiled ahead
+    of time, so that all of the modules are read from a single file, but the
+    code of a module is only run when the module is first used.
+    """
     src = ('\"\"\"Amalgamation of {0} package, made up of the following '
            'modules, in order:\n\n* ').format(pkg)
     src += '\n* '.join(order)
     src += '\n\n\"\"\"\n'
-    src += LAZY_IMPORTS
-    imps = set()
+    src += LAZY_MODULES.format(pkg=pkg,
+                               cache_tag=sys.implementation.cache_tag)
+    src += '_CODES = {\n'
     for name in order:
-        lines = rewrite_imports(name, pkg, order, imps)
-        src += '#\n# ' + name + '\n#\n' + lines + '\n'
+        doc, code = compile_module(name, pkg)
+        src += '    {0!r}: ({1!r},\n        {2!r}),\n'.format(name, doc, code)
+    src += '    }\n'
     return src
 
 
@@ -321,14 +247,12 @@ import os as _os
 if _os.getenv('{debug}', ''):
     pass
 else:
-    import sys as _sys
     try:
         from {pkg} import __amalgam__
         {load}
         del __amalgam__
     except ImportError:
         pass
-    del _sys
 del _os
 """.strip()
 
@@ -341,9 +265,8 @@ def rewrite_init(pkg, order, debug='DEBUG'):
             stop = i
         elif line.startswith('# amalgamate'):
             start = i
-    t = ("{1} = __amalgam__\n        "
-         "_sys.modules['{0}.{1}'] = __amalgam__")
-    load = '\n        '.join(t.format(pkg, m) for m in order)
+    t = "{0} = __amalgam__.lazy_module('{0}')"
+    load = '\n        '.join(t.format(m) for m in order)
     s = FAKE_LOAD.format(pkg=pkg, load=load, debug=debug)
     if start + 1 == stop:
         lines.insert(stop, s)
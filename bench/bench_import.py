@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+"""Benchmarks the wall time of importing xonsh, from its separate modules
+and from an amalgamation whose modules are run lazily or all eagerly.
+
+Usage::
+
+    $ python bench/bench_import.py --repeat 20 --stmt 'import xonsh.main'
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import amalgamate
+
+EAGER = ("import sys\n"
+         "for m in list(sys.modules.values()):\n"
+         "    if type(m).__name__ == '_LazyModule':\n"
+         "        getattr(m, '__all__', None)\n")
+
+
+def build(directory):
+    """Copies the xonsh package into a directory, and amalgamates it."""
+    shutil.copytree(os.path.join(ROOT, 'xonsh'),
+                    os.path.join(directory, 'xonsh'),
+                    ignore=shutil.ignore_patterns('__pycache__',
+                                                  '__amalgam__.py'))
+    cwd = os.getcwd()
+    os.chdir(directory)
+    try:
+        amalgamate.main(['amalgamate', '--debug=XONSH_DEBUG', 'xonsh'])
+    finally:
+        os.chdir(cwd)
+
+
+def run_time(argv, env, cwd):
+    """Returns the wall time, in seconds, to run a command to completion."""
+    t0 = time.perf_counter()
+    subprocess.check_call(argv, env=env, cwd=cwd, stdout=subprocess.DEVNULL)
+    return time.perf_counter() - t0
+
+
+def main(args=None):
+    p = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    p.add_argument('--stmt', default='from xonsh.main import main',
+                   help='Python statement that imports xonsh')
+    p.add_argument('--repeat', type=int, default=10,
+                   help='number of times to run each import')
+    ns = p.parse_args(args)
+    directory = tempfile.mkdtemp()
+    try:
+        build(directory)
+        env = dict(os.environ)
+        env.pop('XONSH_DEBUG', None)
+        env.pop('PYTHONDONTWRITEBYTECODE', None)
+        env['PYTHONPATH'] = os.pathsep.join(filter(None, [directory,
+                                                  env.get('PYTHONPATH')]))
+        modules_env = dict(env, XONSH_DEBUG='1')
+        runs = [('modules', ns.stmt, modules_env),
+                ('lazy', ns.stmt, env),
+                ('eager', 'import xonsh\n' + EAGER + ns.stmt, env)]
+        for name, stmt, e in runs:
+            argv = [sys.executable, '-c', stmt]
+            run_time(argv, e, directory)  # writes the .pyc files
+            times = [run_time(argv, e, directory) for _ in range(ns.repeat)]
+            print('{0:>7}: {1:9.2f} ms (median), {2:9.2f} ms (min)'.format(
+                  name, 1e3 * statistics.median(times), 1e3 * min(times)))
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
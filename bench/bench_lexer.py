@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+"""Benchmarks the throughput of the xonsh lexer, in tokens per second, with
+and without the fast, single regex tokenizer.
+
+Usage::
+
+    $ python bench/bench_lexer.py --repeat 5 xonsh/*.py
+"""
+import os
+import sys
+import glob
+import time
+import argparse
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from xonsh.lexer import Lexer
+
+
+def lex_time(lexer, src):
+    """Returns the number of tokens in a source, and the time in seconds that
+    it took the lexer to make them.
+    """
+    t0 = time.perf_counter()
+    lexer.input(src)
+    ntoks = sum(1 for _ in lexer)
+    return ntoks, time.perf_counter() - t0
+
+
+def main(args=None):
+    p = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    p.add_argument('files', nargs='*',
+                   help='files to lex, which default to the xonsh package')
+    p.add_argument('--repeat', type=int, default=5,
+                   help='number of times to lex the files')
+    ns = p.parse_args(args)
+    files = ns.files or sorted(glob.glob(os.path.join(ROOT, 'xonsh', '*.py')))
+    srcs = []
+    for fname in files:
+        with open(fname, encoding='utf-8') as f:
+            srcs.append(f.read())
+    lexer = Lexer()
+    for fast in (False, True):
+        lexer.fast = fast
+        best = None
+        for _ in range(ns.repeat):
+            ntoks = total = 0
+            for src in srcs:
+                n, t = lex_time(lexer, src)
+                ntoks += n
+                total += t
+            best = total if best is None else min(best, total)
+        print('{0:>5}: {1:9d} tokens in {2:7.3f} s, {3:9.0f} tokens/s'.format(
+              'fast' if fast else 'slow', ntoks, best, ntoks / best))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+"""Benchmarks converting a matplotlib figure into terminal text with the mpl
+xontrib, comparing the color template renderer with the vectorised ANSI
+renderer.
+
+Usage::
+
+    $ python bench/bench_mpl_render.py --width 200 --height 60
+"""
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+
+from xonsh.ansi_colors import partial_color_format
+from xontrib.mplhooks import buf_to_color_str, buf_to_ansi
+
+
+def render_figure(width, height):
+    """Draws a sample figure and returns it as an RGB array with the given
+    size in pixels.
+    """
+    fig = plt.figure()
+    dpi = fig.get_dpi()
+    fig.set_size_inches(width / dpi, height / dpi)
+    x = np.linspace(0, 4 * np.pi, 500)
+    ax = fig.gca()
+    for i in range(4):
+        ax.plot(x, np.sin(x + i), linewidth=2)
+    ax.imshow(np.outer(np.sin(x), np.cos(x)), extent=(0, 4 * np.pi, -1, 1),
+              aspect='auto', alpha=0.5)
+    fig.canvas.draw()
+    buf = np.asarray(fig.canvas.buffer_rgba())[:height, :width, :3]
+    plt.close(fig)
+    return np.ascontiguousarray(buf)
+
+
+def frame_time(func, repeat):
+    """Returns the mean time, in seconds, to call a function."""
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - t0) / repeat
+
+
+def main(args=None):
+    p = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    p.add_argument('--width', type=int, default=200,
+                   help='terminal width, in characters')
+    p.add_argument('--height', type=int, default=60,
+                   help='terminal height, in characters')
+    p.add_argument('--repeat', type=int, default=5,
+                   help='number of frames to time for each renderer')
+    ns = p.parse_args(args)
+    w, h = ns.width, ns.height
+    buf = render_figure(w, h)
+    buf2 = render_figure(w, 2 * h)
+    renderers = [
+        ('template', lambda: partial_color_format(buf_to_color_str(buf))),
+        ('ansi 256', lambda: buf_to_ansi(buf, half_blocks=False)),
+        ('ansi 256 half', lambda: buf_to_ansi(buf2)),
+        ('truecolor half', lambda: buf_to_ansi(buf2, truecolor=True)),
+    ]
+    for name, func in renderers:
+        t = frame_time(func, ns.repeat)
+        print('{0:>14}: {1:9.2f} ms per frame'.format(name, 1e3 * t))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+"""Benchmarks the time and memory that the xonsh parser takes for a large
+script, measuring the memory with tracemalloc.
+
+Usage::
+
+    $ python bench/bench_parser.py --lines 5000 --repeat 5
+"""
+import os
+import sys
+import time
+import argparse
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from xonsh.parser import Parser
+
+BLOCK = '''
+@memoize
+def func_{0}(x, y=1, *args, **kwargs):
+    """Docstring of func_{0}."""
+    total = {{'a': x, 'b': y}}
+    for i in range(x + y * 2):
+        if i % 3 == 0 and not args:
+            total.update(value=i ** 2 - x // 4)
+        elif i in (1, 2, 3):
+            continue
+        else:
+            total = max(total, key=lambda k: k.lower())
+    return total
+
+class Class{0}(object):
+    attr = [1, 2.0, 'three', b'four', None, True]
+
+    def method(self, *args):
+        with open(self.path) as f:
+            return f.read().strip().split(',')
+
+![ls -l $HOME | grep -v @(func_{0}(1)) > /dev/null]
+x = $(echo hello {0}).strip()
+'''
+
+
+def make_script(nlines):
+    """Returns a script of at least nlines lines."""
+    blocks = []
+    n = 0
+    while n < nlines:
+        block = BLOCK.format(len(blocks))
+        blocks.append(block)
+        n += block.count('\n')
+    return ''.join(blocks)
+
+
+def main(args=None):
+    p = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    p.add_argument('file', nargs='?', default=None,
+                   help='script to parse, which defaults to a generated one')
+    p.add_argument('--lines', type=int, default=5000,
+                   help='number of lines of the generated script')
+    p.add_argument('--repeat', type=int, default=5,
+                   help='number of times to parse the script')
+    ns = p.parse_args(args)
+    if ns.file is None:
+        src = make_script(ns.lines)
+    else:
+        with open(ns.file, encoding='utf-8') as f:
+            src = f.read()
+    parser = Parser(lexer_optimize=True, yacc_optimize=True, yacc_debug=False)
+    parser.parse(src)  # loads the parser tables
+    times = []
+    for _ in range(ns.repeat):
+        t0 = time.perf_counter()
+        parser.parse(src)
+        times.append(time.perf_counter() - t0)
+    tracemalloc.start()
+    parser.lexer.input(src)
+    toks = list(parser.lexer)
+    lex_mem = tracemalloc.get_traced_memory()[0]
+    del toks
+    tracemalloc.stop()  # restart to reset the peak
+    tracemalloc.start()
+    tree = parser.parse(src)
+    parse_mem = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    del tree
+    print('{0:>6}: {1:9d} lines'.format('script', src.count('\n') + 1))
+    print('{0:>6}: {1:9.2f} ms (min)'.format('time', 1e3 * min(times)))
+    print('{0:>6}: {1:9.2f} MiB of tokens'.format('lexer', lex_mem / 2**20))
+    print('{0:>6}: {1:9.2f} MiB (peak)'.format('parser', parse_mem / 2**20))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+"""Benchmarks TAB completion latency of paths in a directory with many files,
+with and without the shared directory listing cache.
+
+Usage::
+
+    $ python bench/bench_path_completion.py --files 50000
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import builtins
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from xonsh.tools import DIR_LISTING_CACHE
+from xonsh.completers.path import complete_path
+
+ENV = {
+    'CASE_SENSITIVE_COMPLETIONS': True,
+    'CDPATH': (),
+    'DIR_FRECENCY': False,
+    'FUZZY_PATH_COMPLETION': True,
+    'SUBSEQUENCE_PATH_COMPLETION': True,
+    'SUGGEST_THRESHOLD': 3,
+}
+
+PREFIXES = [
+    ('unique prefix', 'file_049999'),
+    ('common prefix', 'file_0499'),
+    ('subsequence', 'fl49999'),
+    ('no match', 'zzz'),
+]
+
+
+def make_files(d, n):
+    """Creates n empty files in a directory, and backdates the directory so
+    that its listing may be cached.
+    """
+    for i in range(n):
+        open(os.path.join(d, 'file_{0:06d}.txt'.format(i)), 'w').close()
+    os.utime(d, (0, 0))
+
+
+def tab_latency(prefix, repeat, cold):
+    """Returns the mean time, in seconds, to complete a prefix."""
+    times = []
+    for _ in range(repeat):
+        if cold:
+            DIR_LISTING_CACHE.clear()
+        t0 = time.perf_counter()
+        complete_path(prefix, 'ls ' + prefix, 3, 3 + len(prefix), {})
+        times.append(time.perf_counter() - t0)
+    return sum(times) / len(times)
+
+
+def main(args=None):
+    p = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    p.add_argument('--files', type=int, default=50000,
+                   help='number of files in the directory')
+    p.add_argument('--repeat', type=int, default=5,
+                   help='number of TABs to time for each prefix')
+    ns = p.parse_args(args)
+    builtins.__xonsh_env__ = ENV
+    builtins.__xonsh_expand_path__ = os.path.expanduser
+    d = tempfile.mkdtemp()
+    cwd = os.getcwd()
+    try:
+        make_files(d, ns.files)
+        os.chdir(d)
+        for name, prefix in PREFIXES:
+            cold = tab_latency(prefix, ns.repeat, True)
+            warm = tab_latency(prefix, ns.repeat, False)
+            print('{0:>14}: cold {1:9.2f} ms, cached {2:9.2f} ms per '
+                  'TAB'.format(name, 1e3 * cold, 1e3 * warm))
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(d)
+
+
+if __name__ == '__main__':
+    main()
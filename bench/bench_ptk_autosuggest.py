@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+"""Benchmarks the per-keystroke latency of history auto-suggestions in the
+prompt_toolkit shell, comparing prompt_toolkit's AutoSuggestFromHistory with
+xonsh's indexed PromptToolkitAutoSuggest.
+
+Usage::
+
+    $ python bench/bench_ptk_autosuggest.py --lines 200000
+"""
+import os
+import sys
+import time
+import random
+import argparse
+from collections import namedtuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from prompt_toolkit.auto_suggest import AutoSuggestFromHistory
+
+from xonsh.ptk.history import PromptToolkitHistory, PromptToolkitAutoSuggest
+
+Buffer = namedtuple('Buffer', ['history'])
+Document = namedtuple('Document', ['text'])
+
+WORDS = ['git', 'ls', 'cd', 'echo', 'make', 'python', 'grep', 'ssh', 'cat',
+         'status', 'commit', 'push', 'pull', 'build', 'test', 'install',
+         '-l', '-a', '--force', 'src', 'docs', 'xonsh', 'main.py', 'HEAD']
+
+
+def make_lines(n, seed=42):
+    """Makes n random, shell-like history lines."""
+    rng = random.Random(seed)
+    return [' '.join(rng.choice(WORDS) for _ in range(rng.randint(1, 6)))
+            for _ in range(n)]
+
+
+def keystroke_latency(suggester, history, typed):
+    """Returns the mean and worst time, in seconds, to compute a suggestion
+    after each keystroke of the typed strings.
+    """
+    buf = Buffer(history)
+    times = []
+    for s in typed:
+        for i in range(1, len(s) + 1):
+            doc = Document(s[:i])
+            t0 = time.perf_counter()
+            suggester.get_suggestion(None, buf, doc)
+            times.append(time.perf_counter() - t0)
+    return sum(times) / len(times), max(times)
+
+
+def main(args=None):
+    p = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    p.add_argument('--lines', type=int, default=200000,
+                   help='number of history lines')
+    p.add_argument('--typed', type=int, default=20,
+                   help='number of lines to type')
+    ns = p.parse_args(args)
+    lines = make_lines(ns.lines)
+    hist = PromptToolkitHistory(load_prev=False)
+    t0 = time.perf_counter()
+    hist.extend(lines)
+    print('loaded {0} lines in {1:.1f} ms'.format(
+          ns.lines, 1e3 * (time.perf_counter() - t0)))
+    # type some lines that are in the history and some that are not
+    typed = make_lines(ns.typed // 2, seed=1) + \
+        [l + ' zzz' for l in make_lines(ns.typed - ns.typed // 2, seed=2)]
+    for name, suggester in [('AutoSuggestFromHistory', AutoSuggestFromHistory()),
+                            ('PromptToolkitAutoSuggest',
+                             PromptToolkitAutoSuggest())]:
+        mean, worst = keystroke_latency(suggester, hist, typed)
+        print('{0:>26}: mean {1:8.3f} ms, worst {2:8.3f} ms per '
+              'keystroke'.format(name, 1e3 * mean, 1e3 * worst))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+"""Benchmarks the wall time of running a single command with ``xonsh -c``,
+which is dominated by starting xonsh.
+
+Usage::
+
+    $ python bench/bench_startup.py --repeat 20 --command 'echo hi'
+"""
+import os
+import sys
+import time
+import argparse
+import statistics
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def run_time(argv, env):
+    """Returns the wall time, in seconds, to run a command to completion."""
+    t0 = time.perf_counter()
+    subprocess.check_call(argv, env=env, stdout=subprocess.DEVNULL,
+                          stderr=subprocess.DEVNULL)
+    return time.perf_counter() - t0
+
+
+def main(args=None):
+    p = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    p.add_argument('--command', default='echo hi',
+                   help='xonsh command to run')
+    p.add_argument('--repeat', type=int, default=10,
+                   help='number of times to run xonsh')
+    p.add_argument('--rc', action='store_true', default=False,
+                   help='load the run control files, which are skipped by '
+                        'default')
+    ns = p.parse_args(args)
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [ROOT,
+                                              env.get('PYTHONPATH')]))
+    argv = [sys.executable, '-m', 'xonsh']
+    if not ns.rc:
+        argv.append('--no-rc')
+    argv += ['-c', ns.command]
+    run_time(argv, env)  # warms up the file system and code caches
+    times = [run_time(argv, env) for _ in range(ns.repeat)]
+    print('{0:>7}: {1:9.2f} ms'.format('min', 1e3 * min(times)))
+    print('{0:>7}: {1:9.2f} ms'.format('median',
+                                       1e3 * statistics.median(times)))
+    print('{0:>7}: {1:9.2f} ms'.format('mean', 1e3 * statistics.mean(times)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+"""Tests running subprocess pipelines from asyncio."""
+from __future__ import unicode_literals, print_function
+import os
+import time
+import signal
+import asyncio
+import builtins
+import tempfile
+from subprocess import CalledProcessError
+
+import nose
+from nose.plugins.skip import SkipTest
+from nose.tools import assert_equal, assert_raises, assert_less
+
+from xonsh import jobs
+from xonsh.environ import Env
+from xonsh.aioproc import (subproc_captured_stdout, subproc_captured_object,
+                           coroutine)
+from xonsh.platform import ON_WINDOWS
+
+from tools import mock_xonsh_env
+
+
+def _env(**kwargs):
+    env = Env(PATH=os.environ['PATH'].split(os.pathsep), **kwargs)
+    builtins.aliases = {}
+    return env
+
+
+def _run(aw):
+    loop = asyncio.new_event_loop()
+    # the child watcher needs a loop to add its handlers to
+    watcher = getattr(asyncio, 'get_child_watcher', lambda: None)()
+    asyncio.set_event_loop(loop)
+    if watcher is not None:
+        watcher.attach_loop(loop)
+    try:
+        return loop.run_until_complete(aw)
+    finally:
+        if watcher is not None:
+            watcher.attach_loop(None)
+        asyncio.set_event_loop(None)
+        loop.close()
+
+
+def test_captured_stdout():
+    if ON_WINDOWS:
+        raise SkipTest
+    with mock_xonsh_env(_env()):
+        obs = _run(subproc_captured_stdout(['echo', 'wakka']))
+        yield assert_equal, 'wakka\n', obs
+        obs = _run(subproc_captured_stdout(['printf', 'a\\nb\\nc\\n'], '|',
+                                           ['grep', '-v', 'b'], '|',
+                                           ['wc', '-l']))
+        yield assert_equal, '2', obs.strip()
+
+
+def test_captured_object():
+    if ON_WINDOWS:
+        raise SkipTest
+    with mock_xonsh_env(_env()):
+        obs = _run(subproc_captured_object(['sh', '-c', 'echo x; echo y >&2; '
+                                                        'exit 3']))
+        yield assert_equal, 'x\n', obs.stdout
+        yield assert_equal, 'y\n', obs.stderr
+        yield assert_equal, 3, obs.returncode
+
+
+def test_aliases_and_redirects():
+    if ON_WINDOWS:
+        raise SkipTest
+    with mock_xonsh_env(_env()):
+        builtins.aliases['up'] = lambda args, stdin: stdin.upper()
+        builtins.aliases['hi'] = ['echo', 'hi']
+        obs = _run(subproc_captured_stdout(['hi', 'there'], '|', ['up']))
+        yield assert_equal, 'HI THERE\n', obs
+        with tempfile.TemporaryDirectory() as d:
+            fname = os.path.join(d, 'out.txt')
+            _run(subproc_captured_stdout(['hi'], '|', ['up'], '|',
+                                         ['cat', '>', fname]))
+            with open(fname) as f:
+                yield assert_equal, 'HI\n', f.read()
+            obs = _run(subproc_captured_stdout(['cat', '<', fname]))
+            yield assert_equal, 'HI\n', obs
+
+
+def test_concurrent():
+    if ON_WINDOWS:
+        raise SkipTest
+    with mock_xonsh_env(_env()):
+        @coroutine
+        def main():
+            cmds = [subproc_captured_stdout(['sh', '-c', 'sleep 0.5; echo $0',
+                                             str(i)]) for i in range(5)]
+            return (yield from asyncio.gather(*cmds))
+        t0 = time.monotonic()
+        obs = _run(main())
+        yield assert_less, time.monotonic() - t0, 1.5
+        yield assert_equal, ['0\n', '1\n', '2\n', '3\n', '4\n'], obs
+
+
+def test_raise_subproc_error():
+    if ON_WINDOWS:
+        raise SkipTest
+    with mock_xonsh_env(_env(RAISE_SUBPROC_ERROR=True)):
+        yield assert_raises, CalledProcessError, _run, \
+            subproc_captured_stdout(['false'])
+
+
+def test_piped_foreground_alias():
+    if ON_WINDOWS:
+        raise SkipTest
+    with mock_xonsh_env(_env()):
+        def big(args, stdin, stdout, stderr):
+            stdout.write('x' * 200000)
+        big.__xonsh_backgroundable__ = False
+        builtins.aliases['big'] = big
+        # more than a pipe full of output, which the loop has to read
+        obs = _run(subproc_captured_stdout(['big'], '|', ['cat']))
+        yield assert_equal, 200000, len(obs)
+
+
+def test_sigchld_handler_chained():
+    if ON_WINDOWS or not hasattr(asyncio, 'SafeChildWatcher'):
+        raise SkipTest
+    with mock_xonsh_env(_env()):
+        jobs._install_sigchld_handler()
+        loop = asyncio.new_event_loop()
+        watcher = asyncio.SafeChildWatcher()
+        watcher.attach_loop(loop)
+        asyncio.set_child_watcher(watcher)
+        @coroutine
+        def main():
+            out = yield from subproc_captured_stdout(['echo', 'hi'],
+                                                     loop=loop)
+            return out, signal.getsignal(signal.SIGCHLD)
+        try:
+            obs, handler = loop.run_until_complete(main())
+        finally:
+            watcher.close()
+            asyncio.set_child_watcher(None)
+            loop.close()
+        yield assert_equal, 'hi\n', obs
+        yield assert_equal, jobs._sigchld_handler, handler
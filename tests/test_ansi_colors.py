@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+"""Tests ANSI color tools."""
+from __future__ import unicode_literals, print_function
+
+import nose
+from nose.plugins.skip import SkipTest
+from nose.tools import assert_equal, assert_is
+
+from xonsh.ansi_colors import (rgb_to_256, rgbs_to_256, compile_style,
+                               partial_color_format)
+
+
+def test_rgb_to_256():
+    cases = [('000000', ('16', '000000')),
+             ('#ffffff', ('231', 'ffffff')),
+             ('f00', ('196', 'ff0000')),
+             ('2f2f2f', ('16', '000000')),
+             ('303030', ('59', '5f5f5f')),
+             ('737373', ('102', '878787')),
+             ('', ('0', '000000'))]
+    for rgb, exp in cases:
+        yield assert_equal, exp, rgb_to_256(rgb)
+
+
+def test_rgbs_to_256():
+    try:
+        import numpy as np
+    except ImportError:
+        raise SkipTest
+    rgbs = [(r, g, b) for r in range(0, 256, 17) for g in (0, 47, 48, 200)
+            for b in (114, 115, 255)]
+    exp = [int(rgb_to_256('%02x%02x%02x' % rgb)[0]) for rgb in rgbs]
+    obs = rgbs_to_256(np.array(rgbs, dtype=np.uint8))
+    yield assert_equal, exp, obs.tolist()
+
+
+def test_compile_style():
+    codes = compile_style('default')
+    yield assert_equal, '\033[0;31m', codes['RED']
+    yield assert_is, codes, compile_style('default')
+    codes = compile_style('default', hide=True)
+    yield assert_equal, '\001\033[0;31m\002', codes['RED']
+
+
+def test_partial_color_format():
+    cases = [('{RED}x{NO_COLOR}', '\033[0;31mx\033[0m'),
+             ('{#ff0000}x', '\033[38;5;196mx'),
+             ('{bold_underline_#f00}x', '\033[1;4;38;5;196mx'),
+             ('{BACKGROUND_#abc}{user}', '\033[48;5;146m{user}')]
+    for template, exp in cases:
+        yield assert_equal, exp, partial_color_format(template)
+    obs = partial_color_format('{RED}{#f00}', cmap={'RED': '31'}, hide=True)
+    yield assert_equal, '\001\033[31m\002\001\033[38;5;196m\002', obs
@@ -32,3 +32,13 @@ def test_multilline_num():
     tree = check_parse(code)
     lsnode = tree.body[1]
     assert_equal(2, min_line(lsnode))
+
+
+def test_repeated_subproc_line():
+    code = ('ls -l\n'
+            'ls -l\n')  # the second line is transformed from the cache
+    tree = check_parse(code)
+    first, second = tree.body
+    assert_equal(1, min_line(first))
+    assert_equal(2, min_line(second))
+    assert first.value is not second.value
@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+"""Tests the compiled code cache."""
+from __future__ import unicode_literals, print_function
+import os
+import tempfile
+
+import nose
+from nose.plugins.skip import SkipTest
+from nose.tools import assert_equal, assert_not_equal, assert_is_none
+
+from xonsh.codecache import CodeCache, cache_key, file_cache_key, NSHARDS
+from xonsh.platform import ON_WINDOWS
+
+
+def test_cache_key():
+    key = cache_key('x = 1\n', 'a.xsh', 'exec')
+    yield assert_equal, key, cache_key(b'x = 1\n', 'a.xsh', 'exec')
+    yield assert_not_equal, key, cache_key('x = 2\n', 'a.xsh', 'exec')
+    yield assert_not_equal, key, cache_key('x = 1\n', 'b.xsh', 'exec')
+    yield assert_not_equal, key, cache_key('x = 1\n', 'a.xsh', 'single')
+
+
+def test_file_cache_key():
+    with tempfile.TemporaryDirectory() as d:
+        fname = os.path.join(d, 'a.xsh')
+        with open(fname, 'w') as f:
+            f.write('x = 1\n')
+        key, code = file_cache_key(fname, 'exec')
+        yield assert_is_none, code
+        yield assert_equal, key, file_cache_key(fname, 'exec')[0]
+        with open(fname, 'w') as f:
+            f.write('x = 10\n')
+        yield assert_not_equal, key, file_cache_key(fname, 'exec')[0]
+
+
+def test_fifo_cache_key():
+    if ON_WINDOWS:
+        raise SkipTest
+    with tempfile.TemporaryDirectory() as d:
+        fname = os.path.join(d, 'fifo')
+        os.mkfifo(fname)
+        pid = os.fork()
+        if pid == 0:
+            # the child must never return into the test runner
+            rtn = 1
+            try:
+                with open(fname, 'w') as f:
+                    f.write('x = 1\n')
+                rtn = 0
+            finally:
+                os._exit(rtn)
+        try:
+            key, code = file_cache_key(fname, 'exec')
+        finally:
+            # unblocks the child, in case nothing has opened the fifo
+            os.close(os.open(fname, os.O_RDONLY | os.O_NONBLOCK))
+            _, status = os.waitpid(pid, 0)
+        yield assert_equal, 0, status
+        yield assert_equal, 'x = 1\n', code
+        yield assert_equal, cache_key(code, fname, 'exec'), key
+
+
+def test_get_put():
+    with tempfile.TemporaryDirectory() as d:
+        cache = CodeCache(d)
+        key = cache_key('x = 1\n', 'a.xsh', 'exec')
+        yield assert_is_none, cache.get(key)
+        cache.put(key, compile('x = 1\n', 'a.xsh', 'exec'), 0.5)
+        code, ctime = cache.get(key)
+        ns = {}
+        exec(code, ns)
+        yield assert_equal, 1, ns['x']
+        yield assert_equal, 0.5, ctime
+        stats = dict(cache.stats())
+        yield assert_equal, 1, stats['entries']
+        yield assert_equal, (1, 1), (stats['hits'], stats['misses'])
+        cache.clear()
+        yield assert_is_none, cache.get(key)
+
+
+def test_evict():
+    with tempfile.TemporaryDirectory() as d:
+        code = compile('x = 1\n', 'a.xsh', 'exec')
+        cache = CodeCache(d)
+        keys = ['00' + str(i) * 38 for i in range(4)]
+        for i, key in enumerate(keys):
+            cache.put(key, code)
+            os.utime(cache._path(key), (i, i))
+        # a recently used entry survives
+        cache.get(keys[0])
+        cache.maxsize = 3 * os.path.getsize(cache._path(keys[0])) * NSHARDS
+        cache.put('00' + '9' * 38, code)
+        obs = [cache.get(key) is not None for key in keys]
+        yield assert_equal, [True, False, False, True], obs
+        yield assert_equal, 2, cache.evictions
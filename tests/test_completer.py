@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+"""Tests the concurrent completion pipeline."""
+from __future__ import unicode_literals, print_function
+import time
+import shutil
+import builtins
+import tempfile
+from collections import OrderedDict
+
+import nose
+from nose.tools import assert_equal
+
+from xonsh.completer import Completer
+
+from tools import mock_xonsh_env
+
+
+def _complete(completers, *queries):
+    tmp = tempfile.mkdtemp()
+    env = {'XONSH_DATA_DIR': tmp, 'BASH_COMPLETIONS': (),
+           'COMPLETER_TIMEOUT': 0.2}
+    old = getattr(builtins, '__xonsh_completers__', None)
+    builtins.__xonsh_completers__ = OrderedDict(completers)
+    try:
+        with mock_xonsh_env(env):
+            completer = Completer()
+            results = []
+            for q in queries:
+                if isinstance(q, float):
+                    time.sleep(q)
+                else:
+                    results.append(completer.complete(q, q, 0, len(q), {}))
+            return results
+    finally:
+        builtins.__xonsh_completers__ = old
+        shutil.rmtree(tmp)
+
+
+def _slow(prefix, line, begidx, endidx, ctx):
+    time.sleep(0.5)
+    return {prefix + 'slow'}
+
+
+def _fast(prefix, line, begidx, endidx, ctx):
+    return {prefix + 'fast'}
+
+
+def _none(prefix, line, begidx, endidx, ctx):
+    return set()
+
+
+def _stop(prefix, line, begidx, endidx, ctx):
+    if prefix == 'stop':
+        raise StopIteration
+    return set()
+
+
+def test_priority():
+    def slower(prefix, line, begidx, endidx, ctx):
+        time.sleep(0.05)
+        return {prefix + 'slower'}, 1
+    obs = _complete([('none', _none), ('slower', slower), ('fast', _fast)],
+                    'x')
+    yield assert_equal, [(('xslower',), 1)], obs
+    obs = _complete([('stop', _stop), ('fast', _fast)], 'stop', 'x')
+    yield assert_equal, [(set(), 4), (('xfast',), 1)], obs
+
+
+def test_timeout():
+    start = time.monotonic()
+    obs = _complete([('slow', _slow), ('fast', _fast)], 'x')
+    yield assert_equal, [(('xfast',), 1)], obs
+    yield nose.tools.assert_less, time.monotonic() - start, 0.5
+
+
+def test_lower_priority_not_started():
+    calls = []
+    def counted(prefix, line, begidx, endidx, ctx):
+        calls.append(prefix)
+        return {prefix + 'counted'}
+    obs = _complete([('fast', _fast), ('counted', counted)], 'x')
+    yield assert_equal, [(('xfast',), 1)], obs
+    yield assert_equal, [], calls
+
+
+def test_late_result():
+    calls = []
+    def slow(prefix, line, begidx, endidx, ctx):
+        calls.append(prefix)
+        return _slow(prefix, line, begidx, endidx, ctx)
+    # the slow completer misses its deadline for the first request, and is
+    # used for the same completion once it has finished
+    obs = _complete([('slow', slow), ('fast', _fast)], 'x', 0.5, 'x')
+    yield assert_equal, [(('xfast',), 1), (('xslow',), 1)], obs
+    yield assert_equal, ['x'], calls
+
+
+def test_timeout_attr():
+    def slow(prefix, line, begidx, endidx, ctx):
+        return _slow(prefix, line, begidx, endidx, ctx)
+    slow.timeout = None
+    obs = _complete([('slow', slow), ('fast', _fast)], 'x')
+    yield assert_equal, [(('xslow',), 1)], obs
+
+
+def test_narrowing():
+    calls = []
+    def words(prefix, line, begidx, endidx, ctx):
+        calls.append(prefix)
+        return {w for w in ('check', 'checkout', 'cherry-pick', 'clean')
+                if w.startswith(prefix)}
+    obs = _complete([('words', words)], 'ch', 'che', 'chec', 'checkx', 'c')
+    exp = [(('check', 'checkout', 'cherry-pick'), 2),
+           (('check', 'checkout', 'cherry-pick'), 3),
+           (('check', 'checkout'), 4),
+           (set(), 6),
+           (('check', 'checkout', 'cherry-pick', 'clean'), 1)]
+    yield assert_equal, exp, obs
+    yield assert_equal, ['ch', 'checkx', 'c'], calls
+    # typing a path separator starts over
+    del calls[:]
+    obs = _complete([('words', words)], 'ch', 'ch/')
+    yield assert_equal, ['ch', 'ch/'], calls
+
+
+def test_no_narrowing_of_subsequences():
+    calls = []
+    def subseq(prefix, line, begidx, endidx, ctx):
+        calls.append(prefix)
+        words = ('check', 'xcheck', 'cherry-pick')
+        return {w for w in words if set(prefix) <= set(w)}
+    obs = _complete([('subseq', subseq)], 'ch', 'che')
+    exp = [(('check', 'cherry-pick', 'xcheck'), 2),
+           (('check', 'cherry-pick', 'xcheck'), 3)]
+    yield assert_equal, exp, obs
+    yield assert_equal, ['ch', 'che'], calls
@@ -78,6 +78,22 @@ def test_format_prompt():
         obs = partial_format_prompt(template=p, formatter_dict=formatter_dict)
         yield assert_equal, exp, obs
 
+def test_format_prompt_field_deps():
+    calls = []
+    def f():
+        calls.append(builtins.__xonsh_env__['PWD'])
+        return builtins.__xonsh_env__['PWD']
+    f.deps = ('PWD',)
+    formatter_dict = {'f': f}
+    env = {'PWD': '/a'}
+    with mock_xonsh_env(env):
+        obs = [partial_format_prompt('{f} $ {RED}', formatter_dict)
+               for _ in range(3)]
+        env['PWD'] = '/b'
+        obs.append(format_prompt('{f} $', formatter_dict))
+    yield assert_equal, ['/a $ {RED}'] * 3 + ['/b $'], obs
+    yield assert_equal, ['/a', '/b'], calls
+
 def test_format_prompt_with_broken_template():
     for p in ('{user', '{user}{hostname'):
         assert_equal(partial_format_prompt(p), p)
@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+"""Tests the directory frecency database."""
+from __future__ import unicode_literals, print_function
+import os
+import shutil
+import tempfile
+
+import nose
+from nose.tools import assert_equal
+
+from xonsh.frecency import DirFrecency, frecency, HOUR, DAY, WEEK
+
+
+def test_frecency_weights():
+    yield assert_equal, 4.0, frecency(1.0, 0.0, HOUR / 2)
+    yield assert_equal, 2.0, frecency(1.0, 0.0, DAY / 2)
+    yield assert_equal, 0.5, frecency(1.0, 0.0, WEEK / 2)
+    yield assert_equal, 0.25, frecency(1.0, 0.0, 2 * WEEK)
+
+
+def test_visit_and_match():
+    tmp = tempfile.mkdtemp()
+    xonsh_dir = os.path.join(tmp, 'src', 'xonsh')
+    other_dir = os.path.join(tmp, 'src', 'other')
+    docs_dir = os.path.join(tmp, 'docs', 'Xonsh')
+    for d in (xonsh_dir, other_dir, docs_dir):
+        os.makedirs(d)
+    dbfile = os.path.join(tmp, 'frecency.txt')
+    db = DirFrecency(dbfile)
+    db.visit(xonsh_dir, now=0.0)
+    db.visit(xonsh_dir, now=0.0)
+    db.visit(other_dir, now=0.0)
+    db.visit(docs_dir, now=0.0)
+    db.visit(os.path.join(tmp, 'gone', 'xonsh'), now=0.0)
+    # case-sensitive matches win, missing directories are skipped
+    yield assert_equal, [(8.0, xonsh_dir)], db.matches(['xonsh'], now=1.0)
+    # terms must appear in order
+    obs = [p for _, p in db.matches(['src', 'o'], now=1.0)]
+    yield assert_equal, [xonsh_dir, other_dir], obs
+    obs = [p for _, p in db.matches(['src', 'o'], now=1.0, basename=True,
+                                    limit=1)]
+    yield assert_equal, [xonsh_dir], obs
+    # the database is persisted
+    db.flush()
+    obs = DirFrecency(dbfile).scores(now=1.0)
+    yield assert_equal, db.scores(now=1.0), obs
+    db.forget(xonsh_dir)
+    yield assert_equal, [], db.matches(['src', 'xonsh'], now=1.0)
+    shutil.rmtree(tmp)
+
+
+def test_aging():
+    tmp = tempfile.mkdtemp()
+    db = DirFrecency(os.path.join(tmp, 'frecency.txt'), max_rank=5.0,
+                     aging=0.5)
+    db.visit('/a', now=0.0)
+    for _ in range(5):
+        db.visit('/b', now=0.0)
+    # total rank exceeded 5, so everything was halved and /a was forgotten
+    yield assert_equal, [(10.0, '/b')], db.scores(now=1.0)
+    shutil.rmtree(tmp)
+
+
+def test_batched_writes():
+    tmp = tempfile.mkdtemp()
+    dbfile = os.path.join(tmp, 'frecency.txt')
+    db = DirFrecency(dbfile)
+    db.flush_every = 3
+    db.visit('/a', now=0.0)
+    db.visit('/b', now=0.0)
+    yield assert_equal, False, os.path.exists(dbfile)
+    yield assert_equal, [(4.0, '/a'), (4.0, '/b')], db.scores(now=1.0)
+    db.visit('/a', now=0.0)
+    yield assert_equal, [(8.0, '/a'), (4.0, '/b')], \
+        DirFrecency(dbfile).scores(now=1.0)
+    # visits from other processes are merged with the unwritten ones
+    other = DirFrecency(dbfile)
+    other.visit('/b', now=0.0)
+    other.flush()
+    db.visit('/b', now=0.0)
+    db.flush()
+    yield assert_equal, [(12.0, '/b'), (8.0, '/a')], \
+        DirFrecency(dbfile).scores(now=1.0)
+    shutil.rmtree(tmp)
+
+
+if __name__ == '__main__':
+    nose.runmodule()
@@ -8,12 +8,16 @@ from __future__ import unicode_literals, print_function
 import io
 import os
 import sys
+import shutil
+import tempfile
 
 import nose
-from nose.tools import assert_equal, assert_is_none, assert_is_not_none
+from nose.tools import (assert_equal, assert_is_none, assert_is_not_none,
+                        assert_false)
 
 from xonsh.lazyjson import LazyJSON
 from xonsh.history import History
+from xonsh.history_index import HistoryIndex
 from xonsh import history
 
 from tools import mock_xonsh_env
@@ -25,10 +29,19 @@ def test_hist_init():
     """Test initialization of the shell history."""
     FNAME = 'xonsh-SESSIONID.json'
     FNAME += '.init'
-    History(filename=FNAME, here='yup', **HIST_TEST_KWARGS)
+    hist = History(filename=FNAME, here='yup', ts=[0, None],
+                   **HIST_TEST_KWARGS)
+    # the file is only created once commands are flushed
+    yield assert_false, os.path.exists(FNAME)
+    hist.flush(at_exit=True)
+    yield assert_false, os.path.exists(FNAME)
+    with mock_xonsh_env({'HISTCONTROL': set()}):
+        hist.append({'inp': 'ls', 'rtn': 0})
+    hist.flush(at_exit=True)
     with LazyJSON(FNAME) as lj:
         obs = lj['here']
-    assert_equal('yup', obs)
+        yield assert_equal, 'yup', obs
+        yield assert_equal, 1, len(lj['cmds'])
     os.remove(FNAME)
 
 
@@ -41,7 +54,8 @@ def test_hist_append():
         hf = hist.append({'joco': 'still alive'})
     yield assert_is_none, hf
     yield assert_equal, 'still alive', hist.buffer[0]['joco']
-    os.remove(FNAME)
+    if os.path.isfile(FNAME):
+        os.remove(FNAME)
 
 
 def test_hist_flush():
@@ -162,7 +176,8 @@ def test_show_cmd():
             yield x
 
     sys.stdout = saved_stdout
-    os.remove(FNAME)
+    if os.path.isfile(FNAME):
+        os.remove(FNAME)
 
 def test_histcontrol():
     """Test HISTCONTROL=ignoredups,ignoreerr"""
@@ -223,7 +238,89 @@ def test_histcontrol():
         yield assert_equal, '/bin/ls', hist.buffer[-1]['inp']
         yield assert_equal, 0, hist.buffer[-1]['rtn']
 
-    os.remove(FNAME)
+    if os.path.isfile(FNAME):
+        os.remove(FNAME)
+
+
+def test_hist_scan_cache():
+    """Verify that history file scans only load changed files."""
+    data_dir = tempfile.mkdtemp()
+    fnames = [os.path.join(data_dir, 'xonsh-{0}.json'.format(i))
+              for i in range(3)]
+    for i, fname in enumerate(fnames):
+        hist = History(filename=fname, ts=[i, None], locked=False,
+                       **HIST_TEST_KWARGS)
+        with mock_xonsh_env({'HISTCONTROL': set()}):
+            hist.append({'inp': 'ls {0}\n'.format(i), 'rtn': 0,
+                         'ts': [i, i + 0.5]})
+        hist.flush(at_exit=True)
+    loaded = []
+
+    def loader(f):
+        loaded.append(f)
+        return history._hist_file_meta(f)
+
+    index = HistoryIndex(data_dir)
+    entries = history._hist_scan(data_dir, index=index, loader=loader)
+    yield assert_equal, 3, len(entries)
+    yield assert_equal, sorted(fnames), sorted(loaded)
+    yield assert_equal, [('ls 0\n', 0)], \
+        history._hist_file_inps(fnames[0], dict(entries)[fnames[0]])
+    # nothing has changed, so nothing should be reloaded or rewritten
+    del loaded[:]
+    index.set_scanned = None
+    entries = history._hist_scan(data_dir, index=index, loader=loader)
+    yield assert_equal, 3, len(entries)
+    yield assert_equal, [], loaded
+    yield assert_equal, 1, dict(entries)[fnames[0]]['ncmds']
+    # removed files are dropped
+    del index.set_scanned
+    os.remove(fnames[0])
+    entries = history._hist_scan(data_dir, index=index, loader=loader)
+    yield assert_equal, sorted(fnames[1:]), sorted(dict(entries))
+    yield assert_equal, [], loaded
+    yield assert_equal, sorted(os.path.basename(f) for f in fnames[1:]), \
+        sorted(index.scanned())
+    shutil.rmtree(data_dir)
+
+
+def test_hist_search():
+    """Verify that the history index finds commands from all sessions."""
+    data_dir = tempfile.mkdtemp()
+    cmds = [('git checkout master', 0, 'Switched to branch'),
+            ('git chekcout', 1, 'not a git command'),
+            ('echo hello', 0, 'hello')]
+    for i, (inp, rtn, out) in enumerate(cmds):
+        fname = os.path.join(data_dir, 'xonsh-{0}.json'.format(i))
+        # the second session is not indexed as it is flushed
+        hist = History(filename=fname, ts=[i, None], locked=False,
+                       index=(i != 1), **HIST_TEST_KWARGS)
+        with mock_xonsh_env({'HISTCONTROL': set(),
+                             'XONSH_HISTORY_INDEX': True}):
+            hist.append({'inp': inp, 'rtn': rtn, 'out': out,
+                         'ts': [i, i + 0.5]})
+            hist.flush(at_exit=True)
+    fname = os.path.join(data_dir, 'xonsh-current.json')
+    hist = History(filename=fname, index=True, **HIST_TEST_KWARGS)
+    with mock_xonsh_env({'HISTCONTROL': set()}):
+        hist.append({'inp': 'git checkout dev', 'rtn': 0, 'ts': [9, 9.5]})
+    inps = lambda results: [r['inp'] for r in results]
+    yield (assert_equal, ['git checkout master', 'git checkout dev'],
+           inps(hist.search('checkout')))
+    yield (assert_equal, ['git checkout master', 'git chekcout'],
+           inps(hist.search('git', rtn=None, before=5)))
+    yield assert_equal, ['git chekcout'], inps(hist.search('git', rtn=1))
+    yield assert_equal, ['echo hello'], inps(hist.search('HELL'))
+    yield (assert_equal, ['echo hello'],
+           inps(hist.search('hel', prefix=True)))
+    yield assert_equal, [], inps(hist.search('ell', prefix=True))
+    yield (assert_equal, ['git checkout master'],
+           inps(hist.search('branch', fields=('out',))))
+    yield assert_equal, [], inps(hist.search('branch', fields=('inp',)))
+    yield (assert_equal, ['git checkout dev'],
+           inps(hist.search('checkout', limit=1)))
+    yield assert_equal, [], inps(hist.search('checkout', limit=0))
+    shutil.rmtree(data_dir)
 
 
 if __name__ == '__main__':
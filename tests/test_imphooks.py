@@ -1,11 +1,16 @@
 # -*- coding: utf-8 -*-
 """Testing xonsh import hooks"""
 from __future__ import unicode_literals, print_function
+import os
+import sys
+import marshal
+import tempfile
+import importlib
 
 import nose
-from nose.tools import assert_equal
+from nose.tools import assert_equal, assert_true, assert_is_none
 
-from xonsh import imphooks  # noqa
+from xonsh import imphooks
 from xonsh import built_ins
 from xonsh.execer import Execer
 from xonsh.built_ins import load_builtins, unload_builtins
@@ -15,6 +20,7 @@ LOADED_HERE = False
 
 def setup():
     global LOADED_HERE
+    imphooks.install_hook()
     if built_ins.BUILTINS_LOADED:
         unload_builtins()  # make sure we have a clean env from other tests.
         load_builtins(execer=Execer())
@@ -45,6 +51,60 @@ def test_sub_import():
         from xpack.sub import sample
         assert_equal('hello mom jawaka\n', sample.x)
 
+def test_bytecode_cache():
+    dont_write_bytecode = sys.dont_write_bytecode
+    sys.dont_write_bytecode = False
+    try:
+        _check_bytecode_cache()
+    finally:
+        sys.dont_write_bytecode = dont_write_bytecode
+
+
+def _check_bytecode_cache():
+    with mock_xonsh_env({'PATH': []}), tempfile.TemporaryDirectory() as d:
+        fname = os.path.join(d, 'cached.xsh')
+        with open(fname, 'w') as f:
+            f.write('x = 42\n')
+        hook = imphooks.XonshImportHook()
+        hook._filenames['cached'] = fname
+        code = hook.get_code('cached')
+        cachefname = imphooks.cache_from_source(fname)
+        assert_true(os.path.isfile(cachefname))
+        # the cached code is used while the source is unchanged
+        with open(cachefname, 'rb') as f:
+            header = f.read(len(imphooks._cache_header(os.stat(fname))))
+        with open(cachefname, 'wb') as f:
+            f.write(header)
+            marshal.dump(compile('x = 1\n', fname, 'exec'), f)
+        ns = {}
+        exec(hook.get_code('cached'), ns)
+        assert_equal(1, ns['x'])
+        with open(fname, 'w') as f:
+            f.write('x = 420\n')
+        ns = {}
+        exec(hook.get_code('cached'), ns)
+        assert_equal(420, ns['x'])
+
+
+def test_find_spec_cache():
+    hook = imphooks.XonshImportHook()
+    with tempfile.TemporaryDirectory() as d:
+        assert_is_none(hook.find_spec('newmod', [d]))
+        st = os.stat(d)
+        with open(os.path.join(d, 'newmod.xsh'), 'w') as f:
+            f.write('x = 1\n')
+        os.utime(d, ns=(st.st_atime_ns, st.st_mtime_ns))
+        # the listing is stale until the directory changes or it is reset
+        assert_is_none(hook.find_spec('newmod', [d]))
+        sys.meta_path.append(hook)
+        try:
+            importlib.invalidate_caches()
+        finally:
+            sys.meta_path.remove(hook)
+        spec = hook.find_spec('newmod', [d])
+        assert_equal('newmod', spec.name)
+        assert_equal(os.path.join(d, 'newmod.xsh'), hook.get_filename('newmod'))
+
 
 if __name__ == '__main__':
     nose.runmodule()
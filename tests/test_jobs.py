@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+"""Tests job control."""
+from __future__ import unicode_literals, print_function
+import io
+import os
+import time
+import builtins
+import subprocess
+
+import nose
+from nose.plugins.skip import SkipTest
+from nose.tools import assert_equal
+
+from xonsh import jobs
+from xonsh.platform import ON_WINDOWS
+
+from tools import mock_xonsh_env
+
+
+def _add(cmd, bg=True):
+    # the process is held until its stdin is closed
+    proc = subprocess.Popen(cmd, stdin=subprocess.PIPE)
+    jobs.add_job({'cmds': [cmd], 'pids': [proc.pid], 'obj': proc, 'bg': bg})
+    return proc
+
+
+def _wait_for(cond, timeout=5.0):
+    end = time.monotonic() + timeout
+    while not cond() and time.monotonic() < end:
+        time.sleep(0.01)
+
+
+def test_background_jobs_reaped():
+    if ON_WINDOWS:
+        raise SkipTest
+    builtins.__xonsh_all_jobs__ = {}
+    with mock_xonsh_env({'XONSH_INTERACTIVE': True}):
+        procs = [_add(['cat']) for _ in range(50)]
+        held = _add(['cat'])
+        yield assert_equal, list(range(1, 52)), \
+            sorted(builtins.__xonsh_all_jobs__)
+        for p in procs:
+            p.stdin.close()
+        # the processes are reaped as they exit, without being polled
+        _wait_for(lambda: all(p.returncode is not None for p in procs))
+        yield assert_equal, [0] * 50, [p.returncode for p in procs]
+        out = io.StringIO()
+        jobs.print_job_notices(outfile=out)
+        notices = out.getvalue().splitlines()
+        yield assert_equal, 50, len(notices)
+        obs = [n for n in notices if ' done: cat & (' in n]
+        yield assert_equal, notices, obs
+        yield assert_equal, [51], list(builtins.__xonsh_all_jobs__)
+        # free job numbers are reused, lowest first
+        yield assert_equal, 1, jobs.get_next_job_number()
+        held.stdin.close()
+        _wait_for(lambda: held.returncode is not None)
+        jobs.print_job_notices(outfile=io.StringIO())
+        yield assert_equal, {}, builtins.__xonsh_all_jobs__
+
+
+def test_instant_background_jobs_reaped():
+    if ON_WINDOWS:
+        raise SkipTest
+    builtins.__xonsh_all_jobs__ = {}
+    with mock_xonsh_env({'XONSH_INTERACTIVE': False}):
+        # the processes may exit before their jobs are added
+        procs = []
+        for _ in range(200):
+            proc = subprocess.Popen(['true'])
+            procs.append(proc)
+            jobs.add_job({'cmds': [['true']], 'pids': [proc.pid],
+                          'obj': proc, 'bg': True})
+        _wait_for(lambda: all(p.returncode is not None for p in procs))
+        yield assert_equal, [0] * 200, [p.returncode for p in procs]
+        jobs.print_job_notices(outfile=io.StringIO())
+        yield assert_equal, {}, builtins.__xonsh_all_jobs__
+
+
+def test_proxy_pid_not_watched():
+    if ON_WINDOWS:
+        raise SkipTest
+    builtins.__xonsh_all_jobs__ = {}
+    with mock_xonsh_env({'XONSH_INTERACTIVE': True}):
+        proc = subprocess.Popen(['cat'], stdin=subprocess.PIPE)
+        num = jobs.add_job({'cmds': [['f'], ['cat']],
+                            'pids': [os.getpid(), proc.pid], 'obj': proc,
+                            'bg': True})
+        yield assert_equal, 1, builtins.__xonsh_all_jobs__[num]['nalive']
+        yield assert_equal, False, os.getpid() in jobs._pid_jobs
+        proc.stdin.close()
+        _wait_for(lambda: proc.returncode is not None)
+        jobs.print_job_notices(outfile=io.StringIO())
+        yield assert_equal, {}, builtins.__xonsh_all_jobs__
+
+
+if __name__ == '__main__':
+    nose.runmodule()
@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+"""Tests the lazy and self destructive containers."""
+from __future__ import unicode_literals, print_function
+
+import nose
+from nose.tools import assert_equal, assert_true, assert_false, assert_in
+
+from xonsh.lazyasd import LazyObject, LazyDict
+
+
+def test_lazy_dict_contains():
+    loaded = []
+    def loader(key):
+        def load():
+            loaded.append(key)
+            return key.upper()
+        return load
+    ctx = {}
+    d = LazyDict({'a': loader('a'), 'b': loader('b')}, ctx, 'd')
+    yield assert_true, 'a' in d
+    yield assert_false, 'c' in d
+    yield assert_equal, [], loaded
+    yield assert_equal, 'A', d['a']
+    yield assert_equal, ['a'], loaded
+    del d['a']
+    yield assert_false, 'a' in d
+    yield assert_equal, 'B', d['b']
+    # once everything is loaded, the dict replaces the lazy one
+    yield assert_equal, {'b': 'B'}, ctx['d']
+
+
+def test_lazy_object_mapping():
+    ctx = {}
+    obj = LazyObject(lambda: {'x': 1}, ctx, 'obj')
+    yield assert_in, 'x', obj
+    yield assert_equal, 1, obj['x']
+    yield assert_equal, {'x': 1}, dict(obj)
+    yield assert_equal, 1, len(obj)
+    yield assert_equal, {'x': 1}, ctx['obj']
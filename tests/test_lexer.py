@@ -9,13 +9,7 @@ from pprint import pformat
 
 import nose
 
-try:
-    from ply.lex import LexToken
-except ImportError:
-    from xonsh.ply.lex import LexToken
-    
-
-from xonsh.lexer import Lexer
+from xonsh.lexer import Lexer, LexToken
 
 LEXER_ARGS = {'lextab': 'lexer_test_table', 'debug': 0}
 
@@ -59,26 +53,36 @@ def assert_tokens_equal(x, y):
         msg = '\n'.join(msg)
         raise AssertionError(msg)
 
-def check_token(inp, exp):
+def lex_input(inp, fast=True):
     l = Lexer()
+    l.fast = fast
     l.input(inp)
-    obs = list(l)
-    if len(obs) != 1:
-        msg = 'The observed sequence does not have length-1: {0!r} != 1\n'
-        msg += '# obs\n{1}'
-        raise AssertionError(msg.format(len(obs), pformat(obs)))
-    assert_token_equal(exp, obs[0])
+    return list(l)
+
+def check_token(inp, exp):
+    for fast in (True, False):
+        obs = lex_input(inp, fast=fast)
+        if len(obs) != 1:
+            msg = 'The observed sequence does not have length-1: {0!r} != 1\n'
+            msg += '# obs\n{1}'
+            raise AssertionError(msg.format(len(obs), pformat(obs)))
+        assert_token_equal(exp, obs[0])
 
 def check_tokens(inp, exp):
-    l = Lexer()
-    l.input(inp)
-    obs = list(l)
-    assert_tokens_equal(exp, obs)
+    for fast in (True, False):
+        obs = lex_input(inp, fast=fast)
+        assert_tokens_equal(exp, obs)
 
 def check_tokens_subproc(inp, exp):
-    l = Lexer()
-    l.input('$[{}]'.format(inp))
-    obs = list(l)[1:-1]
+    for fast in (True, False):
+        obs = lex_input('$[{}]'.format(inp), fast=fast)[1:-1]
+        assert_tokens_equal(exp, obs)
+
+def check_fast_tokens(inp):
+    exp = [(t.type, t.value, t.lineno, t.lexpos)
+           for t in lex_input(inp, fast=False)]
+    obs = [(t.type, t.value, t.lineno, t.lexpos)
+           for t in lex_input(inp, fast=True)]
     assert_tokens_equal(exp, obs)
 
 def test_int_literal():
@@ -205,6 +209,23 @@ def test_ioredir():
     for s in cases:
         yield check_tokens_subproc, s, [('IOREDIRECT', s, 2)]
 
+def test_fast_tokens():
+    cases = ['x = """yo\n  ma"""\nif x:\n    y(1,\n      2)\n  \n# c\nz\n',
+             'if x:\n\tif y:\n\t\tpass\n\nelse:\n  z\n',
+             'ls -l  |\tgrep x > out.txt && echo $HOME', '![ls  -l\n]',
+             '$(echo @(x + 1) "y") or not z', 'x = (1,\n2', "x = '''yo",
+             'x = 1)', 'x = ]', 'ls -l\\\n  -a', '$[echo $x, ${y}]',
+             "f(x)[1:2] ** -3.0e5j != 0o17 and r'x' in b'y'"]
+    fname = os.path.join(os.path.dirname(__file__), 'sample.xsh')
+    with open(fname) as f:
+        cases.append(f.read())
+    for inp in cases:
+        yield check_fast_tokens, inp
+
+def test_token_has_no_dict():
+    tok = lex_input('x')[0]
+    assert not hasattr(tok, '__dict__')
+
 
 if __name__ == '__main__':
     nose.runmodule()
@@ -1,13 +1,15 @@
 # -*- coding: utf-8 -*-
 import os
+import gzip
+import sqlite3
 import tempfile
 
 import nose
-from nose.tools import assert_true
+from nose.tools import assert_true, assert_equal
 from nose.plugins.skip import SkipTest
 
 from xonsh.tools import ON_WINDOWS
-from xonsh.completers.man import complete_from_man
+from xonsh.completers.man import complete_from_man, parse_options, ManIndex
 
 from tools import mock_xonsh_env
 
@@ -37,5 +39,58 @@ def test_man_completion():
         assert_true('--help' in completions)
 
 
+def test_parse_options():
+    text = ('.TP\n'
+            '\\fB\\-a\\fR, \\fB\\-\\-all\\fR\n'
+            'do not ignore entries starting with .\n'
+            '.TP\n'
+            '.BR \\-v ", " \\-\\-verbose\n'
+            '.It Fl l\n'
+            'use a long listing format\n')
+    obs = parse_options(text)
+    yield assert_equal, ['-a', '--all', '-v', '--verbose', '-l'], obs
+
+
+def test_man_index():
+    with tempfile.TemporaryDirectory() as tempdir:
+        man1 = os.path.join(tempdir, 'man', 'man1')
+        os.makedirs(man1)
+        page = os.path.join(man1, 'frob.1.gz')
+        with gzip.open(page, 'wb') as f:
+            f.write(b'.TP\n\\fB\\-\\-frob\\fR\nfrobs\n')
+        index = ManIndex(os.path.join(tempdir, 'index.sqlite'),
+                         dirs=[os.path.join(tempdir, 'man')])
+        index.update()
+        yield assert_equal, ['--frob'], index.options('frob')
+        yield assert_equal, None, index.options('nope')
+        # a changed page is parsed again
+        with gzip.open(page, 'wb') as f:
+            f.write(b'.TP\n\\fB\\-\\-frobnicate\\fR\nfrobs\n')
+        st = os.stat(page)
+        os.utime(page, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+        yield assert_equal, ['--frobnicate'], index.options('frob')
+
+
+def test_man_index_batches():
+    with tempfile.TemporaryDirectory() as tempdir:
+        man1 = os.path.join(tempdir, 'man', 'man1')
+        os.makedirs(man1)
+        names = ['frob{}'.format(i) for i in range(5)]
+        for name in names:
+            with gzip.open(os.path.join(man1, name + '.1.gz'), 'wb') as f:
+                f.write(b'.TP\n\\fB\\-\\-' + name.encode() + b'\\fR\nx\n')
+        fname = os.path.join(tempdir, 'index.sqlite')
+        index = ManIndex(fname, dirs=[os.path.join(tempdir, 'man')])
+        index.update(batch_size=2)
+        conn = sqlite3.connect(fname)
+        try:
+            obs = conn.execute('SELECT cmd FROM pages ORDER BY cmd').fetchall()
+        finally:
+            conn.close()
+        yield assert_equal, names, [row[0] for row in obs]
+        for name in names:
+            yield assert_equal, ['--' + name], index.options(name)
+
+
 if __name__ == '__main__':
     nose.runmodule()
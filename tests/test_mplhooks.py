@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+"""Tests the matplotlib xontrib's terminal renderer."""
+from __future__ import unicode_literals, print_function
+
+import nose
+from nose.plugins.skip import SkipTest
+from nose.tools import assert_equal
+
+try:
+    import numpy as np
+    from xontrib.mplhooks import buf_to_ansi
+except ImportError:
+    np = None
+
+RED, BLUE, BLACK, WHITE = (255, 0, 0), (0, 0, 255), (0, 0, 0), (255, 255, 255)
+
+
+def _buf():
+    return np.array([[RED, RED, BLUE], [BLACK, BLACK, BLACK],
+                     [WHITE, WHITE, WHITE]], dtype=np.uint8)
+
+
+def test_buf_to_ansi():
+    if np is None:
+        raise SkipTest
+    exp = ('\033[48;5;196m  \033[48;5;21m \033[0m\n'
+           '\033[48;5;16m   \033[0m\n'
+           '\033[48;5;231m   \033[0m')
+    yield assert_equal, exp, buf_to_ansi(_buf(), half_blocks=False)
+
+
+def test_buf_to_ansi_half_blocks():
+    if np is None:
+        raise SkipTest
+    exp = ('\033[38;5;196;48;5;16m▀▀'
+           '\033[38;5;21;48;5;16m▀\033[0m\n'
+           '\033[38;5;231;48;5;231m▀▀▀\033[0m')
+    yield assert_equal, exp, buf_to_ansi(_buf())
+    exp = ('\033[38;2;255;0;0;48;2;0;0;0m▀▀'
+           '\033[38;2;0;0;255;48;2;0;0;0m▀\033[0m\n'
+           '\033[38;2;255;255;255;48;2;255;255;255m▀▀▀\033[0m')
+    yield assert_equal, exp, buf_to_ansi(_buf(), truecolor=True)
@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+"""Tests running commands in parallel."""
+from __future__ import unicode_literals, print_function
+import os
+import time
+import builtins
+from subprocess import CalledProcessError
+
+import nose
+from nose.plugins.skip import SkipTest
+from nose.tools import assert_equal, assert_raises, assert_less
+
+from xonsh.environ import Env
+from xonsh.parallel import parallel, iparallel
+from xonsh.platform import ON_WINDOWS
+
+from tools import mock_xonsh_env
+
+
+def _env(**kwargs):
+    env = Env(PATH=os.environ['PATH'].split(os.pathsep), **kwargs)
+    builtins.aliases = {}
+    builtins.__xonsh_all_jobs__ = {}
+    return env
+
+
+def _sleep_echo(i, n):
+    return ['sh', '-c', 'sleep 0.{0}; echo $0'.format(n - i), str(i)]
+
+
+def test_parallel():
+    if ON_WINDOWS:
+        raise SkipTest
+    with mock_xonsh_env(_env()):
+        t0 = time.monotonic()
+        obs = [c.stdout for c in parallel([_sleep_echo(i, 5)
+                                           for i in range(5)], jobs=5)]
+        yield assert_less, time.monotonic() - t0, 0.9
+        yield assert_equal, ['0\n', '1\n', '2\n', '3\n', '4\n'], obs
+        obs = [c.stdout for c in iparallel([_sleep_echo(i, 3)
+                                            for i in range(3)],
+                                           jobs=3, ordered=False)]
+        yield assert_equal, ['2\n', '1\n', '0\n'], obs
+        obs = [c.returncode for c in parallel([['false'], ['true']],
+                                              jobs=1)]
+        yield assert_equal, [1, 0], obs
+        yield assert_equal, {}, builtins.__xonsh_all_jobs__
+
+
+def test_parallel_raise():
+    if ON_WINDOWS:
+        raise SkipTest
+    with mock_xonsh_env(_env(RAISE_SUBPROC_ERROR=True)):
+        yield assert_raises, CalledProcessError, parallel, \
+            [['true'], ['false'], ['sleep', '5']]
+        yield assert_equal, {}, builtins.__xonsh_all_jobs__
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+"""Tests the incremental prompt_toolkit highlighter."""
+import builtins
+
+import nose
+from nose.tools import assert_equal
+
+
+def is_prompt_toolkit_available():
+    try:
+        import prompt_toolkit
+        return True
+    except ImportError:
+        return False
+
+if not is_prompt_toolkit_available():
+    from nose.plugins.skip import SkipTest
+    raise SkipTest('prompt_toolkit is not available')
+
+
+from pygments.token import Error, Keyword, Name
+
+from xonsh.ptk.highlighter import Highlighter
+
+from tools import mock_xonsh_env
+
+
+class DummyCommandsCache(object):
+    def lazyin(self, value):
+        return value in {'ls', 'grep'}
+
+
+SRC = '''ls -l | grep x
+x = $(ls)
+nosuchcmd
+def f(y):
+    """doc
+    """
+    return y'''.split('\n')
+
+
+def highlight(lines, highlighter=None):
+    with mock_xonsh_env({}):
+        builtins.__xonsh_commands_cache__ = DummyCommandsCache()
+        builtins.aliases = {'ll': None}
+        highlighter = highlighter or Highlighter(ctx={'x': 1})
+        try:
+            return highlighter.highlight(lines)
+        finally:
+            del builtins.__xonsh_commands_cache__
+
+
+def test_highlight():
+    obs = highlight(SRC)
+    for line, frags in zip(SRC, obs):
+        yield assert_equal, line, ''.join(text for _, text in frags)
+    yield assert_equal, (Name.Builtin, 'ls'), obs[0][0]
+    yield assert_equal, (Name.Builtin, 'grep'), obs[0][-3]
+    yield assert_equal, (Name, 'x'), obs[1][0]
+    yield assert_equal, (Keyword, '$('), obs[1][4]
+    yield assert_equal, (Error, 'nosuchcmd'), obs[2][0]
+    yield assert_equal, (Keyword, 'def'), obs[3][0]
+
+
+def test_incremental():
+    h = Highlighter(ctx={'x': 1})
+    highlight(SRC, h)
+    yield assert_equal, len(SRC), h.ntokenized
+    lines = list(SRC)
+    lines[6] = '    return y + 1'
+    obs = highlight(lines, h)
+    yield assert_equal, highlight(lines), obs
+    # only the function is tokenized again
+    yield assert_equal, 4, h.ntokenized
+    lines[4] = '    """doc'
+    lines[5] = '    return y'
+    del lines[6]
+    obs = highlight(lines, h)
+    yield assert_equal, highlight(lines), obs
+
+
+if __name__ == '__main__':
+    nose.runmodule()
@@ -29,5 +29,32 @@ def test_obj():
     yield assert_equal, ['line10'], [x for x in history_obj]
 
 
+def test_most_recent_with_prefix():
+    history_obj = PromptToolkitHistory(load_prev=False)
+    history_obj.extend(['ls -l', 'git status', 'git commit'])
+    history_obj.append('echo hi\nls')
+    yield assert_equal, 'git commit', history_obj.most_recent_with_prefix('g')
+    yield assert_equal, 'ls', history_obj.most_recent_with_prefix('l')
+    yield assert_equal, 'ls -l', history_obj.most_recent_with_prefix('ls ')
+    yield assert_equal, None, history_obj.most_recent_with_prefix('x')
+    history_obj.append('git status')
+    yield (assert_equal, 'git status',
+           history_obj.most_recent_with_prefix('git '))
+    yield assert_equal, 5, len(history_obj)
+    yield (assert_equal, 'git status',
+           history_obj.most_recent_with_prefix('git'))
+    # prefixes that end within, or leave, a shared part of the lines
+    history_obj.extend(['git stash', 'git', 'git s'])
+    yield assert_equal, 'git s', history_obj.most_recent_with_prefix('git')
+    yield (assert_equal, 'git stash',
+           history_obj.most_recent_with_prefix('git sta'))
+    yield (assert_equal, 'git status',
+           history_obj.most_recent_with_prefix('git statu'))
+    yield assert_equal, None, history_obj.most_recent_with_prefix('git x')
+    yield (assert_equal, None,
+           history_obj.most_recent_with_prefix('git status -v'))
+    yield assert_equal, 'git s', history_obj.most_recent_with_prefix('')
+
+
 if __name__ == '__main__':
     nose.runmodule()
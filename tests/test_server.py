@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+"""Tests the xonsh server and its client."""
+from __future__ import unicode_literals, print_function
+import os
+import socket
+import tempfile
+
+import nose
+from nose.plugins.skip import SkipTest
+from nose.tools import assert_equal
+
+from xonsh.environ import Env
+from xonsh import server
+
+
+def test_request_roundtrip():
+    if not server.can_serve():
+        raise SkipTest
+    a, b = socket.socketpair(socket.AF_UNIX, socket.SOCK_STREAM)
+    env = {'PATH': '/bin', 'X': 'y' * 100000, 'BAD': '\udcff'}
+    with tempfile.TemporaryFile() as f0, tempfile.TemporaryFile() as f1:
+        fds = (f0.fileno(), f1.fileno(), f1.fileno())
+        server.send_request(a, ['-c', 'echo hi'], '/tmp', env, fds=fds)
+        req, rfds = server.recv_request(b)
+        try:
+            yield assert_equal, ['-c', 'echo hi'], req['argv']
+            yield assert_equal, '/tmp', req['cwd']
+            yield assert_equal, env, req['env']
+            inodes = [os.fstat(fd).st_ino for fd in fds]
+            yield assert_equal, inodes, [os.fstat(fd).st_ino for fd in rfds]
+        finally:
+            for fd in rfds:
+                os.close(fd)
+    a.close()
+    b.close()
+
+
+def test_exit_code():
+    if not server.can_serve():
+        raise SkipTest
+    pid = os.fork()
+    if pid == 0:
+        os._exit(3)
+    _, status = os.waitpid(pid, 0)
+    yield assert_equal, 3, server.exit_code(status)
+    pid = os.fork()
+    if pid == 0:
+        os.kill(os.getpid(), 9)
+    _, status = os.waitpid(pid, 0)
+    yield assert_equal, 137, server.exit_code(status)
+
+
+def test_update_env():
+    base = {'PATH': '/bin', 'HOME': '/root', 'GONE': '1'}
+    env = Env(PATH=['/bin', '/rc/bin'], HOME='/root', GONE='1', RC='rc')
+    server._update_env(env, {'PATH': '/bin', 'HOME': '/home/x', 'NEW': '2'},
+                       base)
+    # PATH wasn't changed by the client, so keeps the value of the rc files
+    yield assert_equal, ['/bin', '/rc/bin'], list(env['PATH'])
+    yield assert_equal, '/home/x', env['HOME']
+    yield assert_equal, '2', env['NEW']
+    yield assert_equal, 'rc', env['RC']
+    yield assert_equal, None, env.get('GONE')
@@ -12,7 +12,7 @@ from xonsh.platform import ON_WINDOWS
 from xonsh.lexer import Lexer
 
 from xonsh.tools import (
-    CommandsCache, EnvPath, always_false, always_true, argvquote,
+    CommandsCache, DirListingCache, EnvPath, always_false, always_true, argvquote,
     bool_or_int_to_str, bool_to_str, check_for_partial_string,
     dynamic_cwd_tuple_to_str, ensure_int_or_slice, ensure_string,
     env_path_to_str, escape_windows_cmd_string, executables_in,
@@ -21,7 +21,7 @@ from xonsh.tools import (
     is_int_as_str, is_logfile_opt, is_slice_as_str, is_string,
     is_string_or_callable, logfile_opt_to_str, str_to_env_path,
     subexpr_from_unbalanced, subproc_toks, to_bool, to_bool_or_int,
-    to_dynamic_cwd_tuple, to_logfile_opt)
+    to_dynamic_cwd_tuple, to_logfile_opt, cached_iglob)
 
 LEXER = Lexer()
 LEXER.build()
@@ -299,6 +299,17 @@ def test_subproc_toks_pyeval_redirect():
     assert_equal(exp, obs)
 
 
+def test_subproc_toks_line_toks():
+    s = INDENT + 'ls -l'
+    LEXER.input(s)
+    toks = list(LEXER)
+    types = [t.type for t in toks]
+    exp = subproc_toks(s, mincol=len(INDENT), lexer=LEXER, returnline=True)
+    obs = subproc_toks(s, mincol=len(INDENT), returnline=True, line_toks=toks)
+    assert_equal(exp, obs)
+    assert_equal(types, [t.type for t in toks])
+
+
 def test_subexpr_from_unbalanced_parens():
     cases = [
         ('f(x.', 'x.'),
@@ -820,5 +831,57 @@ def test_commands_cache_lazy():
     yield assert_equal, 0, cc.lazylen()
 
 
+
+def test_dir_listing_cache():
+    with TemporaryDirectory() as tmp:
+        os.mkdir(os.path.join(tmp, 'sub'))
+        open(os.path.join(tmp, 'b.txt'), 'w').close()
+        cache = DirListingCache()
+        cache.racy_window = -1.0  # allow caching just-modified directories
+        listing = cache.entries(tmp)
+        yield assert_equal, ('b.txt', 'sub'), listing.names
+        yield assert_equal, frozenset(['sub']), listing.dirs
+        yield assert_true, cache.entries(tmp) is listing
+        yield assert_true, cache.isdir(os.path.join(tmp, 'sub'))
+        yield assert_false, cache.isdir(os.path.join(tmp, 'b.txt'))
+        # changing the directory invalidates the listing
+        open(os.path.join(tmp, 'a.txt'), 'w').close()
+        os.utime(tmp, (0, 0))
+        yield assert_equal, ('a.txt', 'b.txt', 'sub'), cache.listdir(tmp)
+
+
+def test_dir_listing_cache_racy_isdir():
+    def entries(path):
+        raise AssertionError('listed ' + path)
+    with TemporaryDirectory() as tmp:
+        os.mkdir(os.path.join(tmp, 'sub'))
+        open(os.path.join(tmp, 'b.txt'), 'w').close()
+        cache = DirListingCache()
+        # a just-modified directory is not listed for every entry
+        cache.entries = entries
+        yield assert_true, cache.isdir(os.path.join(tmp, 'sub'))
+        yield assert_false, cache.isdir(os.path.join(tmp, 'b.txt'))
+
+
+def test_cached_iglob():
+    with TemporaryDirectory() as tmp:
+        for name in ['a.txt', 'b.py', '.hidden', os.path.join('sub', 'c.py')]:
+            path = os.path.join(tmp, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            open(path, 'w').close()
+        j = lambda *names: [os.path.join(tmp, *n.split('/')) for n in names]
+        yield (assert_equal, j('a.txt', 'b.py', 'sub'),
+               list(cached_iglob(os.path.join(tmp, '*'))))
+        yield (assert_equal, j('.hidden'),
+               list(cached_iglob(os.path.join(tmp, '.*'))))
+        yield (assert_equal, j('b.py', 'sub/c.py'),
+               sorted(cached_iglob(os.path.join(tmp, '*.py'))) +
+               list(cached_iglob(os.path.join(tmp, 's*', '*.py'))))
+        yield (assert_equal, j('a.txt'),
+               list(cached_iglob(os.path.join(tmp, 'a.txt'))))
+        yield (assert_equal, [],
+               list(cached_iglob(os.path.join(tmp, 'nope', '*'))))
+
+
 if __name__ == '__main__':
     nose.runmodule()
@@ -2,90 +2,57 @@ __version__ = '0.3.4'
 
 # amalgamate exclude jupyter_kernel parser_table parser_test_table pyghooks
 # amalgamate exclude winutils wizard
+# imphooks installs the import hook when it is imported, so it is never lazy
+# amalgamate exclude imphooks
 import os as _os
 if _os.getenv('XONSH_DEBUG', ''):
     pass
 else:
-    import sys as _sys
     try:
         from xonsh import __amalgam__
-        completer = __amalgam__
-        _sys.modules['xonsh.completer'] = __amalgam__
-        lazyasd = __amalgam__
-        _sys.modules['xonsh.lazyasd'] = __amalgam__
-        lazyjson = __amalgam__
-        _sys.modules['xonsh.lazyjson'] = __amalgam__
-        pretty = __amalgam__
-        _sys.modules['xonsh.pretty'] = __amalgam__
-        timings = __amalgam__
-        _sys.modules['xonsh.timings'] = __amalgam__
-        ansi_colors = __amalgam__
-        _sys.modules['xonsh.ansi_colors'] = __amalgam__
-        codecache = __amalgam__
-        _sys.modules['xonsh.codecache'] = __amalgam__
-        openpy = __amalgam__
-        _sys.modules['xonsh.openpy'] = __amalgam__
-        platform = __amalgam__
-        _sys.modules['xonsh.platform'] = __amalgam__
-        teepty = __amalgam__
-        _sys.modules['xonsh.teepty'] = __amalgam__
-        jobs = __amalgam__
-        _sys.modules['xonsh.jobs'] = __amalgam__
-        parser = __amalgam__
-        _sys.modules['xonsh.parser'] = __amalgam__
-        tokenize = __amalgam__
-        _sys.modules['xonsh.tokenize'] = __amalgam__
-        tools = __amalgam__
-        _sys.modules['xonsh.tools'] = __amalgam__
-        vox = __amalgam__
-        _sys.modules['xonsh.vox'] = __amalgam__
-        ast = __amalgam__
-        _sys.modules['xonsh.ast'] = __amalgam__
-        contexts = __amalgam__
-        _sys.modules['xonsh.contexts'] = __amalgam__
-        diff_history = __amalgam__
-        _sys.modules['xonsh.diff_history'] = __amalgam__
-        dirstack = __amalgam__
-        _sys.modules['xonsh.dirstack'] = __amalgam__
-        foreign_shells = __amalgam__
-        _sys.modules['xonsh.foreign_shells'] = __amalgam__
-        inspectors = __amalgam__
-        _sys.modules['xonsh.inspectors'] = __amalgam__
-        lexer = __amalgam__
-        _sys.modules['xonsh.lexer'] = __amalgam__
-        proc = __amalgam__
-        _sys.modules['xonsh.proc'] = __amalgam__
-        xontribs = __amalgam__
-        _sys.modules['xonsh.xontribs'] = __amalgam__
-        environ = __amalgam__
-        _sys.modules['xonsh.environ'] = __amalgam__
-        history = __amalgam__
-        _sys.modules['xonsh.history'] = __amalgam__
-        base_shell = __amalgam__
-        _sys.modules['xonsh.base_shell'] = __amalgam__
-        replay = __amalgam__
-        _sys.modules['xonsh.replay'] = __amalgam__
-        tracer = __amalgam__
-        _sys.modules['xonsh.tracer'] = __amalgam__
-        xonfig = __amalgam__
-        _sys.modules['xonsh.xonfig'] = __amalgam__
-        aliases = __amalgam__
-        _sys.modules['xonsh.aliases'] = __amalgam__
-        readline_shell = __amalgam__
-        _sys.modules['xonsh.readline_shell'] = __amalgam__
-        built_ins = __amalgam__
-        _sys.modules['xonsh.built_ins'] = __amalgam__
-        execer = __amalgam__
-        _sys.modules['xonsh.execer'] = __amalgam__
-        imphooks = __amalgam__
-        _sys.modules['xonsh.imphooks'] = __amalgam__
-        shell = __amalgam__
-        _sys.modules['xonsh.shell'] = __amalgam__
-        main = __amalgam__
-        _sys.modules['xonsh.main'] = __amalgam__
+        completer = __amalgam__.lazy_module('completer')
+        lazyasd = __amalgam__.lazy_module('lazyasd')
+        lazyjson = __amalgam__.lazy_module('lazyjson')
+        pretty = __amalgam__.lazy_module('pretty')
+        server = __amalgam__.lazy_module('server')
+        timings = __amalgam__.lazy_module('timings')
+        history_index = __amalgam__.lazy_module('history_index')
+        main = __amalgam__.lazy_module('main')
+        openpy = __amalgam__.lazy_module('openpy')
+        platform = __amalgam__.lazy_module('platform')
+        teepty = __amalgam__.lazy_module('teepty')
+        codecache = __amalgam__.lazy_module('codecache')
+        jobs = __amalgam__.lazy_module('jobs')
+        parser = __amalgam__.lazy_module('parser')
+        tokenize = __amalgam__.lazy_module('tokenize')
+        tools = __amalgam__.lazy_module('tools')
+        vox = __amalgam__.lazy_module('vox')
+        ansi_colors = __amalgam__.lazy_module('ansi_colors')
+        ast = __amalgam__.lazy_module('ast')
+        contexts = __amalgam__.lazy_module('contexts')
+        diff_history = __amalgam__.lazy_module('diff_history')
+        foreign_shells = __amalgam__.lazy_module('foreign_shells')
+        frecency = __amalgam__.lazy_module('frecency')
+        inspectors = __amalgam__.lazy_module('inspectors')
+        lexer = __amalgam__.lazy_module('lexer')
+        proc = __amalgam__.lazy_module('proc')
+        xontribs = __amalgam__.lazy_module('xontribs')
+        aioproc = __amalgam__.lazy_module('aioproc')
+        dirstack = __amalgam__.lazy_module('dirstack')
+        history = __amalgam__.lazy_module('history')
+        parallel = __amalgam__.lazy_module('parallel')
+        environ = __amalgam__.lazy_module('environ')
+        base_shell = __amalgam__.lazy_module('base_shell')
+        replay = __amalgam__.lazy_module('replay')
+        tracer = __amalgam__.lazy_module('tracer')
+        xonfig = __amalgam__.lazy_module('xonfig')
+        aliases = __amalgam__.lazy_module('aliases')
+        readline_shell = __amalgam__.lazy_module('readline_shell')
+        built_ins = __amalgam__.lazy_module('built_ins')
+        execer = __amalgam__.lazy_module('execer')
+        shell = __amalgam__.lazy_module('shell')
         del __amalgam__
     except ImportError:
         pass
-    del _sys
 del _os
 # amalgamate end
\ No newline at end of file
@@ -0,0 +1,313 @@
+# -*- coding: utf-8 -*-
+"""Runs subprocess pipelines from asyncio programs.
+
+The functions here are coroutine variants of the captured subprocess
+operators, which take the same commands as ``subproc_captured_stdout()`` and
+``subproc_captured_object()`` in ``xonsh.built_ins``. Aliases and
+redirections are handled the same way, but the commands are started with
+``asyncio.create_subprocess_exec()`` and callable aliases are run in the
+event loop's executor, so many pipelines can be awaited at the same time::
+
+    from xonsh.aioproc import subproc_captured_stdout
+
+    async def count_lines():
+        out = await subproc_captured_stdout(['ls'], '|', ['wc', '-l'])
+        return int(out)
+
+The pipelines are not added to the job table, and they are never run in the
+foreground of the terminal. The event loop that runs them may be given with
+the ``loop`` keyword argument, which is needed on Python 3.4 when it is not
+the default loop.
+"""
+import io
+import os
+import sys
+import time
+import types
+import asyncio
+import inspect
+import builtins
+from subprocess import PIPE, STDOUT
+
+from xonsh.platform import ON_POSIX
+from xonsh.jobs import _install_sigchld_handler
+from xonsh.proc import CompletedCommand, wrap_simple_command
+from xonsh.tools import XonshError, XonshCalledProcessError, print_exception
+
+if hasattr(types, 'coroutine'):
+    coroutine = types.coroutine
+else:
+    coroutine = asyncio.coroutine
+
+if hasattr(asyncio, 'get_running_loop'):
+    def _loop_kwargs(loop):
+        return {}
+else:
+    def _loop_kwargs(loop):
+        # before Python 3.7, the loop is found from the default policy
+        return {'loop': loop}
+
+
+def _decode(b, env):
+    s = b.decode(encoding=env.get('XONSH_ENCODING'),
+                 errors=env.get('XONSH_ENCODING_ERRORS'))
+    return s.replace('\r\n', '\n')
+
+
+def _text_stream(x, mode, env, default):
+    """Returns a text file for a stream of a callable alias, and whether it
+    should be closed when the alias returns.
+    """
+    if x is None:
+        return default, False
+    elif isinstance(x, int):
+        f = io.open(x, mode, encoding=env.get('XONSH_ENCODING'),
+                    errors=env.get('XONSH_ENCODING_ERRORS'))
+        return f, True
+    else:
+        return x, False
+
+
+def _call_alias(func, args, stdin, stdout, stderr, env):
+    """Calls a callable alias with text files for its streams, which may be
+    given as None, file descriptors, files, or StringIO objects, and returns
+    its return code.
+    """
+    closing = []
+    try:
+        sp_stdin, close = _text_stream(stdin, 'r', env, io.StringIO(''))
+        if close:
+            closing.append(sp_stdin)
+        sp_stdout, close = _text_stream(stdout, 'w', env, sys.stdout)
+        if close:
+            closing.append(sp_stdout)
+        if stderr is STDOUT:
+            sp_stderr = sp_stdout
+        else:
+            sp_stderr, close = _text_stream(stderr, 'w', env, sys.stderr)
+            if close:
+                closing.append(sp_stderr)
+        try:
+            r = func(args, sp_stdin, sp_stdout, sp_stderr)
+        except Exception:
+            print_exception()
+            return 1
+        return 0 if r is None else r
+    finally:
+        for f in closing:
+            try:
+                f.close()
+            except OSError:
+                pass
+
+
+class _Stage(object):
+    """A command of a pipeline that has been started."""
+
+    def __init__(self, cmd, aliased_cmd, proc=None, future=None, out=None,
+                 err=None):
+        self.cmd = cmd
+        self.aliased_cmd = aliased_cmd
+        self.proc = proc  # asyncio process, for external commands
+        self.future = future  # return code, for callable aliases
+        self.out = out  # captured StringIO, for callable aliases
+        self.err = err
+
+
+def _start_alias(loop, cmd, alias, stdin, stdout, stderr, env, piped):
+    numargs = len(inspect.signature(alias).parameters)
+    if numargs == 2:
+        func = wrap_simple_command(alias, cmd[1:], stdin, stdout, stderr)
+    elif numargs == 4:
+        func = alias
+    else:
+        e = 'Expected callable with 2 or 4 arguments, not {}'
+        raise XonshError(e.format(numargs))
+    out = io.StringIO() if stdout is PIPE else None
+    err = io.StringIO() if stderr is PIPE else None
+    args = (func, cmd[1:], stdin, out or stdout, err or stderr, env)
+    if piped or getattr(alias, '__xonsh_backgroundable__', True):
+        # aliases that are piped to other commands run in the executor even
+        # if they are foreground only, since the loop would otherwise block
+        # when the pipe is full
+        future = loop.run_in_executor(None, _call_alias, *args)
+    else:
+        # foreground aliases have to run on the thread of the event loop
+        future = asyncio.Future(loop=loop)
+        future.set_result(_call_alias(*args))
+    return _Stage(cmd, alias, future=future, out=out, err=err)
+
+
+@coroutine
+def _start_command(loop, cmd, aliased_cmd, stdin, stdout, stderr, detyped):
+    kwargs = {}
+    if ON_POSIX:
+        # imported here, since built_ins imports the aliases
+        from xonsh.built_ins import _subproc_pre
+        kwargs['preexec_fn'] = _subproc_pre
+    kwargs.update(_loop_kwargs(loop))
+    try:
+        proc = yield from asyncio.create_subprocess_exec(
+            *aliased_cmd, stdin=stdin, stdout=stdout, stderr=stderr,
+            env=detyped, **kwargs)
+    except PermissionError:
+        e = 'xonsh: subprocess mode: permission denied: {0}'
+        raise XonshError(e.format(aliased_cmd[0]))
+    except FileNotFoundError:
+        e = 'xonsh: subprocess mode: command not found: {0}'
+        raise XonshError(e.format(aliased_cmd[0]))
+    if ON_POSIX:
+        # the child watcher of asyncio may have replaced the SIGCHLD handler
+        # that reaps background jobs, so ours is put back and calls it
+        _install_sigchld_handler(chain=True)
+    return _Stage(cmd, aliased_cmd, proc=proc)
+
+
+@coroutine
+def run_subproc(cmds, captured='stdout', loop=None):
+    """Runs a subprocess pipeline from a coroutine. This takes the same list
+    of commands as ``xonsh.built_ins.run_subproc()``, except that it can't
+    be run in the background.
+
+    Parameters
+    ----------
+    cmds : sequence
+        The commands, which are lists of arguments or the '|' string.
+    captured : str, optional
+        'stdout' to return the output of the last command as a str, or
+        'object' to return a CompletedCommand.
+    loop : asyncio event loop, optional
+        The loop that runs the coroutine, which defaults to the running loop.
+    """
+    if captured not in ('stdout', 'object'):
+        raise ValueError('captured must be stdout or object, not '
+                         '{0!r}'.format(captured))
+    if cmds and cmds[-1] == '&':
+        raise XonshError('xonsh: background commands cannot be awaited')
+    # imported here, since built_ins imports the aliases
+    from xonsh.built_ins import parse_redirects, resolve_alias
+    env = builtins.__xonsh_env__
+    detyped = env.detype()
+    if loop is None:
+        loop = getattr(asyncio, 'get_running_loop', asyncio.get_event_loop)()
+    cmds = [list(cmd) for cmd in cmds if not isinstance(cmd, str)]
+    if len(cmds) == 0:
+        raise XonshError('xonsh: subprocess mode: empty command')
+    starttime = time.time()
+    procinfo = {}
+    stages = []
+    fds = []  # pipe ends that are still open in this process
+    files = []  # files that were opened for redirections
+    try:
+        pipe_read = None
+        for ix, cmd in enumerate(cmds):
+            islast = ix == len(cmds) - 1
+            procinfo['args'] = list(cmd)
+            cmd, streams = parse_redirects(cmd)
+            files += [stream[-1] for stream in streams.values()
+                      if hasattr(stream[-1], 'close')]
+            if 'stdin' in streams:
+                if pipe_read is not None:
+                    raise XonshError('Multiple inputs for stdin')
+                stdin = streams['stdin'][-1]
+                procinfo['stdin_redirect'] = streams['stdin'][:-1]
+            else:
+                stdin = pipe_read
+            pipe_read = None
+            if 'stdout' in streams:
+                if not islast:
+                    raise XonshError('Multiple redirects for stdout')
+                stdout = streams['stdout'][-1]
+                procinfo['stdout_redirect'] = streams['stdout'][:-1]
+            elif not islast:
+                pipe_read, stdout = os.pipe()
+                fds += [pipe_read, stdout]
+            else:
+                stdout = PIPE
+            if 'stderr' in streams:
+                stderr = streams['stderr'][-1]
+                procinfo['stderr_redirect'] = streams['stderr'][:-1]
+            elif captured == 'object' and islast:
+                stderr = PIPE
+            else:
+                stderr = None
+            cmd, alias, aliased_cmd = resolve_alias(cmd)
+            procinfo['alias'] = alias
+            if callable(aliased_cmd):
+                # the alias closes the pipe ends it is given when it returns
+                piped = False
+                for fd in (stdin, stdout):
+                    if fd in fds:
+                        fds.remove(fd)
+                        piped = True
+                stage = _start_alias(loop, cmd, aliased_cmd, stdin, stdout,
+                                     stderr, env, piped)
+            else:
+                stage = yield from _start_command(loop, cmd, aliased_cmd,
+                                                  stdin, stdout, stderr,
+                                                  detyped)
+                for fd in (stdin, stdout):
+                    if fd in fds:
+                        fds.remove(fd)
+                        os.close(fd)
+            stages.append(stage)
+        last = stages[-1]
+        waits = [s.future if s.proc is None else s.proc.wait()
+                 for s in stages[:-1]]
+        if last.proc is None:
+            waits.append(last.future)
+        else:
+            waits.append(last.proc.communicate())
+        results = yield from asyncio.gather(*waits, **_loop_kwargs(loop))
+    except BaseException:
+        for stage in stages:
+            if stage.proc is not None and stage.proc.returncode is None:
+                try:
+                    stage.proc.kill()
+                except OSError:
+                    pass
+        raise
+    finally:
+        for fd in fds:
+            os.close(fd)
+        for f in files:
+            f.close()
+    if last.proc is None:
+        returncode = results[-1]
+        output = '' if last.out is None else last.out.getvalue()
+        errout = None if last.err is None else last.err.getvalue()
+        pid = None
+    else:
+        returncode = last.proc.returncode
+        out, err = results[-1]
+        output = '' if out is None else _decode(out, env)
+        errout = None if err is None else _decode(err, env)
+        pid = last.proc.pid
+    procinfo['executed_cmd'] = last.aliased_cmd
+    procinfo['pid'] = pid
+    procinfo['returncode'] = returncode
+    procinfo['timestamp'] = (starttime, time.time())
+    procinfo['stdout'] = output
+    if errout is not None:
+        procinfo['stderr'] = errout
+    cc = CompletedCommand(**procinfo)
+    if (last.proc is not None and returncode and
+            env.get('RAISE_SUBPROC_ERROR')):
+        raise XonshCalledProcessError(returncode, last.aliased_cmd, output,
+                                      errout, cc)
+    return output if captured == 'stdout' else cc
+
+
+def subproc_captured_stdout(*cmds, loop=None):
+    """Runs a subprocess from a coroutine, capturing the output. This returns
+    a coroutine, whose result is the stdout that was produced as a str.
+    """
+    return run_subproc(cmds, captured='stdout', loop=loop)
+
+
+def subproc_captured_object(*cmds, loop=None):
+    """Runs a subprocess from a coroutine, capturing the output. This returns
+    a coroutine, whose result is an instance of ``CompletedCommand``
+    representing the completed command.
+    """
+    return run_subproc(cmds, captured='object', loop=loop)
@@ -8,11 +8,13 @@ import os
 import sys
 import shlex
 
-from xonsh.dirstack import cd, pushd, popd, dirs, _get_cwd
+from xonsh.codecache import run_script_with_cache
+from xonsh.dirstack import cd, pushd, popd, dirs, z, _get_cwd
 from xonsh.environ import locate_binary
 from xonsh.foreign_shells import foreign_shell_data
 from xonsh.jobs import jobs, fg, bg, clean_jobs
 from xonsh.history import history_main
+from xonsh.parallel import parallel_main
 from xonsh.platform import ON_ANACONDA, ON_DARWIN, ON_WINDOWS, scandir
 from xonsh.proc import foreground
 from xonsh.replay import replay_main
@@ -260,8 +262,9 @@ def source_alias(args, stdin=None):
     for fname in args:
         if not os.path.isfile(fname):
             fname = locate_binary(fname)
-        with open(fname, 'r') as fp:
-            builtins.execx(fp.read(), 'exec', builtins.__xonsh_ctx__)
+        run_script_with_cache(fname, builtins.__xonsh_execer__,
+                              glb=builtins.__xonsh_ctx__, mode='exec',
+                              use_cache=True)
 
 
 def source_cmd(args, stdin=None):
@@ -496,9 +499,11 @@ def make_default_aliases():
         'pushd': pushd,
         'popd': popd,
         'dirs': dirs,
+        'z': z,
         'jobs': jobs,
         'fg': fg,
         'bg': bg,
+        'parallel': parallel_main,
         'EOF': xonsh_exit,
         'exit': xonsh_exit,
         'quit': xonsh_exit,
@@ -1,9 +1,10 @@
 """Tools for helping with ANSI color codes."""
 import re
-import string
+import functools
 import warnings
 
 from xonsh.lazyasd import LazyObject, LazyDict
+from xonsh.tools import parse_template
 
 
 RE_BACKGROUND = LazyObject(lambda: re.compile('(bg|bg#|bghex|background)'),
@@ -39,54 +40,84 @@ def partial_color_format(template, style='default', cmap=None, hide=False):
 
 
 def _partial_color_format_main(template, style='default', cmap=None, hide=False):
-    if cmap is not None:
-        pass
-    elif style in STYLES:
-        cmap = STYLES[style]
+    if cmap is None:
+        codes = compile_style(style, hide=hide)
     else:
-        msg = 'Could not find color style {0!r}, using default.'.format(style)
-        warnings.warn(msg, RuntimeWarning)
-        cmap = DEFAULT_STYLE
-    formatter = string.Formatter()
-    esc = ('\001' if hide else '') + '\033['
-    m = 'm' + ('\002' if hide else '')
-    bopen = '{'
-    bclose = '}'
-    colon = ':'
-    expl = '!'
+        esc, m = _escape_delims(hide)
+        codes = None
     toks = []
-    for literal, field, spec, conv in formatter.parse(template):
+    for literal, field, spec, conv, raw in parse_template(template):
         toks.append(literal)
         if field is None:
             pass
-        elif field in cmap:
+        elif codes is not None and field in codes:
+            toks.append(codes[field])
+        elif codes is None and field in cmap:
             toks.extend([esc, cmap[field], m])
         elif '#' in field:
-            field = field.lower()
-            pre, _, post = field.partition('#')
-            f_or_b = '38' if RE_BACKGROUND.search(pre) is None else '48'
-            rgb, _, post = post.partition('_')
-            c256, _ = rgb_to_256(rgb)
-            color = f_or_b + ';5;' + c256
-            mods = pre + '_' + post
-            if 'underline' in mods:
-                color = '4;' + color
-            if 'bold' in mods:
-                color = '1;' + color
-            toks.extend([esc, color, m])
-        elif field is not None:
-            toks.append(bopen)
-            toks.append(field)
-            if conv is not None and len(conv) > 0:
-                toks.append(expl)
-                toks.append(conv)
-            if spec is not None and len(spec) > 0:
-                toks.append(colon)
-                toks.append(spec)
-            toks.append(bclose)
+            toks.append(_hex_escape(field, hide))
+        else:
+            toks.append(raw)
     return ''.join(toks)
 
 
+def _escape_delims(hide):
+    """Returns the strings that go before and after a color code."""
+    esc = ('\001' if hide else '') + '\033['
+    m = 'm' + ('\002' if hide else '')
+    return esc, m
+
+
+_COMPILED_STYLES = {}
+
+
+def compile_style(style='default', hide=False):
+    """Returns a dict mapping the color names of a style to their complete
+    ANSI escape sequences. Each style is only compiled once, unless it is
+    replaced in STYLES.
+
+    Parameters
+    ----------
+    style : str, optional
+        Style name to look up color map from.
+    hide : bool, optional
+        Whether to wrap the escape sequences in the \\001 and \\002 escape
+        codes.
+    """
+    cmap = color_style(style)
+    key = (style, hide)
+    compiled = _COMPILED_STYLES.get(key)
+    if compiled is None or compiled[0] is not cmap:
+        esc, m = _escape_delims(hide)
+        codes = {name: esc + code + m for name, code in cmap.items()}
+        _COMPILED_STYLES[key] = compiled = (cmap, codes)
+    return compiled[1]
+
+
+RGB_CACHE_SIZE = 1024
+"""Number of hex colors whose ANSI approximations are remembered."""
+
+
+@functools.lru_cache(maxsize=RGB_CACHE_SIZE)
+def _hex_escape(field, hide):
+    """Returns the ANSI escape sequence for a color field with a hex color,
+    such as ``#ff0000``, ``bg#00f`` or ``bold_underline_#aaa``.
+    """
+    field = field.lower()
+    pre, _, post = field.partition('#')
+    f_or_b = '38' if RE_BACKGROUND.search(pre) is None else '48'
+    rgb, _, post = post.partition('_')
+    c256, _ = rgb_to_256(rgb)
+    color = f_or_b + ';5;' + c256
+    mods = pre + '_' + post
+    if 'underline' in mods:
+        color = '4;' + color
+    if 'bold' in mods:
+        color = '1;' + color
+    esc, m = _escape_delims(hide)
+    return esc + color + m
+
+
 RGB_256 = LazyObject(lambda: {
     '000000': '16',
     '00005f': '17',
@@ -348,6 +379,25 @@ def rgb_to_ints(rgb):
         return tuple([int(h*2, 16) for h in RE_RGB3.split(rgb)[1:4]])
 
 
+CUBE_LEVELS = (0x00, 0x5f, 0x87, 0xaf, 0xd7, 0xff)
+"""Intensities of the red, green, and blue channels in the 6x6x6 color cube
+of the ANSI 256 color palette.
+"""
+
+CUBE_THRESHOLDS = (47.5, 115, 155, 195, 235)
+"""Channel intensities from which the next level of the color cube is the
+closest one.
+"""
+
+
+def _cube_index(part):
+    i = 0
+    while i < len(CUBE_THRESHOLDS) and part >= CUBE_THRESHOLDS[i]:
+        i += 1
+    return i
+
+
+@functools.lru_cache(maxsize=RGB_CACHE_SIZE)
 def rgb_to_256(rgb):
     """Find the closest ANSI 256 approximation to the given RGB value.
     Thanks to Micah Elliott (http://MicahElliott.com) for colortrans.py
@@ -355,27 +405,34 @@ def rgb_to_256(rgb):
     rgb = rgb.lstrip('#')
     if len(rgb) == 0:
         return '0', '000000'
-    incs = (0x00, 0x5f, 0x87, 0xaf, 0xd7, 0xff)
     # Break 6-char RGB code into 3 integer vals.
-    parts = rgb_to_ints(rgb)
-    res = []
-    for part in parts:
-        i = 0
-        while i < len(incs)-1:
-            s, b = incs[i], incs[i+1]  # smaller, bigger
-            if s <= part <= b:
-                s1 = abs(s - part)
-                b1 = abs(b - part)
-                if s1 < b1: closest = s
-                else: closest = b
-                res.append(closest)
-                break
-            i += 1
-    res = ''.join([('%02.x' % i) for i in res])
-    equiv = RGB_256[res]
+    r, g, b = [_cube_index(part) for part in rgb_to_ints(rgb)]
+    res = ''.join([('%02.x' % CUBE_LEVELS[i]) for i in (r, g, b)])
+    equiv = str(16 + 36*r + 6*g + b)
     return equiv, res
 
 
+def rgbs_to_256(rgbs):
+    """Finds the closest ANSI 256 approximations to many RGB values at once.
+    This requires numpy.
+
+    Parameters
+    ----------
+    rgbs : array_like
+        Array of integer RGB values, whose last axis has length 3.
+
+    Returns
+    -------
+    codes : numpy.ndarray
+        Array of ANSI 256 color codes, of type uint8, with the shape of rgbs
+        without its last axis.
+    """
+    import numpy as np
+    idx = np.searchsorted(CUBE_THRESHOLDS, rgbs, side='right')
+    idx = idx.astype(np.uint8)
+    return 16 + 36*idx[..., 0] + 6*idx[..., 1] + idx[..., 2]
+
+
 def color_style_names():
     """Returns an iterable of all ANSI color style names."""
     return STYLES.keys()
@@ -15,8 +15,10 @@ from ast import Module, Num, Expr, Str, Bytes, UnaryOp, UAdd, USub, Invert, \
     Interactive, Expression, Index, literal_eval, dump, walk, increment_lineno
 from ast import Ellipsis as EllipsisNode
 # pylint: enable=unused-import
+import copy
 import textwrap
 import itertools
+from collections import OrderedDict
 
 from xonsh.tools import subproc_toks, find_next_break
 from xonsh.platform import PYTHON_VERSION_INFO
@@ -28,6 +30,9 @@ if PYTHON_VERSION_INFO >= (3, 5, 0):
 else:
     MatMult = AsyncFunctionDef = AsyncWith = AsyncFor = Await = None
 
+SUBPROC_CACHE_SIZE = 256
+"""Number of lines parsed as subprocesses that the transformer keeps."""
+
 STATEMENTS = (FunctionDef, ClassDef, Return, Delete, Assign, AugAssign, For,
               While, If, With, Raise, Try, Assert, Import, ImportFrom, Global,
               Nonlocal, Expr, Pass, Break, Continue)
@@ -145,6 +150,10 @@ class CtxAwareTransformer(NodeTransformer):
         self.lines = None
         self.mode = None
         self._nwith = 0
+        self._line_toks = {}  # line -> its tokens, for the current visit
+        # (line, mode, mincol, maxcol) -> parsed subprocess node, or None,
+        # least recently used first
+        self._subproc_cache = OrderedDict()
 
     def ctxvisit(self, node, inp, ctx, mode='exec'):
         """Transforms the node in a context-dependent way.
@@ -170,6 +179,7 @@ class CtxAwareTransformer(NodeTransformer):
         node = self.visit(node)
         del self.lines, self.contexts, self.mode
         self._nwith = 0
+        self._line_toks.clear()
         return node
 
     def ctxupdate(self, iterable):
@@ -196,30 +206,59 @@ class CtxAwareTransformer(NodeTransformer):
         else:
             mincol = min_col(node)
             maxcol = max_col(node)
+        key = (line, self.mode, mincol, maxcol)
+        cache = self._subproc_cache
+        if key in cache:
+            cache.move_to_end(key)
+            newnode = cache[key]
+        else:
+            newnode = cache[key] = self._parse_subproc(line, mincol, maxcol)
+            if len(cache) > SUBPROC_CACHE_SIZE:
+                cache.popitem(last=False)
+        if newnode is None:
+            newnode = node
+        else:
+            # the cached node is kept as it was parsed, since the tree that
+            # it becomes part of may be changed
+            newnode = copy.deepcopy(newnode)
+            increment_lineno(newnode, n=node.lineno - 1)
+            newnode.col_offset = node.col_offset
+        if strip_expr and isinstance(newnode, Expr):
+            newnode = newnode.value
+        return newnode
+
+    def _parse_subproc(self, line, mincol, maxcol):
+        """Parses a line as a subprocess, between the columns of a node.
+        Returns the node of the subprocess, as if it were on the first line,
+        or None if the line can't be parsed as a subprocess.
+        """
+        lexer = self.parser.lexer
+        if self.mode != 'eval':
             if mincol == maxcol:
-                maxcol = find_next_break(line, mincol=mincol,
-                                         lexer=self.parser.lexer)
+                maxcol = find_next_break(line, mincol=mincol, lexer=lexer)
             else:
                 maxcol += 1
+        line_toks = self._line_toks.get(line)
+        if line_toks is None:
+            lexer.reset()
+            lexer.input(line)
+            line_toks = self._line_toks[line] = list(lexer)
         spline = subproc_toks(line,
                               mincol=mincol,
                               maxcol=maxcol,
                               returnline=False,
-                              lexer=self.parser.lexer)
+                              lexer=lexer,
+                              line_toks=line_toks)
         if spline is None:
-            return node
+            return None
         try:
             newnode = self.parser.parse(spline, mode=self.mode)
-            newnode = newnode.body
-            if not isinstance(newnode, AST):
-                # take the first (and only) Expr
-                newnode = newnode[0]
-            increment_lineno(newnode, n=node.lineno - 1)
-            newnode.col_offset = node.col_offset
         except SyntaxError:
-            newnode = node
-        if strip_expr and isinstance(newnode, Expr):
-            newnode = newnode.value
+            return None
+        newnode = newnode.body
+        if not isinstance(newnode, AST):
+            # take the first (and only) Expr
+            newnode = newnode[0]
         return newnode
 
     def is_in_scope(self, node):
@@ -9,9 +9,8 @@ import builtins
 from xonsh.tools import (XonshError, escape_windows_cmd_string, print_exception,
     DefaultNotGiven)
 from xonsh.platform import HAS_PYGMENTS, ON_WINDOWS
-from xonsh.codecache import (should_use_cache, code_cache_name,
-                             code_cache_check, get_cache_filename,
-                             update_cache, run_compiled_code)
+from xonsh.codecache import (should_use_cache, compile_with_cache,
+                             run_compiled_code)
 from xonsh.completer import Completer
 from xonsh.environ import multiline_prompt, format_prompt, partial_format_prompt
 
@@ -193,20 +192,10 @@ class BaseShell(object):
             return None, code
         src = ''.join(self.buffer)
         _cache = should_use_cache(self.execer, 'single')
-        if _cache:
-            codefname = code_cache_name(src)
-            cachefname = get_cache_filename(codefname, code=True)
-            usecache, code = code_cache_check(cachefname)
-            if usecache:
-                self.reset_buffer()
-                return src, code
         try:
-            code = self.execer.compile(src,
-                                       mode='single',
-                                       glbs=self.ctx,
-                                       locs=None)
-            if _cache:
-                update_cache(code, cachefname)
+            code = compile_with_cache(self.execer.filename, src, self.execer,
+                                      self.ctx, None, 'single',
+                                      use_cache=_cache)
             self.reset_buffer()
         except SyntaxError:
             if line == '\n':
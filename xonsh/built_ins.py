@@ -26,14 +26,14 @@ from xonsh.inspectors import Inspector
 from xonsh.aliases import Aliases, make_default_aliases
 from xonsh.environ import Env, default_env, locate_binary
 from xonsh.foreign_shells import load_foreign_aliases
-from xonsh.jobs import add_job, wait_for_active_job
+from xonsh.jobs import add_job, wait_for_active_job, _install_sigchld_handler
 from xonsh.platform import ON_POSIX, ON_WINDOWS
 from xonsh.proc import (ProcProxy, SimpleProcProxy, ForegroundProcProxy,
                         SimpleForegroundProcProxy, TeePTYProc,
                         CompletedCommand, HiddenCompletedCommand)
 from xonsh.tools import (
     suggest_commands, expandvars, CommandsCache, globpath, XonshError,
-    XonshCalledProcessError, XonshBlockError
+    XonshCalledProcessError, XonshBlockError, DIR_LISTING_CACHE
 )
 
 
@@ -114,8 +114,8 @@ def reglob(path, parts=None, i=None):
         # on Windows due to paths using \.
         regex = regex.replace('\\', '\\\\')
     regex = re.compile(regex)
-    files = os.listdir(subdir)
-    files.sort()
+    listing = DIR_LISTING_CACHE.entries(subdir)
+    files = listing.names
     paths = []
     i1 = i + 1
     if i1 == len(parts):
@@ -126,7 +126,7 @@ def reglob(path, parts=None, i=None):
     else:
         for f in files:
             p = os.path.join(base, f)
-            if regex.fullmatch(p) is None or not os.path.isdir(p):
+            if regex.fullmatch(p) is None or f not in listing.dirs:
                 continue
             paths += reglob(p, parts=parts, i=i1)
     return paths
@@ -338,6 +338,81 @@ def _redirect_io(streams, r, loc=None):
         raise XonshError('Unrecognized redirection command: {}'.format(r))
 
 
+def parse_redirects(cmd):
+    """Removes the redirections from a command, and opens their files.
+
+    Returns
+    -------
+    cmd : list
+        The command line arguments, without the redirections.
+    streams : dict
+        Maps 'stdin', 'stdout', and 'stderr' to (location, mode, file)
+        tuples for the streams that are redirected.
+    """
+    streams = {}
+    while True:
+        if len(cmd) >= 3 and _is_redirect(cmd[-2]):
+            _redirect_io(streams, cmd[-2], cmd[-1])
+            cmd = cmd[:-2]
+        elif len(cmd) >= 2 and _is_redirect(cmd[-1]):
+            _redirect_io(streams, cmd[-1])
+            cmd = cmd[:-1]
+        elif len(cmd) >= 3 and cmd[0] == '<':
+            _redirect_io(streams, cmd[0], cmd[1])
+            cmd = cmd[2:]
+        else:
+            break
+    return cmd, streams
+
+
+def resolve_alias(cmd):
+    """Looks up the alias or the executable of a command.
+
+    Parameters
+    ----------
+    cmd : list
+        The command line arguments. The first one may be a callable alias.
+
+    Returns
+    -------
+    cmd : list of str
+        The command, with ``cd`` in front of it if it is a directory that
+        $AUTO_CD changes to.
+    alias : callable, list of str, or None
+        The alias of the command, if any.
+    aliased_cmd : callable or list of str
+        The callable alias, or the command line arguments to run.
+    """
+    binary_loc = None
+    if callable(cmd[0]):
+        alias = cmd[0]
+    else:
+        alias = builtins.aliases.get(cmd[0], None)
+        binary_loc = locate_binary(cmd[0])
+    if (alias is None and
+            builtins.__xonsh_env__.get('AUTO_CD') and
+            len(cmd) == 1 and
+            os.path.isdir(cmd[0]) and
+            binary_loc is None):
+        cmd.insert(0, 'cd')
+        alias = builtins.aliases.get('cd', None)
+    if callable(alias):
+        aliased_cmd = alias
+    else:
+        if alias is not None:
+            aliased_cmd = alias + cmd[1:]
+        else:
+            aliased_cmd = cmd
+        if binary_loc is not None:
+            try:
+                aliased_cmd = get_script_subproc_command(binary_loc,
+                                                         aliased_cmd[1:])
+            except PermissionError:
+                e = 'xonsh: subprocess mode: permission denied: {0}'
+                raise XonshError(e.format(cmd[0]))
+    return cmd, alias, aliased_cmd
+
+
 def run_subproc(cmds, captured=False):
     """Runs a subprocess, in its many forms. This takes a list of 'commands,'
     which may be a list of command line arguments or a string, representing
@@ -362,6 +437,9 @@ def run_subproc(cmds, captured=False):
     procs = []
     prev_proc = None
     _capture_streams = captured in {'stdout', 'object'}
+    # the processes are reaped as they exit, so the handler has to be in
+    # place before they start
+    _install_sigchld_handler()
     for ix, cmd in enumerate(cmds):
         starttime = time.time()
         procinfo['args'] = list(cmd)
@@ -369,19 +447,7 @@ def run_subproc(cmds, captured=False):
         stderr = None
         if isinstance(cmd, str):
             continue
-        streams = {}
-        while True:
-            if len(cmd) >= 3 and _is_redirect(cmd[-2]):
-                _redirect_io(streams, cmd[-2], cmd[-1])
-                cmd = cmd[:-2]
-            elif len(cmd) >= 2 and _is_redirect(cmd[-1]):
-                _redirect_io(streams, cmd[-1])
-                cmd = cmd[:-1]
-            elif len(cmd) >= 3 and cmd[0] == '<':
-                _redirect_io(streams, cmd[0], cmd[1])
-                cmd = cmd[2:]
-            else:
-                break
+        cmd, streams = parse_redirects(cmd)
         # set standard input
         if 'stdin' in streams:
             if prev_proc is not None:
@@ -418,35 +484,8 @@ def run_subproc(cmds, captured=False):
             stderr = builtins.__xonsh_stderr_uncaptured__
         uninew = (ix == last_cmd) and (not _capture_streams)
 
-        if callable(cmd[0]):
-            alias = cmd[0]
-        else:
-            alias = builtins.aliases.get(cmd[0], None)
-            binary_loc = locate_binary(cmd[0])
-
+        cmd, alias, aliased_cmd = resolve_alias(cmd)
         procinfo['alias'] = alias
-        if (alias is None and
-                builtins.__xonsh_env__.get('AUTO_CD') and
-                len(cmd) == 1 and
-                os.path.isdir(cmd[0]) and
-                binary_loc is None):
-            cmd.insert(0, 'cd')
-            alias = builtins.aliases.get('cd', None)
-
-        if callable(alias):
-            aliased_cmd = alias
-        else:
-            if alias is not None:
-                aliased_cmd = alias + cmd[1:]
-            else:
-                aliased_cmd = cmd
-            if binary_loc is not None:
-                try:
-                    aliased_cmd = get_script_subproc_command(binary_loc,
-                                                             aliased_cmd[1:])
-                except PermissionError:
-                    e = 'xonsh: subprocess mode: permission denied: {0}'
-                    raise XonshError(e.format(cmd[0]))
         _stdin_file = None
         if (stdin is not None and
                 ENV.get('XONSH_STORE_STDIN') and
@@ -714,7 +753,8 @@ def load_builtins(execer=None, config=None, login=False, ctx=None):
     # history needs to be started after env and aliases
     # would be nice to actually include non-detyped versions.
     builtins.__xonsh_history__ = History(env=ENV.detype(),
-                                         ts=[time.time(), None], locked=True)
+                                         ts=[time.time(), None], locked=True,
+                                         index=True)
     atexit.register(_lastflush)
     for sig in AT_EXIT_SIGNALS:
         resetting_signal_handle(sig, _lastflush)
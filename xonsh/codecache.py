@@ -1,55 +1,57 @@
+"""Tools for caching the compiled code of xonsh scripts and commands.
+
+The compiled code is kept in a content addressed store in
+``$XONSH_DATA_DIR/xonsh_code_store``. Each entry is named by a hash of the
+source code, the file name and mode it was compiled with, the xonsh version,
+and the Python cache tag, so neither a changed source nor an upgrade of xonsh
+or Python can ever pick up stale code. The entries are spread over 256 shard
+directories, and each shard is kept within its share of $XONSH_CACHE_SIZE by
+removing its least recently used entries whenever an entry is added to it.
+
+The code of regular files that are sourced, or run as scripts, is keyed by
+their path, modification time and size instead, so that it can be found
+without even reading them.
+"""
 import os
 import sys
+import stat
+import time
 import hashlib
 import marshal
 import builtins
+import collections
 
-from xonsh.lazyasd import LazyObject
-
-def _splitpath(path, sofar=[]):
-    folder, path = os.path.split(path)
-    if path == "":
-        return sofar[::-1]
-    elif folder == "":
-        return (sofar + [path])[::-1]
-    else:
-        return _splitpath(folder, sofar + [path])
-
-
-def _character_map():
-    cmap = {chr(o): '_%s' % chr(o+32) for o in range(65, 91)}
-    cmap.update({'.': '_.', '_': '__'})
-    return cmap
+from xonsh import __version__ as XONSH_VERSION
+from xonsh.platform import scandir
 
+CACHE_DIRNAME = 'xonsh_code_store'
+"""Name of the code cache directory in $XONSH_DATA_DIR."""
 
-_CHARACTER_MAP = LazyObject(_character_map, globals(), '_CHARACTER_MAP')
-del _character_map
+NSHARDS = 256
+"""Number of shard directories in the code cache, which are named by the
+first two hex digits of the keys.
+"""
 
+TIMINGS_SIZE = 100
+"""Number of compilations whose timings are kept by the code cache."""
 
-def _cache_renamer(path, code=False):
-    if not code:
-        path = os.path.abspath(path)
-    o = [''.join(_CHARACTER_MAP.get(i, i) for i in w) for w in _splitpath(path)]
-    o[-1] = "{}.{}".format(o[-1], sys.implementation.cache_tag)
-    return o
+_TMP_SUFFIX = '.tmp'
 
 
-def _make_if_not_exists(dirname):
-    if not os.path.isdir(dirname):
-        os.makedirs(dirname)
-
 def should_use_cache(execer, mode):
     """
     Return ``True`` if caching has been enabled for this mode (through command
     line flags or environment variables)
     """
+    scriptcache = getattr(execer, 'scriptcache', False)
+    cacheall = getattr(execer, 'cacheall', False)
     if mode == 'exec':
-        return ((execer.scriptcache or
-                    execer.cacheall) and
+        return ((scriptcache or
+                    cacheall) and
                 (builtins.__xonsh_env__['XONSH_CACHE_SCRIPTS'] or
                     builtins.__xonsh_env__['XONSH_CACHE_EVERYTHING']))
     else:
-        return (execer.cacheall or
+        return (cacheall or
                 builtins.__xonsh_env__['XONSH_CACHE_EVERYTHING'])
 
 
@@ -66,31 +68,198 @@ def run_compiled_code(code, glb, loc, mode):
     func(code, glb, loc)
 
 
-def get_cache_filename(fname, code=True):
-    """
-    Return the filename of the cache for the given filename.
+def _key_hash(*parts):
+    h = hashlib.sha1()
+    tag = sys.implementation.cache_tag or ''
+    for part in (XONSH_VERSION, tag) + parts:
+        h.update(part.encode('utf-8', 'surrogateescape') + b'\0')
+    return h
 
-    Cache filenames are similar to those used by the Mercurial DVCS for its
-    internal store.
 
-    The ``code`` switch should be true if we should use the code store rather
-    than the script store.
+def cache_key(code, filename, mode):
+    """
+    Return the key of the compiled code for the given source code, file name
+    and mode, as a hex digest.
     """
-    datadir = builtins.__xonsh_env__['XONSH_DATA_DIR']
-    cachedir = os.path.join(datadir, 'xonsh_code_cache' if code else 'xonsh_script_cache')
-    cachefname = os.path.join(cachedir, *_cache_renamer(fname, code=code))
-    return cachefname
+    h = _key_hash(mode, filename)
+    if isinstance(code, str):
+        code = code.encode('utf-8', 'surrogateescape')
+    h.update(code)
+    return h.hexdigest()
 
 
-def update_cache(ccode, cache_file_name):
+def file_cache_key(filename, mode):
+    """
+    Return the key of the compiled code of a file, and its source code if it
+    had to be read. Regular files are keyed by their path, modification time
+    and size, and other files, such as pipes, by their contents.
+    """
+    st = os.stat(filename)
+    if stat.S_ISREG(st.st_mode):
+        h = _key_hash(mode, filename, os.path.abspath(filename),
+                      str(st.st_mtime_ns), str(st.st_size))
+        return h.hexdigest(), None
+    with open(filename, 'r') as f:
+        code = f.read()
+    return cache_key(code, filename, mode), code
+
+
+class CodeCache(object):
+    """A content addressed store of compiled code, with one file per entry
+    in shard directories. Entries are written atomically, so that concurrent
+    xonsh processes can share the cache, and the least recently used ones
+    are removed when a shard grows beyond its share of the maximum size.
     """
-    Update the cache at ``cache_file_name`` to contain the compiled code
-    represented by ``ccode``.
+
+    def __init__(self, directory, maxsize=None):
+        """
+        Parameters
+        ----------
+        directory : str
+            Location of the cache.
+        maxsize : int, optional
+            Approximate maximum total size of the entries, in bytes. The
+            size isn't limited if this is None.
+        """
+        self.directory = directory
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.timings = collections.deque(maxlen=TIMINGS_SIZE)
+        """The (file name, whether it was cached, time to load or compile,
+        compile time saved) tuples of recent compilations, in seconds.
+        """
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], key[2:])
+
+    def get(self, key):
+        """Returns the (code, compile time) for a key, or None if it isn't
+        cached.
+        """
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                entry = marshal.load(f)
+        except (OSError, EOFError, ValueError, TypeError):
+            entry = None
+        if not isinstance(entry, tuple) or len(entry) != 2:
+            self.misses += 1
+            return None
+        try:
+            os.utime(path)  # marks the entry as recently used
+        except OSError:
+            pass
+        self.hits += 1
+        return entry
+
+    def put(self, key, code, ctime=0.0):
+        """Stores the code for a key, with the time it took to compile it in
+        seconds. Returns whether it could be stored.
+        """
+        path = self._path(key)
+        shard = os.path.dirname(path)
+        tmppath = '{0}.{1}{2}'.format(path, os.getpid(), _TMP_SUFFIX)
+        try:
+            os.makedirs(shard, exist_ok=True)
+            with open(tmppath, 'wb') as f:
+                marshal.dump((code, ctime), f)
+            os.replace(tmppath, path)
+        except (OSError, ValueError):
+            try:
+                os.unlink(tmppath)
+            except OSError:
+                pass
+            return False
+        if self.maxsize is not None:
+            self._evict(shard, self.maxsize // NSHARDS)
+        return True
+
+    def _entries(self, shard):
+        """Returns the (mtime, size, path) tuples of the entries in a
+        shard.
+        """
+        entries = []
+        try:
+            it = scandir(shard)
+        except OSError:
+            return entries
+        for entry in it:
+            if entry.name.endswith(_TMP_SUFFIX):
+                continue
+            try:
+                st = entry.stat()
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, entry.path))
+        return entries
+
+    def _shards(self):
+        try:
+            it = scandir(self.directory)
+        except OSError:
+            return []
+        return [entry.path for entry in it if len(entry.name) == 2 and
+                entry.is_dir()]
+
+    def _evict(self, shard, limit):
+        """Removes the least recently used entries of a shard, except for the
+        most recent one, until their total size is within the limit.
+        """
+        entries = sorted(self._entries(shard))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries[:-1]:
+            if total <= limit:
+                break
+            try:
+                os.unlink(path)
+            except OSError:
+                continue
+            total -= size
+            self.evictions += 1
+
+    def clear(self):
+        """Removes all of the entries."""
+        for shard in self._shards():
+            for _, _, path in self._entries(shard):
+                try:
+                    os.unlink(path)
+                except OSError:
+                    pass
+
+    def stats(self):
+        """Returns a list of (name, value) tuples describing the cache. The
+        hits, misses and evictions are counted since this process started.
+        """
+        nentries = size = 0
+        for shard in self._shards():
+            entries = self._entries(shard)
+            nentries += len(entries)
+            size += sum(s for _, s, _ in entries)
+        return [('directory', self.directory),
+                ('entries', nentries),
+                ('size', size),
+                ('max size', self.maxsize),
+                ('hits', self.hits),
+                ('misses', self.misses),
+                ('evictions', self.evictions)]
+
+
+_CODE_CACHE = None
+
+
+def code_cache():
+    """Returns the code cache in $XONSH_DATA_DIR, whose maximum size is
+    $XONSH_CACHE_SIZE.
     """
-    if cache_file_name is not None:
-        _make_if_not_exists(os.path.dirname(cache_file_name))
-        with open(cache_file_name, 'wb') as cfile:
-            marshal.dump(ccode, cfile)
+    global _CODE_CACHE
+    env = builtins.__xonsh_env__
+    directory = os.path.join(env['XONSH_DATA_DIR'], CACHE_DIRNAME)
+    if _CODE_CACHE is None or _CODE_CACHE.directory != directory:
+        _CODE_CACHE = CodeCache(directory)
+    _CODE_CACHE.maxsize = env.get('XONSH_CACHE_SIZE')
+    return _CODE_CACHE
 
 
 def compile_code(filename, code, execer, glb, loc, mode):
@@ -110,39 +279,57 @@ def compile_code(filename, code, execer, glb, loc, mode):
     return ccode
 
 
-def script_cache_check(filename, cachefname):
+def _compile_cached(key, filename, code, execer, glb, loc, mode):
+    """Compiles code unless the code cache has an entry for the key. The
+    code is read from the file if it is None.
     """
-    Check whether the script cache for a particular file is valid.
+    cache = code_cache()
+    t0 = time.perf_counter()
+    entry = cache.get(key)
+    if entry is not None:
+        ccode, ctime = entry
+        cache.timings.append((filename, True, time.perf_counter() - t0,
+                              ctime))
+        return ccode
+    if code is None:
+        with open(filename, 'r') as f:
+            code = f.read()
+    ccode = compile_code(filename, code, execer, glb, loc, mode)
+    ctime = time.perf_counter() - t0
+    if ccode is not None:
+        cache.put(key, ccode, ctime)
+    cache.timings.append((filename, False, ctime, 0.0))
+    return ccode
 
-    Returns a tuple containing: a boolean representing whether the cached code
-    should be used, and the cached code (or ``None`` if the cache should not be
-    used).
+
+def compile_with_cache(filename, code, execer, glb, loc, mode,
+                       use_cache=True):
+    """
+    Compile the given code, using the cached compiled code if there is any,
+    and caching it otherwise. This only compiles it if ``use_cache`` is false.
     """
-    ccode = None
-    run_cached = False
-    if os.path.isfile(cachefname):
-        if os.stat(cachefname).st_mtime >= os.stat(filename).st_mtime:
-            with open(cachefname, 'rb') as cfile:
-                ccode = marshal.load(cfile)
-                run_cached = True
-    return run_cached, ccode
+    if not use_cache:
+        return compile_code(filename, code, execer, glb, loc, mode)
+    key = cache_key(code, filename, mode)
+    return _compile_cached(key, filename, code, execer, glb, loc, mode)
 
 
-def run_script_with_cache(filename, execer, glb=None, loc=None, mode='exec'):
+def run_script_with_cache(filename, execer, glb=None, loc=None, mode='exec',
+                          use_cache=None):
     """
     Run a script, using a cached version if it exists (and the source has not
-    changed), and updating the cache as necessary.
+    changed), and updating the cache as necessary. Whether the cache is used
+    depends on ``should_use_cache()``, unless ``use_cache`` is given.
     """
-    run_cached = False
-    use_cache = should_use_cache(execer, mode)
+    if use_cache is None:
+        use_cache = should_use_cache(execer, mode)
     if use_cache:
-        cachefname = get_cache_filename(filename, code=False)
-        run_cached, ccode = script_cache_check(filename, cachefname)
-    if not run_cached:
+        key, code = file_cache_key(filename, mode)
+        ccode = _compile_cached(key, filename, code, execer, glb, loc, mode)
+    else:
         with open(filename, 'r') as f:
             code = f.read()
         ccode = compile_code(filename, code, execer, glb, loc, mode)
-        update_cache(ccode, cachefname)
     run_compiled_code(ccode, glb, loc, mode)
 
 
@@ -157,23 +344,6 @@ def code_cache_name(code):
     return hashlib.md5(_code).hexdigest()
 
 
-def code_cache_check(cachefname):
-    """
-    Check whether the code cache for a particular piece of code is valid.
-
-    Returns a tuple containing: a boolean representing whether the cached code
-    should be used, and the cached code (or ``None`` if the cache should not be
-    used).
-    """
-    ccode = None
-    run_cached = False
-    if os.path.isfile(cachefname):
-        with open(cachefname, 'rb') as cfile:
-            ccode = marshal.load(cfile)
-            run_cached = True
-    return run_cached, ccode
-
-
 def run_code_with_cache(code, execer, glb=None, loc=None, mode='exec'):
     """
     Run a piece of code, using a cached version if it exists, and updating the
@@ -181,11 +351,6 @@ def run_code_with_cache(code, execer, glb=None, loc=None, mode='exec'):
     """
     use_cache = should_use_cache(execer, mode)
     filename = code_cache_name(code)
-    cachefname = get_cache_filename(filename, code=True)
-    run_cached = False
-    if use_cache:
-        run_cached, ccode = code_cache_check(cachefname)
-    if not run_cached:
-        ccode = compile_code(filename, code, execer, glb, loc, mode)
-        update_cache(ccode, cachefname)
+    ccode = compile_with_cache(filename, code, execer, glb, loc, mode,
+                               use_cache=use_cache)
     run_compiled_code(ccode, glb, loc, mode)
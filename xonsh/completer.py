@@ -1,15 +1,76 @@
 # -*- coding: utf-8 -*-
 """A (tab-)completer for xonsh."""
+import time
 import builtins
+import threading
 import collections.abc as abc
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor, wait
 
 import xonsh.completers.bash as compbash
+from xonsh.completers.tools import get_filter_function
+
+COMPLETER_WORKERS = 16
+"""Maximum number of completer functions that are run at the same time."""
+
+COMPLETER_HEAD_START = 0.05
+"""Number of seconds that the running completers are given to return before
+the next completer in priority order is started as well.
+"""
+
+NARROW_BREAK_CHARS = frozenset('/\\.$@\'"`()[]{} \t')
+"""When any of these are typed, the completions are computed again rather
+than narrowed down from the completions of the shorter prefix. The
+completers may treat the text after them differently, for example by
+completing the contents of a directory or the attributes of an object.
+"""
+
+
+def _sortkey(s):
+    return s.lstrip(''''"''').lower()
+
+
+def _state():
+    """Returns the state that completions depend on besides the line."""
+    env = builtins.__xonsh_env__
+    path = env.get('PATH', ())
+    return (env.get('PWD'), tuple(path),
+            tuple(builtins.__xonsh_completers__.values()))
 
 
 class Completer(object):
-    """This provides a list of optional completions for the xonsh shell."""
+    """This provides a list of optional completions for the xonsh shell.
+
+    The registered completer functions are run in the order that they are
+    registered, and the first completer that returns any completions wins.
+    When a completer is slow to return, the next ones are started as well
+    and run concurrently with it, but a fast completer never pre-empts one
+    with a higher priority that finishes within its deadline. A completer
+    which misses its deadline is skipped, but it keeps running in the
+    background and its result is used the next time that the same
+    completion is requested.
+
+    The completions for the last prefix are remembered, if they all start
+    with it. When the prefix is extended, for example from ``git ch`` to
+    ``git che``, the completions are narrowed down from the remembered ones
+    rather than computed again.
+    The remembered completions are dropped whenever the rest of the line,
+    $PWD, $PATH, or the registered completers change.
+    """
+
+    late_results_size = 64
+    """Number of results of completers that missed their deadlines to keep."""
+
     def __init__(self):
         compbash.update_bash_completion()
+        self._executor = None
+        self._late = OrderedDict()  # (name, query) -> future
+        self._lock = threading.Lock()
+        self._cache = None
+
+    def invalidate(self):
+        """Forgets the remembered completions."""
+        self._cache = None
 
     def complete(self, prefix, line, begidx, endidx, ctx=None):
         """Complete the string, given a possible execution context.
@@ -36,17 +97,147 @@ class Completer(object):
             (only used with prompt_toolkit)
         """
         ctx = ctx or {}
-        for func in builtins.__xonsh_completers__.values():
-            try:
-                out = func(prefix, line, begidx, endidx, ctx)
-            except StopIteration:
-                return set(), len(prefix)
-            if isinstance(out, abc.Sequence):
-                res, lprefix = out
-            else:
-                res = out
-                lprefix = len(prefix)
-            if res is not None and len(res) != 0:
-                def sortkey(s): return s.lstrip(''''"''').lower()
-                return tuple(sorted(res, key=sortkey)), lprefix
-        return set(), lprefix
+        context = (line[:begidx], line[endidx:])
+        state = _state()
+        narrowed = self._narrow(prefix, context, state)
+        if narrowed is not None:
+            return narrowed
+        res, lprefix, name = self._complete(prefix, line, begidx, endidx,
+                                            ctx)
+        if self._narrowable(name, res, prefix, lprefix):
+            self._cache = (context, prefix, res, state, name)
+        else:
+            self._cache = None
+        return res, lprefix
+
+    def _narrowable(self, name, res, prefix, lprefix):
+        """Returns whether the completions of a completer can be narrowed down
+        when the prefix is extended. This is only the case for completions
+        that all match the prefix, as the filter that narrows them does. The
+        completions of subsequence, fuzzy, or frecency matching, and quoted
+        completions, don't, so the completers are run again for them. A
+        completer may also opt out with a false ``narrow`` attribute.
+        """
+        if len(res) == 0 or lprefix != len(prefix):
+            return False
+        func = builtins.__xonsh_completers__.get(name)
+        if not getattr(func, 'narrow', True):
+            return False
+        filt = get_filter_function()
+        return all(filt(s, prefix) and not s.startswith(('"', "'"))
+                   for s in res)
+
+    def _narrow(self, prefix, context, state):
+        """Returns the remembered completions, filtered by a prefix that
+        extends the remembered one, or None if they can't be used.
+        """
+        cache = self._cache
+        if cache is None:
+            return None
+        cached_context, cached_prefix, res, cached_state, name = cache
+        if cached_context != context or cached_state != state or \
+                name not in builtins.__xonsh_completers__:
+            self._cache = None
+            return None
+        if len(cached_prefix) == 0 or len(prefix) <= len(cached_prefix) or \
+                not prefix.startswith(cached_prefix) or \
+                not NARROW_BREAK_CHARS.isdisjoint(prefix[len(cached_prefix):]):
+            return None
+        filt = get_filter_function()
+        res = tuple(s for s in res if filt(s, prefix))
+        if len(res) == 0:
+            return None
+        return res, len(prefix)
+
+    def _complete(self, prefix, line, begidx, endidx, ctx):
+        """Runs the completers in priority order. The next completer is only
+        started when the ones before it are still running after
+        COMPLETER_HEAD_START seconds, and none are started once a completer
+        has returned completions. Returns the completions, the length of the
+        prefix that they replace, and the name of the completer that returned
+        them.
+        """
+        query = (prefix, line, begidx, endidx)
+        start = time.monotonic()
+        default = builtins.__xonsh_env__.get('COMPLETER_TIMEOUT', 5.0)
+        completers = list(builtins.__xonsh_completers__.items())
+        completers.reverse()  # the next one to start is popped off the end
+        running = deque()  # (name, deadline, future), in priority order
+        submitted = []
+        late = set()
+        next_start = start
+        try:
+            while running or completers:
+                now = time.monotonic()
+                if completers and (not running or now >= next_start):
+                    name, func = completers.pop()
+                    timeout = getattr(func, 'timeout', default)
+                    deadline = None if timeout is None else start + timeout
+                    future = self._submit(name, func, query, ctx)
+                    running.append((name, deadline, future))
+                    submitted.append((name, future))
+                    next_start = now + COMPLETER_HEAD_START
+                    continue
+                name, deadline, future = running[0]
+                if future.done():
+                    running.popleft()
+                    try:
+                        out = future.result()
+                    except StopIteration:
+                        return set(), len(prefix), None
+                    if isinstance(out, abc.Sequence):
+                        res, lprefix = out
+                    else:
+                        res = out
+                        lprefix = len(prefix)
+                    if res is not None and len(res) != 0:
+                        return (tuple(sorted(res, key=_sortkey)), lprefix,
+                                name)
+                    continue
+                if deadline is not None and now >= deadline:
+                    running.popleft()
+                    late.add(name)
+                    continue
+                # waits for the highest priority completer, until its
+                # deadline or until the next completer should be started
+                waits = []
+                if deadline is not None:
+                    waits.append(deadline - now)
+                if completers:
+                    waits.append(next_start - now)
+                wait([future], timeout=min(waits) if waits else None)
+        finally:
+            # Only keep the completers that missed their deadlines around,
+            # and don't start the ones that are no longer needed.
+            for name, future in submitted:
+                if name not in late:
+                    future.cancel()
+                    self._forget(name, query, future)
+        return set(), len(prefix), None
+
+    def _submit(self, name, func, query, ctx):
+        """Starts running a completer, unless it is still running, or has
+        already finished, from an earlier request for the same completion.
+        """
+        key = (name, query)
+        with self._lock:
+            future = self._late.get(key)
+            if future is not None:
+                return future
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=COMPLETER_WORKERS)
+            future = self._executor.submit(func, *(tuple(query) + (ctx,)))
+            self._late[key] = future
+            while len(self._late) > self.late_results_size:
+                self._late.popitem(last=False)
+        return future
+
+    def _forget(self, name, query, future):
+        """Drops a completer that has not missed its deadline, so that its
+        result is not reused by a later request.
+        """
+        key = (name, query)
+        with self._lock:
+            if self._late.get(key) is future:
+                del self._late[key]
@@ -160,6 +160,15 @@ FUNC is the name of a completer function to use.  This should be a function
      second should be the length of the modified prefix (for an example, see
      xonsh.completers.path.complete_path).
 
+     The first completer in the list that returns any completions wins. The
+     later completers are only started when the earlier ones are slow. A
+     completer that takes longer than $COMPLETER_TIMEOUT seconds is skipped.
+     To give a completer a different deadline, set a "timeout" attribute on
+     FUNC, in seconds, or None to always wait for it. Completions that all
+     start with the prefix are narrowed down, rather than computed again, as
+     the prefix is extended; set a false "narrow" attribute on FUNC to always
+     run it again.
+
 POS (optional) is a position into the list of completers at which the new
      completer should be added.  It can be one of the following values:
        * "start" indicates that the completer should be added to the start of
@@ -1,16 +1,289 @@
 import os
 import re
-import pickle
+import bz2
+import gzip
+import lzma
+import zlib
+import sqlite3
 import builtins
-import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
+from xonsh.lazyasd import LazyObject
 from xonsh.completers.tools import get_filter_function
 
-OPTIONS = None
-OPTIONS_PATH = None
+MAN_SECTIONS = ('1', '8', '6')
+"""Manual sections that are searched for the pages of commands."""
 
-SCRAPE_RE = re.compile(r'^(?:\s*(?:-\w|--[a-z0-9-]+)[\s,])+', re.M)
-INNER_OPTIONS_RE = re.compile(r'-\w|--[a-z0-9-]+')
+DEFAULT_MANPATH = ('/usr/local/share/man', '/usr/share/man', '/usr/local/man',
+                   '/usr/man', '/opt/local/share/man')
+"""Directories searched for manual pages when $MANPATH is not set, or has an
+empty entry.
+"""
+
+INDEX_FILENAME = 'man-options.sqlite'
+
+INDEX_WORKERS = 4
+"""Number of threads used to parse manual pages when building the index."""
+
+INDEX_BATCH_SIZE = 32
+"""Number of parsed manual pages written to the index per transaction, so
+that the index is never locked for long while it is being built.
+"""
+
+SCRAPE_RE = LazyObject(
+    lambda: re.compile(r'^(?:\s*(?:-\w|--[a-z0-9-]+)[\s,])+', re.M),
+    globals(), 'SCRAPE_RE')
+INNER_OPTIONS_RE = LazyObject(lambda: re.compile(r'-\w|--[a-z0-9-]+'),
+                              globals(), 'INNER_OPTIONS_RE')
+PAGE_RE = LazyObject(
+    lambda: re.compile(r'^(.+)\.([1-9n][a-z]*)(\.(?:gz|bz2|xz|lzma))?$'),
+    globals(), 'PAGE_RE')
+ROFF_ESCAPE_RE = LazyObject(
+    lambda: re.compile(r'\\(?:f(?:\(..|\[[^\]]*\]|.)|\(..|\*(?:\(..|.)|[&|^])'),
+    globals(), 'ROFF_ESCAPE_RE')
+ROFF_REQUEST_RE = LazyObject(
+    lambda: re.compile(r'^[.\'][ \t]*([A-Za-z]{1,3})(?:[ \t]+(.*))?$'),
+    globals(), 'ROFF_REQUEST_RE')
+ROFF_ARG_RE = LazyObject(lambda: re.compile(r'"([^"]*)"?|(\S+)'), globals(),
+                         'ROFF_ARG_RE')
+MDOC_FLAG_RE = LazyObject(lambda: re.compile(r'\bFl\s+'), globals(),
+                          'MDOC_FLAG_RE')
+
+ROFF_FONT_MACROS = frozenset(['BR', 'RB', 'BI', 'IB', 'IR', 'RI'])
+"""Macros whose arguments are printed in alternating fonts, without spaces
+between them.
+"""
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS pages (
+    cmd TEXT PRIMARY KEY,
+    page TEXT NOT NULL,
+    mtime INTEGER NOT NULL,
+    options TEXT NOT NULL
+);
+"""
+
+
+def read_page(page):
+    """Reads the roff source of a manual page, decompressing it if needed."""
+    if page.endswith('.gz'):
+        opener = gzip.open
+    elif page.endswith('.bz2'):
+        opener = bz2.open
+    elif page.endswith('.xz') or page.endswith('.lzma'):
+        opener = lzma.open
+    else:
+        opener = open
+    with opener(page, 'rb') as f:
+        return f.read().decode('utf-8', errors='replace')
+
+
+def parse_options(text):
+    """Finds the option names in the roff source of a manual page. Both the
+    man and mdoc macro packages are understood.
+    """
+    text = text.replace('\\-', '-').replace('\\e', '\\')
+    text = ROFF_ESCAPE_RE.sub('', text)
+    lines = []
+    for line in text.splitlines():
+        m = ROFF_REQUEST_RE.match(line)
+        if m is not None:
+            macro, args = m.groups()
+            args = [a or b for a, b in ROFF_ARG_RE.findall(args or '')]
+            sep = '' if macro in ROFF_FONT_MACROS else ' '
+            line = sep.join(args)
+        lines.append(line)
+    text = MDOC_FLAG_RE.sub('-', '\n'.join(lines) + '\n')
+    scraped_text = ' '.join(SCRAPE_RE.findall(text))
+    options = []
+    for opt in INNER_OPTIONS_RE.findall(scraped_text):
+        if opt not in options:
+            options.append(opt)
+    return options
+
+
+def manpath(env=None):
+    """Returns the list of directories that manual pages are searched in."""
+    env = builtins.__xonsh_env__ if env is None else env
+    mp = env.get('MANPATH') or os.environ.get('MANPATH')
+    if not mp:
+        mp = ['']
+    elif isinstance(mp, str):
+        mp = mp.split(os.pathsep)
+    dirs = []
+    for d in mp:
+        for d in (DEFAULT_MANPATH if d == '' else (d,)):
+            if d not in dirs and os.path.isdir(d):
+                dirs.append(d)
+    return dirs
+
+
+def find_pages(dirs):
+    """Returns a dict mapping command names to their manual pages. If a
+    command has more than one page, the first one found wins.
+    """
+    pages = {}
+    for d in dirs:
+        for sec in MAN_SECTIONS:
+            secdir = os.path.join(d, 'man' + sec)
+            try:
+                names = sorted(os.listdir(secdir))
+            except OSError:
+                continue
+            for name in names:
+                m = PAGE_RE.match(name)
+                if m is None or not m.group(2).startswith(sec):
+                    continue
+                pages.setdefault(m.group(1), os.path.join(secdir, name))
+    return pages
+
+
+def _page_options(page):
+    """Returns the (mtime, options) of a manual page, or None if it can't be
+    read.
+    """
+    try:
+        mtime = os.stat(page).st_mtime_ns
+        text = read_page(page)
+    except (OSError, EOFError, zlib.error, lzma.LZMAError, ValueError):
+        return None
+    return mtime, parse_options(text)
+
+
+class ManIndex(object):
+    """An index of the options of commands, scraped from their manual pages.
+
+    The options are kept in an SQLite database with one entry per command,
+    which records the modification time of the manual page. An entry is
+    parsed again if the page has changed since.
+    """
+
+    def __init__(self, filename, dirs=None):
+        """
+        Parameters
+        ----------
+        filename : str
+            Location of the index database.
+        dirs : list of str, optional
+            Directories to search for manual pages, by default manpath().
+        """
+        self.filename = filename
+        self.dirs = dirs
+        self._pages = None
+        self._pages_dirs = None
+        self._schema_ready = False
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.filename, timeout=10.0)
+        if not self._schema_ready:
+            conn.executescript(_SCHEMA)
+            self._schema_ready = True
+        return conn
+
+    def pages(self):
+        """Returns a dict mapping command names to their manual pages."""
+        dirs = manpath() if self.dirs is None else self.dirs
+        with self._lock:
+            if self._pages is None or self._pages_dirs != dirs:
+                self._pages = find_pages(dirs)
+                self._pages_dirs = dirs
+            return self._pages
+
+    def options(self, cmd):
+        """Returns the list of options of a command, or None if it has no
+        manual page.
+        """
+        page = self.pages().get(cmd)
+        if page is None:
+            return None
+        try:
+            mtime = os.stat(page).st_mtime_ns
+        except OSError:
+            return None
+        conn = self._connect()
+        try:
+            row = conn.execute('SELECT page, mtime, options FROM pages '
+                               'WHERE cmd = ?', (cmd,)).fetchone()
+            if row is not None and row[:2] == (page, mtime):
+                return row[2].split()
+            parsed = _page_options(page)
+            if parsed is None:
+                return None
+            with conn:
+                self._store(conn, cmd, page, *parsed)
+        finally:
+            conn.close()
+        return parsed[1]
+
+    def _store(self, conn, cmd, page, mtime, options):
+        conn.execute('INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?)',
+                     (cmd, page, mtime, ' '.join(options)))
+
+    def _store_many(self, conn, rows):
+        with conn:
+            for row in rows:
+                self._store(conn, *row)
+
+    def update(self, workers=INDEX_WORKERS, batch_size=INDEX_BATCH_SIZE):
+        """Parses all of the manual pages that are new or have changed since
+        they were indexed. The pages are parsed outside of any transaction,
+        and written batch_size at a time.
+        """
+        pages = self.pages()
+        conn = self._connect()
+        try:
+            indexed = {cmd: (page, mtime) for cmd, page, mtime in
+                       conn.execute('SELECT cmd, page, mtime FROM pages')}
+            todo = []
+            for cmd, page in pages.items():
+                try:
+                    mtime = os.stat(page).st_mtime_ns
+                except OSError:
+                    continue
+                if indexed.get(cmd) != (page, mtime):
+                    todo.append((cmd, page))
+            if not todo:
+                return
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                parsed = executor.map(_page_options, [p for _, p in todo])
+                batch = []
+                for (cmd, page), result in zip(todo, parsed):
+                    if result is not None:
+                        batch.append((cmd, page) + tuple(result))
+                    if len(batch) >= batch_size:
+                        self._store_many(conn, batch)
+                        batch = []
+                self._store_many(conn, batch)
+        finally:
+            conn.close()
+
+
+_INDEX = None
+
+
+def man_index():
+    """Returns the manual page option index in $XONSH_DATA_DIR. The first
+    time this is called, all of the manual pages start being indexed in the
+    background.
+    """
+    global _INDEX
+    datadir = builtins.__xonsh_env__['XONSH_DATA_DIR']
+    fname = os.path.join(datadir, INDEX_FILENAME)
+    if _INDEX is None or _INDEX.filename != fname:
+        _INDEX = index = ManIndex(fname)
+        t = threading.Thread(target=_update_quietly, args=(index,))
+        t.daemon = True
+        t.start()
+    return _INDEX
+
+
+def _update_quietly(index):
+    try:
+        index.update()
+    except (OSError, sqlite3.Error):
+        pass
 
 
 def complete_from_man(prefix, line, start, end, ctx):
@@ -18,33 +291,14 @@ def complete_from_man(prefix, line, start, end, ctx):
     Completes an option name, based on the contents of the associated man
     page.
     """
-    global OPTIONS, OPTIONS_PATH
-    if OPTIONS is None:
-        datadir = builtins.__xonsh_env__['XONSH_DATA_DIR']
-        OPTIONS_PATH = os.path.join(datadir, 'man_completions_cache')
-        try:
-            with open(OPTIONS_PATH, 'rb') as f:
-                OPTIONS = pickle.load(f)
-        except:
-            OPTIONS = {}
     if not prefix.startswith('-'):
         return set()
-    cmd = line.split()[0]
-    if cmd not in OPTIONS:
-        try:
-            manpage = subprocess.Popen(
-                ["man", cmd], stdout=subprocess.PIPE,
-                stderr=subprocess.DEVNULL)
-            # This is a trick to get rid of reverse line feeds
-            text = subprocess.check_output(
-                ["col", "-b"], stdin=manpage.stdout)
-            text = text.decode('utf-8')
-            scraped_text = ' '.join(SCRAPE_RE.findall(text))
-            matches = INNER_OPTIONS_RE.findall(scraped_text)
-            OPTIONS[cmd] = matches
-            with open(OPTIONS_PATH, 'wb') as f:
-                pickle.dump(OPTIONS, f)
-        except:
-            return set()
-    return {s for s in OPTIONS[cmd]
+    cmd = os.path.basename(line.split()[0])
+    try:
+        options = man_index().options(cmd)
+    except (OSError, sqlite3.Error):
+        return set()
+    if options is None:
+        return set()
+    return {s for s in options
             if get_filter_function()(s, prefix)}
@@ -6,9 +6,13 @@ import builtins
 from xonsh.platform import ON_WINDOWS
 from xonsh.tools import (subexpr_from_unbalanced, get_sep,
                          check_for_partial_string, RE_STRING_START,
-                         iglobpath, levenshtein)
+                         iglobpath, levenshtein, DIR_LISTING_CACHE)
 
 from xonsh.completers.tools import get_filter_function
+from xonsh.frecency import dir_frecency
+
+FRECENCY_COMPLETIONS = 10
+"""Maximum number of directories completed from the frecency database."""
 
 CHARACTERS_NEED_QUOTES = ' `\t\r\n${}*()"\',?&'
 if ON_WINDOWS:
@@ -123,6 +127,7 @@ def _quote_to_use(x):
 
 def _quote_paths(paths, start, end):
     expand_path = builtins.__xonsh_expand_path__
+    isdir = DIR_LISTING_CACHE.isdir
     out = set()
     space = ' '
     backslash = '\\'
@@ -137,7 +142,7 @@ def _quote_paths(paths, start, end):
                 (any(i in s for i in CHARACTERS_NEED_QUOTES) or
                  (backslash in s and slash != backslash))):
             start = end = _quote_to_use(s)
-        if os.path.isdir(expand_path(s)):
+        if isdir(expand_path(s)):
             _tail = slash
         elif end == '':
             _tail = space
@@ -210,29 +215,58 @@ def subsequence_match(ref, typed, csc):
 
 
 def _subsequence_match_iter(ref, typed):
-    if len(typed) == 0:
-        return True
-    elif len(ref) == 0:
-        return False
-    elif ref[0] == typed[0]:
-        return _subsequence_match_iter(ref[1:], typed[1:])
-    else:
-        return _subsequence_match_iter(ref[1:], typed)
+    # each 'in' consumes the iterator up to and including the match
+    refiter = iter(ref)
+    return all(c in refiter for c in typed)
+
+
+def _subsequence_regex(typed, csc):
+    """Compiles a regex that matches strings which contain typed as a
+    subsequence. This matches the same names as subsequence_match().
+    """
+    pattern = '.*?'.join(re.escape(c) for c in typed)
+    flags = re.DOTALL if csc else re.DOTALL | re.IGNORECASE
+    return re.compile(pattern, flags)
 
 
 def _expand_one(sofar, nextone, csc):
     out = set()
+    hidden = nextone.startswith('.')
+    match = _subsequence_regex(nextone, csc).search
     for i in sofar:
-        _glob = os.path.join(_joinpath(i), '*') if i is not None else '*'
-        for j in iglobpath(_glob):
-            j = os.path.basename(j)
-            if subsequence_match(j, nextone, csc):
+        d = _joinpath(i) if i is not None else os.curdir
+        try:
+            names = DIR_LISTING_CACHE.listdir(d)
+        except OSError:
+            continue
+        for j in names:
+            if j.startswith('.') and not hidden:
+                continue
+            if match(j) is not None:
                 out.add((i or ()) + (j, ))
     return out
 
 
-def complete_path(prefix, line, start, end, ctx, cdpath=True, filtfunc=None):
-    """Completes based on a path name."""
+def _add_frecency_dirs(paths, prefix):
+    """Completes the current prefix with the highest scoring directories in
+    the frecency database whose paths contain the components of the prefix.
+    This does not touch the file system beyond checking that the directories
+    still exist.
+    """
+    terms = [t for t in re.split(r'[\\/]', prefix) if t and t != '~']
+    if len(terms) == 0:
+        return
+    found = dir_frecency().matches(terms, basename=True,
+                                   limit=FRECENCY_COMPLETIONS)
+    paths.update(p for _, p in found)
+
+
+def complete_path(prefix, line, start, end, ctx, cdpath=True, filtfunc=None,
+                  frecency=False):
+    """Completes based on a path name. If frecency is True, directories from
+    the frecency database are offered before falling back to subsequence and
+    fuzzy matching.
+    """
     # string stuff for automatic quoting
     path_str_start = ''
     path_str_end = ''
@@ -249,6 +283,8 @@ def complete_path(prefix, line, start, end, ctx, cdpath=True, filtfunc=None):
     csc = env.get('CASE_SENSITIVE_COMPLETIONS')
     for s in iglobpath(prefix + '*', ignore_case=(not csc)):
         paths.add(s)
+    if len(paths) == 0 and frecency and env.get('DIR_FRECENCY'):
+        _add_frecency_dirs(paths, prefix)
     if len(paths) == 0 and env.get('SUBSEQUENCE_PATH_COMPLETION'):
         # this block implements 'subsequence' matching, similar to fish and zsh.
         # matches are based on subsequences, not substrings.
@@ -285,5 +321,5 @@ def complete_path(prefix, line, start, end, ctx, cdpath=True, filtfunc=None):
 
 
 def complete_dir(prefix, line, start, end, ctx, cdpath=False):
-    return complete_path(prefix, line, start, end, cdpath,
-                         filtfunc=os.path.isdir)
+    return complete_path(prefix, line, start, end, ctx, cdpath=cdpath,
+                         filtfunc=DIR_LISTING_CACHE.isdir, frecency=True)
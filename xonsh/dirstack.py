@@ -7,6 +7,7 @@ import builtins
 
 from xonsh.lazyasd import LazyObject
 from xonsh.tools import get_sep
+from xonsh.frecency import dir_frecency
 
 DIRSTACK = []
 """A list containing the currently remembered directories."""
@@ -35,6 +36,8 @@ def _change_working_directory(newdir):
         env['OLDPWD'] = old
     if new is not None:
         env['PWD'] = os.path.abspath(new)
+        if env.get('DIR_FRECENCY') and env.get('XONSH_INTERACTIVE'):
+            dir_frecency().visit(env['PWD'])
 
 
 def _try_cdpath(apath):
@@ -106,6 +109,54 @@ def cd(args, stdin=None):
     return None, None, 0
 
 
+def _z_parser():
+    parser = argparse.ArgumentParser(prog='z', description='Jumps to the '
+                                     'most frecently visited directory that '
+                                     'matches all of the given terms, in '
+                                     'order.')
+    parser.add_argument('terms', nargs='*')
+    parser.add_argument('-l',
+                        dest='list',
+                        help='Lists the matching directories and their '
+                        'scores, rather than jumping.',
+                        action='store_true')
+    parser.add_argument('-x',
+                        dest='forget',
+                        help='Removes the current directory from the '
+                        'database.',
+                        action='store_true')
+    return parser
+
+
+z_parser = LazyObject(_z_parser, globals(), 'z_parser')
+del _z_parser
+
+def z(args, stdin=None):
+    """xonsh command: z
+
+    Changes to the highest scoring directory in the frecency database of
+    visited directories that matches all of the terms.
+    """
+    try:
+        args = z_parser.parse_args(args)
+    except SystemExit:
+        return None, None, 1
+    db = dir_frecency()
+    if args.forget:
+        db.forget(builtins.__xonsh_env__['PWD'])
+        return None, None, 0
+    if args.list or len(args.terms) == 0:
+        found = db.matches(args.terms)
+        out = ''.join('{0:<10.1f} {1}\n'.format(s, p)
+                      for s, p in reversed(found))
+        return out, None, 0
+    found = db.matches(args.terms, limit=1)
+    if len(found) == 0:
+        e = 'z: no matching directory: {0}\n'
+        return None, e.format(' '.join(args.terms)), 1
+    return cd([found[0][1]])
+
+
 def _pushd_parser():
     parser = argparse.ArgumentParser(prog="pushd")
     parser.add_argument('dir', nargs='?')
@@ -7,7 +7,7 @@ import json
 import locale
 import builtins
 from contextlib import contextmanager
-from functools import wraps
+from functools import wraps, partial
 from itertools import chain
 from pprint import pformat
 import re
@@ -21,6 +21,7 @@ from collections import (Mapping, MutableMapping, MutableSequence, MutableSet,
 
 from xonsh import __version__ as XONSH_VERSION
 from xonsh.jobs import get_next_task
+from xonsh.lazyasd import LazyObject, LazyDict
 from xonsh.codecache import run_script_with_cache
 from xonsh.dirstack import _get_cwd
 from xonsh.foreign_shells import load_foreign_envs
@@ -37,7 +38,8 @@ from xonsh.tools import (
     csv_to_bool_seq, bool_seq_to_csv, DefaultNotGiven, print_exception,
     setup_win_unicode_console, intensify_colors_on_win_setter, format_color,
     is_dynamic_cwd_width, to_dynamic_cwd_tuple, dynamic_cwd_tuple_to_str,
-    is_logfile_opt, to_logfile_opt, logfile_opt_to_str, executables_in
+    is_logfile_opt, to_logfile_opt, logfile_opt_to_str, executables_in,
+    parse_template
 )
 
 
@@ -88,9 +90,11 @@ DEFAULT_ENSURERS = {
     re.compile('\w*DIRS$'): (is_env_path, str_to_env_path, env_path_to_str),
     'COLOR_INPUT': (is_bool, to_bool, bool_to_str),
     'COLOR_RESULTS': (is_bool, to_bool, bool_to_str),
+    'COMPLETER_TIMEOUT': (is_float, float, str),
     'COMPLETIONS_DISPLAY': (is_completions_display_value,
                             to_completions_display_value, str),
     'COMPLETIONS_MENU_ROWS': (is_int, int, str),
+    'DIR_FRECENCY': (is_bool, to_bool, bool_to_str),
     'DYNAMIC_CWD_WIDTH': (is_dynamic_cwd_width, to_dynamic_cwd_tuple,
                           dynamic_cwd_tuple_to_str),
     'FORCE_POSIX_PATHS': (is_bool, to_bool, bool_to_str),
@@ -126,10 +130,12 @@ DEFAULT_ENSURERS = {
     'XONSHRC': (is_env_path, str_to_env_path, env_path_to_str),
     'XONSH_CACHE_SCRIPTS': (is_bool, to_bool, bool_to_str),
     'XONSH_CACHE_EVERYTHING': (is_bool, to_bool, bool_to_str),
+    'XONSH_CACHE_SIZE': (is_int, int, str),
     'XONSH_COLOR_STYLE': (is_string, ensure_string, ensure_string),
     'XONSH_DEBUG': (always_false, to_debug, bool_or_int_to_str),
     'XONSH_ENCODING': (is_string, ensure_string, ensure_string),
     'XONSH_ENCODING_ERRORS': (is_string, ensure_string, ensure_string),
+    'XONSH_HISTORY_INDEX': (is_bool, to_bool, bool_to_str),
     'XONSH_HISTORY_SIZE': (is_history_tuple, to_history_tuple, history_tuple_to_str),
     'XONSH_LOGIN': (is_bool, to_bool, bool_to_str),
     'XONSH_SHOW_TRACEBACK': (is_bool, to_bool, bool_to_str),
@@ -190,17 +196,38 @@ def xonshconfig(env):
     xc = os.path.join(xcd, 'config.json')
     return xc
 
-if ON_WINDOWS:
-    DEFAULT_XONSHRC = (os.path.join(os.environ['ALLUSERSPROFILE'],
-                                     'xonsh', 'xonshrc'),
-                       os.path.expanduser('~/.xonshrc'))
-else:
-    DEFAULT_XONSHRC = ('/etc/xonshrc', os.path.expanduser('~/.xonshrc'))
+def _default_xonshrc():
+    if ON_WINDOWS:
+        dxrc = (os.path.join(os.environ['ALLUSERSPROFILE'],
+                             'xonsh', 'xonshrc'),
+                os.path.expanduser('~/.xonshrc'))
+    else:
+        dxrc = ('/etc/xonshrc', os.path.expanduser('~/.xonshrc'))
+    return dxrc
+
+
+DEFAULT_XONSHRC = LazyObject(_default_xonshrc, globals(), 'DEFAULT_XONSHRC')
+
+# Default values that need system calls are only computed when they are
+# first looked up, so that they don't slow down starting xonsh.
+_DEFAULT_LOADERS = {
+    'XDG_CONFIG_HOME': lambda: os.path.expanduser(os.path.join('~',
+                                                               '.config')),
+    'XDG_DATA_HOME': lambda: os.path.expanduser(os.path.join('~', '.local',
+                                                             'share')),
+    'XONSHRC': _default_xonshrc,
+    'XONSH_HISTORY_FILE': lambda: os.path.expanduser(
+        '~/.xonsh_history.json'),
+}
+for _key, _cat in LOCALE_CATS.items():
+    _DEFAULT_LOADERS[_key] = partial(locale.setlocale, _cat)
+del _key, _cat
 
 # Default values should generally be immutable, that way if a user wants
 # to set them they have to do a copy and write them to the environment.
 # try to keep this sorted.
-DEFAULT_VALUES = {
+DEFAULT_VALUES = LazyDict(_DEFAULT_LOADERS, globals(), 'DEFAULT_VALUES')
+DEFAULT_VALUES.update({
     'AUTO_CD': False,
     'AUTO_PUSHD': False,
     'AUTO_SUGGEST': True,
@@ -209,8 +236,10 @@ DEFAULT_VALUES = {
     'CDPATH': (),
     'COLOR_INPUT': True,
     'COLOR_RESULTS': True,
+    'COMPLETER_TIMEOUT': 5.0,
     'COMPLETIONS_DISPLAY': 'multi',
     'COMPLETIONS_MENU_ROWS': 5,
+    'DIR_FRECENCY': True,
     'DIRSTACK_SIZE': 20,
     'DYNAMIC_CWD_WIDTH': (float('inf'), 'c'),
     'EXPAND_ENV_VARS': True,
@@ -220,11 +249,6 @@ DEFAULT_VALUES = {
     'IGNOREEOF': False,
     'INDENT': '    ',
     'INTENSIFY_COLORS_ON_WIN': True,
-    'LC_CTYPE': locale.setlocale(locale.LC_CTYPE),
-    'LC_COLLATE': locale.setlocale(locale.LC_COLLATE),
-    'LC_TIME': locale.setlocale(locale.LC_TIME),
-    'LC_MONETARY': locale.setlocale(locale.LC_MONETARY),
-    'LC_NUMERIC': locale.setlocale(locale.LC_NUMERIC),
     'LOADED_CONFIG': False,
     'LOADED_RC_FILES': (),
     'MOUSE_SUPPORT': False,
@@ -249,28 +273,24 @@ DEFAULT_VALUES = {
     'VC_BRANCH_TIMEOUT': 0.2 if ON_WINDOWS else 0.1,
     'VI_MODE': False,
     'WIN_UNICODE_CONSOLE': True,
-    'XDG_CONFIG_HOME': os.path.expanduser(os.path.join('~', '.config')),
-    'XDG_DATA_HOME': os.path.expanduser(os.path.join('~', '.local', 'share')),
     'XONSHCONFIG': xonshconfig,
-    'XONSHRC': DEFAULT_XONSHRC,
     'XONSH_CACHE_SCRIPTS': True,
     'XONSH_CACHE_EVERYTHING': False,
+    'XONSH_CACHE_SIZE': 64 * 1024 * 1024,
     'XONSH_COLOR_STYLE': 'default',
     'XONSH_CONFIG_DIR': xonsh_config_dir,
     'XONSH_DATA_DIR': xonsh_data_dir,
     'XONSH_DEBUG': False,
     'XONSH_ENCODING': DEFAULT_ENCODING,
     'XONSH_ENCODING_ERRORS': 'surrogateescape',
-    'XONSH_HISTORY_FILE': os.path.expanduser('~/.xonsh_history.json'),
+    'XONSH_HISTORY_INDEX': True,
     'XONSH_HISTORY_SIZE': (8128, 'commands'),
     'XONSH_LOGIN': False,
     'XONSH_SHOW_TRACEBACK': False,
     'XONSH_STORE_STDIN': False,
     'XONSH_STORE_STDOUT': False,
     'XONSH_TRACEBACK_LOGFILE': None
-}
-if hasattr(locale, 'LC_MESSAGES'):
-    DEFAULT_VALUES['LC_MESSAGES'] = locale.setlocale(locale.LC_MESSAGES)
+})
 
 VarDocs = namedtuple('VarDocs', ['docstr', 'configurable', 'default',
                                  'store_as_str'])
@@ -332,6 +352,15 @@ DEFAULT_DOCS = {
         'with Bash, xonsh always prefer an existing relative path.'),
     'COLOR_INPUT': VarDocs('Flag for syntax highlighting interactive input.'),
     'COLOR_RESULTS': VarDocs('Flag for syntax highlighting return values.'),
+    'COMPLETER_TIMEOUT': VarDocs(
+        'The number of [seconds] that a tab-completion waits for each '
+        'completer function. A completer that is slow to return lets the '
+        'next ones start running concurrently with it, and a completer '
+        'that takes longer than this is skipped. It keeps running in the '
+        'background so that its results are available if the same '
+        'completion is requested again. A completer function may override '
+        'this with its own ``timeout`` attribute. This value must be a '
+        'float.'),
     'COMPLETIONS_DISPLAY': VarDocs(
         'Configure if and how Python completions are displayed by the '
         'prompt_toolkit shell.\n\nThis option does not affect Bash '
@@ -352,6 +381,12 @@ DEFAULT_DOCS = {
         'Number of rows to reserve for tab-completions menu if '
         "$COMPLETIONS_DISPLAY is 'single' or 'multi'. This only affects the "
         'prompt-toolkit shell.'),
+    'DIR_FRECENCY': VarDocs(
+        'Whether or not to record the directories that are visited in '
+        'interactive sessions in a frecency database in $XONSH_DATA_DIR. '
+        'This database is used by the ``z`` command to jump to frequently '
+        'and recently visited directories, and to complete directory names '
+        'for ``cd``.'),
     'DIRSTACK_SIZE': VarDocs('Maximum size of the directory stack.'),
     'DYNAMIC_CWD_WIDTH': VarDocs('Maximum length in number of characters '
         'or as a percentage for the `cwd` prompt variable. For example, '
@@ -521,10 +556,16 @@ DEFAULT_DOCS = {
         "On Windows: ('%ALLUSERSPROFILE%\\xonsh\\xonshrc', '~/.xonshrc')")),
     'XONSH_CACHE_SCRIPTS': VarDocs(
         'Controls whether the code for scripts run from xonsh will be cached'
-        ' (``True``) or re-compiled each time (``False``).'),
+        ' (``True``) or re-compiled each time (``False``). The code of run '
+        'control files and sourced files is always cached.'),
     'XONSH_CACHE_EVERYTHING': VarDocs(
         'Controls whether all code (including code entered at the interactive'
         ' prompt) will be cached.'),
+    'XONSH_CACHE_SIZE': VarDocs(
+        'The approximate maximum size, in bytes, of the compiled code cache '
+        'in ``$XONSH_DATA_DIR``. The least recently used code is removed '
+        'when the cache grows beyond this. Run ``xonfig cache`` to see the '
+        'size of the cache.', default='67108864 (64 MiB)'),
     'XONSH_COLOR_STYLE': VarDocs(
         'Sets the color style for xonsh colors. This is a style name, not '
         'a color map. Run ``xonfig styles`` to see the available styles.'),
@@ -551,6 +592,11 @@ DEFAULT_DOCS = {
         default="'surrogateescape'"),
     'XONSH_HISTORY_FILE': VarDocs('Location of history file (deprecated).',
         configurable=False, default="'~/.xonsh_history'"),
+    'XONSH_HISTORY_INDEX': VarDocs(
+        'Whether or not commands are added to the history search index in '
+        '$XONSH_DATA_DIR as the history is flushed. The index is used by '
+        '``history search``, which will still catch up on unindexed history '
+        'files when this is False.'),
     'XONSH_HISTORY_SIZE': VarDocs(
         'Value and units tuple that sets the size of history after garbage '
         'collection. Canonical units are:\n\n'
@@ -566,6 +612,12 @@ DEFAULT_DOCS = {
     'XONSH_LOGIN': VarDocs(
         'True if xonsh is running as a login shell, and False otherwise.',
         configurable=False),
+    'XONSH_SERVER_SOCKET': VarDocs(
+        'Path of the Unix socket of a xonsh server, which is started with '
+        '``xonsh --server``. When this is set before starting xonsh, the '
+        'commands and scripts that xonsh is given are run by the server, if '
+        'it is listening, which avoids the cost of starting xonsh.',
+        configurable=False),
     'XONSH_SHOW_TRACEBACK': VarDocs(
         'Controls if a traceback is shown if exceptions occur in the shell. '
         'Set to True to always show traceback or False to always hide. '
@@ -1138,19 +1190,36 @@ else:
     USER = 'USER'
 
 
+def _with_deps(func, *deps):
+    """Returns a copy of a formatter field function that declares what it
+    depends on, so that its value may be reused between prompts.
+    """
+    @wraps(func)
+    def wrapper():
+        return func()
+    wrapper.deps = deps
+    return wrapper
+
+
+_CWD_DEPS = ('PWD', 'HOME', 'HOMEDRIVE', 'HOMEPATH', 'FORCE_POSIX_PATHS')
+
+
 FORMATTER_DICT = dict(
     user=os.environ.get(USER, '<user>'),
     prompt_end='#' if is_superuser() else '$',
     hostname=socket.gethostname().split('.', 1)[0],
-    cwd=_dynamically_collapsed_pwd,
-    cwd_dir=lambda: os.path.dirname(_replace_home_cwd()),
-    cwd_base=lambda: os.path.basename(_replace_home_cwd()),
-    short_cwd=_collapsed_pwd,
+    cwd=_with_deps(_dynamically_collapsed_pwd, 'DYNAMIC_CWD_WIDTH',
+                   shutil.get_terminal_size, *_CWD_DEPS),
+    cwd_dir=_with_deps(lambda: os.path.dirname(_replace_home_cwd()),
+                       *_CWD_DEPS),
+    cwd_base=_with_deps(lambda: os.path.basename(_replace_home_cwd()),
+                        *_CWD_DEPS),
+    short_cwd=_with_deps(_collapsed_pwd, *_CWD_DEPS),
     curr_branch=current_branch,
     branch_color=branch_color,
     branch_bg_color=branch_bg_color,
     current_job=_current_job,
-    env_name=env_name,
+    env_name=_with_deps(env_name, 'VIRTUAL_ENV', 'CONDA_DEFAULT_ENV'),
     )
 
 DEFAULT_VALUES['FORMATTER_DICT'] = dict(FORMATTER_DICT)
@@ -1162,7 +1231,7 @@ def is_template_string(template, formatter_dict=None):
     """Returns whether or not the string is a valid template."""
     template = template() if callable(template) else template
     try:
-        included_names = set(i[1] for i in _FORMATTER.parse(template))
+        included_names = set(i[1] for i in parse_template(template))
     except ValueError:
         return False
     included_names.discard(None)
@@ -1194,6 +1263,31 @@ def _failover_template_format(template):
     return template
 
 
+_FIELD_VALUES = {}
+
+
+def _field_value(name, v):
+    """Returns the value of a formatter field. Callable fields may declare
+    what they depend on as a ``deps`` attribute, a sequence of environment
+    variable names and functions of no arguments. If none of these have
+    changed since the field was last computed, the last value is reused.
+    Callable fields without ``deps`` are called every time.
+    """
+    if not callable(v):
+        return v
+    deps = getattr(v, 'deps', None)
+    if deps is None:
+        return v()
+    env = builtins.__xonsh_env__
+    key = tuple(d() if callable(d) else env.get(d) for d in deps)
+    last = _FIELD_VALUES.get(name)
+    if last is not None and last[0] is v and last[1] == key:
+        return last[2]
+    val = v()
+    _FIELD_VALUES[name] = (v, key, val)
+    return val
+
+
 def format_prompt(template=DEFAULT_PROMPT, formatter_dict=None):
     try:
         return _format_prompt_main(template, formatter_dict)
@@ -1205,7 +1299,7 @@ def _format_prompt_main(template, formatter_dict):
     """Formats a xonsh prompt template string."""
     template = template() if callable(template) else template
     fmtter = _get_fmtter(formatter_dict)
-    included_names = set(i[1] for i in _FORMATTER.parse(template))
+    included_names = set(i[1] for i in parse_template(template))
     fmt = {}
     for name in included_names:
         if name is None:
@@ -1214,7 +1308,7 @@ def _format_prompt_main(template, formatter_dict):
             v = builtins.__xonsh_env__[name[1:]]
         else:
             v = fmtter[name]
-        val = v() if callable(v) else v
+        val = _field_value(name, v)
         val = '' if val is None else val
         fmt[name] = val
     return template.format(**fmt)
@@ -1232,12 +1326,8 @@ def partial_format_prompt(template=DEFAULT_PROMPT, formatter_dict=None):
 def _partial_format_prompt_main(template=DEFAULT_PROMPT, formatter_dict=None):
     template = template() if callable(template) else template
     fmtter = _get_fmtter(formatter_dict)
-    bopen = '{'
-    bclose = '}'
-    colon = ':'
-    expl = '!'
     toks = []
-    for literal, field, spec, conv in _FORMATTER.parse(template):
+    for literal, field, spec, conv, raw in parse_template(template):
         toks.append(literal)
         if field is None:
             continue
@@ -1248,20 +1338,11 @@ def _partial_format_prompt_main(template=DEFAULT_PROMPT, formatter_dict=None):
             toks.append(v)
             continue
         elif field in fmtter:
-            v = fmtter[field]
-            val = v() if callable(v) else v
+            val = _field_value(field, fmtter[field])
             val = '' if val is None else val
             toks.append(val)
         else:
-            toks.append(bopen)
-            toks.append(field)
-            if conv is not None and len(conv) > 0:
-                toks.append(expl)
-                toks.append(conv)
-            if spec is not None and len(spec) > 0:
-                toks.append(colon)
-                toks.append(spec)
-            toks.append(bclose)
+            toks.append(raw)
     return ''.join(toks)
 
 
@@ -1383,7 +1464,7 @@ def xonshrc_context(rcfiles=None, execer=None, initial=None):
             loaded.append(False)
             continue
         try:
-            run_script_with_cache(rcfile, execer, env)
+            run_script_with_cache(rcfile, execer, env, use_cache=True)
             loaded.append(True)
         except SyntaxError as err:
             loaded.append(False)
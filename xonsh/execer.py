@@ -3,7 +3,6 @@
 import re
 import sys
 import types
-import inspect
 import builtins
 import warnings
 from collections import Mapping
@@ -40,6 +39,7 @@ class Execer(object):
         self.debug_level = debug_level
         self.unload = unload
         self.ctxtransformer = CtxAwareTransformer(self.parser)
+        self._builtin_names = set()
         load_builtins(execer=self, config=config, login=login, ctx=xonsh_ctx)
 
     def __del__(self):
@@ -94,10 +94,11 @@ class Execer(object):
         if filename is None:
             filename = self.filename
         if glbs is None or locs is None:
-            frame = inspect.stack()[stacklevel][0]
+            # inspect.stack() would read the source of every frame
+            frame = sys._getframe(stacklevel)
             glbs = frame.f_globals if glbs is None else glbs
             locs = frame.f_locals if locs is None else locs
-        ctx = set(dir(builtins)) | set(glbs.keys()) | set(locs.keys())
+        ctx = self._ctx_names(glbs, locs)
         tree = self.parse(input, ctx, mode=mode, transform=transform)
         if tree is None:
             return None  # handles comment only input
@@ -110,6 +111,22 @@ class Execer(object):
             code = compile(tree, filename, mode)
         return code
 
+    def _ctx_names(self, glbs, locs):
+        """Returns the set of the names of the builtins, globals and locals.
+        The names of the builtins are kept between calls, and only updated
+        when the builtins have changed.
+        """
+        names = self._builtin_names
+        bkeys = builtins.__dict__.keys()
+        if bkeys != names:
+            names.intersection_update(bkeys)
+            names.update(bkeys)
+        ctx = set(names)
+        ctx.update(glbs.keys())
+        if locs is not glbs:
+            ctx.update(locs.keys())
+        return ctx
+
     def eval(self, input, glbs=None, locs=None, stacklevel=2,
                 transform=True):
         """Evaluates (and returns) xonsh code."""
@@ -0,0 +1,234 @@
+# -*- coding: utf-8 -*-
+"""A persistent frecency database of visited directories.
+
+Every time the working directory changes, the new directory's rank is
+incremented. Directories are scored by their rank weighted by how recently
+they were visited, in the same way as the ``z`` shell utility. When the
+total rank grows too large, all ranks are aged by a constant factor and the
+directories that are rarely visited are forgotten.
+
+The database is stored in ``$XONSH_DATA_DIR/dir-frecency.txt`` with one
+``rank<TAB>time<TAB>path`` line per directory. Visits are written to it in
+batches, and when xonsh exits.
+"""
+import os
+import re
+import time
+import atexit
+import builtins
+import tempfile
+from threading import RLock
+
+from xonsh.tools import expanduser_abs_path
+
+FRECENCY_FILENAME = 'dir-frecency.txt'
+
+HOUR = 3600.0
+DAY = 24 * HOUR
+WEEK = 7 * DAY
+
+
+def frecency(rank, t, now):
+    """Scores a directory with the given rank that was last visited at time t.
+    """
+    dt = now - t
+    if dt < HOUR:
+        return rank * 4.0
+    elif dt < DAY:
+        return rank * 2.0
+    elif dt < WEEK:
+        return rank / 2.0
+    return rank / 4.0
+
+
+class DirFrecency(object):
+    """A persistent frecency database of visited directories. This is kept in
+    memory and is reloaded whenever another xonsh process has changed the
+    file. Visits are only written to the file once flush_every of them have
+    been made, or when flush() is called, and are merged with the changes
+    that other processes have made in the meantime.
+    """
+
+    flush_every = 16
+    """Number of visits that are recorded in memory before they are written
+    to the file.
+    """
+
+    def __init__(self, filename, max_rank=9000.0, aging=0.99):
+        """
+        Parameters
+        ----------
+        filename : str
+            Location of the database file.
+        max_rank : float, optional
+            When the ranks of all directories add up to more than this, they
+            are aged.
+        aging : float, optional
+            Factor that ranks are multiplied by when they are aged. Aged
+            directories whose rank falls below one are removed.
+        """
+        self.filename = filename
+        self.max_rank = max_rank
+        self.aging = aging
+        self._dirs = {}  # path -> [rank, time]
+        self._pending = {}  # path -> [visits, time], not written yet
+        self._npending = 0
+        self._mtime = None
+        self._lock = RLock()
+
+    def _file_mtime(self):
+        try:
+            return os.stat(self.filename).st_mtime_ns
+        except OSError:
+            return None
+
+    def _load(self):
+        """Reloads the database if it has changed on disk, keeping the visits
+        which have not been written yet.
+        """
+        mtime = self._file_mtime()
+        if mtime == self._mtime:
+            return
+        dirs = {}
+        try:
+            with open(self.filename, 'r', encoding='utf-8',
+                      errors='surrogateescape') as f:
+                for line in f:
+                    try:
+                        rank, t, path = line.rstrip('\n').split('\t', 2)
+                        dirs[path] = [float(rank), float(t)]
+                    except ValueError:
+                        continue
+        except OSError:
+            pass
+        for path, (n, t) in self._pending.items():
+            entry = dirs.get(path)
+            if entry is None:
+                dirs[path] = [n, t]
+            else:
+                entry[0] += n
+                entry[1] = max(entry[1], t)
+        self._dirs = dirs
+        self._mtime = mtime
+
+    def _save(self):
+        d = os.path.dirname(self.filename)
+        try:
+            fd, tmp = tempfile.mkstemp(prefix='.tmp-', dir=d)
+        except OSError:
+            return
+        try:
+            with open(fd, 'w', encoding='utf-8',
+                      errors='surrogateescape') as f:
+                for path, (rank, t) in self._dirs.items():
+                    f.write('{0!r}\t{1:.0f}\t{2}\n'.format(rank, t, path))
+            os.replace(tmp, self.filename)
+        except OSError:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+            return
+        self._mtime = self._file_mtime()
+        self._pending.clear()
+        self._npending = 0
+
+    def visit(self, path, now=None):
+        """Records a visit to a directory."""
+        if '\n' in path:
+            return
+        now = time.time() if now is None else now
+        with self._lock:
+            self._load()
+            dirs = self._dirs
+            for d in (dirs, self._pending):
+                entry = d.get(path)
+                if entry is None:
+                    d[path] = [1.0, now]
+                else:
+                    entry[0] += 1.0
+                    entry[1] = now
+            if sum(rank for rank, _ in dirs.values()) > self.max_rank:
+                self._age()
+            self._npending += 1
+            if self._npending >= self.flush_every:
+                self.flush()
+
+    def flush(self):
+        """Writes the visits that have not been written yet to the file."""
+        with self._lock:
+            if not self._pending:
+                return
+            self._load()
+            self._save()
+
+    def _age(self):
+        aging = self.aging
+        aged = {}
+        for path, (rank, t) in self._dirs.items():
+            rank *= aging
+            if rank >= 1.0:
+                aged[path] = [rank, t]
+        self._dirs = aged
+
+    def forget(self, path):
+        """Removes a directory from the database."""
+        with self._lock:
+            self._load()
+            self._pending.pop(path, None)
+            if self._dirs.pop(path, None) is not None:
+                self._save()
+
+    def scores(self, now=None):
+        """Returns a list of (score, path) tuples, highest score first."""
+        now = time.time() if now is None else now
+        with self._lock:
+            self._load()
+            scored = [(frecency(rank, t, now), path)
+                      for path, (rank, t) in self._dirs.items()]
+        scored.sort(key=lambda x: (-x[0], x[1]))
+        return scored
+
+    def matches(self, terms, now=None, basename=False, limit=None):
+        """Returns the (score, path) tuples, highest score first, of the
+        directories in which all of the terms appear in order. Matching is
+        case-sensitive if any directory matches that way and case-insensitive
+        otherwise. If basename is True, the last term must also appear in the
+        final component of the path. Directories which no longer exist are
+        not included. At most limit directories are returned, if given.
+        """
+        pattern = '.*'.join(re.escape(t) for t in terms)
+        last = re.escape(terms[-1]) if basename and terms else None
+        scored = self.scores(now=now)
+        for flags in (0, re.IGNORECASE):
+            regex = re.compile(pattern, flags)
+            found = []
+            for s, p in scored:
+                if not regex.search(p):
+                    continue
+                elif last is not None and \
+                        not re.search(last, os.path.basename(p), flags):
+                    continue
+                elif not os.path.isdir(p):
+                    continue
+                found.append((s, p))
+                if limit is not None and len(found) >= limit:
+                    break
+            if found:
+                return found
+        return []
+
+
+_DB = None
+
+
+def dir_frecency():
+    """Returns the directory frecency database in $XONSH_DATA_DIR."""
+    global _DB
+    env = builtins.__xonsh_env__
+    xdd = expanduser_abs_path(env.get('XONSH_DATA_DIR'))
+    fname = os.path.join(xdd, FRECENCY_FILENAME)
+    if _DB is None or _DB.filename != fname:
+        _DB = DirFrecency(fname)
+        atexit.register(_DB.flush)
+    return _DB
@@ -2,6 +2,7 @@
 """Implements the xonsh history object."""
 import os
 import sys
+import json
 import argparse
 import functools
 import operator
@@ -9,14 +10,17 @@ import uuid
 import time
 import datetime
 import builtins
+import sqlite3
 from glob import iglob
 from collections import deque, Sequence, OrderedDict
 from threading import Thread, Condition
+from concurrent.futures import ThreadPoolExecutor
 
 from xonsh.lazyjson import LazyJSON, ljdump, LJNode
 from xonsh.tools import (ensure_int_or_slice, to_history_tuple,
                          expanduser_abs_path)
 from xonsh.diff_history import _dh_create_parser, _dh_main_action
+from xonsh.history_index import HistoryIndex, cmd_matches, to_timestamp
 
 
 def _gc_commands_to_rmfiles(hsize, files):
@@ -53,13 +57,19 @@ def _gc_seconds_to_rmfiles(hsize, files):
     return rmfiles
 
 
-def _gc_bytes_to_rmfiles(hsize, files):
-    """Return the history files to remove to get under the byte limit."""
+def _gc_bytes_to_rmfiles(hsize, files, sizes=None):
+    """Return the history files to remove to get under the byte limit.
+    Sizes that are already known may be passed in as a mapping from filename
+    to number of bytes, otherwise the file is stat'd.
+    """
     rmfiles = []
     n = 0
     nbytes = 0
+    sizes = {} if sizes is None else sizes
     for _, _, f in files[::-1]:
-        fsize = os.stat(f).st_size
+        fsize = sizes.get(f)
+        if fsize is None:
+            fsize = os.stat(f).st_size
         if nbytes + fsize > hsize:
             break
         nbytes += fsize
@@ -68,6 +78,131 @@ def _gc_bytes_to_rmfiles(hsize, files):
     return rmfiles
 
 
+#
+# history file scanning
+#
+HISTORY_SCAN_WORKERS = 8
+"""Maximum number of threads used to scan history files concurrently."""
+_HIST_META_VERSION = 3
+
+
+def _hist_scan_file(f, cached, loader):
+    """Returns the metadata of a single history file, and whether it is new.
+    The cached metadata of a closed history file is reused without touching
+    the file, since only the session that a file belongs to writes to it. The
+    file is stat'd otherwise, and loader(f) is called if its mtime or size
+    have changed. None is returned for unreadable or invalid files.
+    """
+    if cached is not None and not cached['locked']:
+        return cached, False
+    try:
+        st = os.stat(f)
+    except OSError:
+        return None, False
+    mtime, size = st.st_mtime_ns, st.st_size
+    if (cached is not None and cached['mtime'] == mtime and
+            cached['size'] == size):
+        return cached, False
+    try:
+        meta = loader(f)
+    except (IOError, OSError, ValueError, KeyError, IndexError):
+        return None, False
+    meta['version'] = _HIST_META_VERSION
+    meta['mtime'] = mtime
+    meta['size'] = size
+    return meta, True
+
+
+def _hist_scan(data_dir, index=None, loader=None):
+    """Scans all of the xonsh history files in a data directory, using a
+    bounded thread pool. The metadata of the files is kept in the history
+    index database of the data directory, so only the files that may have
+    changed since the last scan are stat'd, and only the ones that did change
+    are opened and have their metadata rewritten.
+
+    Parameters
+    ----------
+    data_dir : str
+        Directory containing the history files.
+    index : HistoryIndex, optional
+        The index that keeps the metadata, by default the one in data_dir.
+    loader : callable, optional
+        Function that takes a history filename and returns a JSON-serializable
+        dict of metadata about the file, by default _hist_file_meta().
+
+    Returns
+    -------
+    entries : list of (str, dict) tuples
+        History filenames and their (possibly cached) metadata.
+    """
+    index = HistoryIndex(data_dir) if index is None else index
+    loader = _hist_file_meta if loader is None else loader
+    fs = list(iglob(os.path.join(data_dir, 'xonsh-*.json')))
+    keys = [os.path.basename(f) for f in fs]
+    try:
+        cached = index.scanned()
+    except (sqlite3.Error, OSError, ValueError):
+        cached = {}
+    olds = []
+    for key in keys:
+        meta = cached.get(key)
+        if meta is not None and meta.get('version') != _HIST_META_VERSION:
+            meta = None
+        olds.append(meta)
+    nworkers = max(1, min(HISTORY_SCAN_WORKERS, len(fs)))
+    with ThreadPoolExecutor(max_workers=nworkers) as executor:
+        scanned = list(executor.map(_hist_scan_file, fs, olds,
+                                    [loader] * len(fs)))
+    entries = []
+    changed = {}
+    for f, key, (meta, isnew) in zip(fs, keys, scanned):
+        if meta is None:
+            continue
+        entries.append((f, meta))
+        if isnew:
+            changed[key] = meta
+    removed = set(cached) - set(keys)
+    if changed or removed:
+        try:
+            index.set_scanned(changed, removed)
+        except (sqlite3.Error, OSError):
+            pass  # the files are scanned again next time
+    return entries
+
+
+def _hist_file_meta(f):
+    """Loads the metadata of a history file, which is what garbage collection
+    needs, and the start time of each command along with the offset and size
+    of its input in the file.
+    """
+    with LazyJSON(f, reopen=False) as lj:
+        cmds = lj['cmds']
+        inps = []
+        for i, (offsets, sizes) in enumerate(zip(lj.offsets['cmds'],
+                                                 lj.sizes['cmds'])):
+            if not isinstance(offsets, dict) or 'inp' not in offsets:
+                continue
+            inps.append((lj.dloc + offsets['inp'], sizes['inp'],
+                         cmds[i]['ts'][0]))
+        meta = {'locked': bool(lj['locked']),
+                'ts': lj['ts'][1],
+                'ncmds': len(lj.sizes['cmds']) - 1,
+                'inps': inps}
+    return meta
+
+
+def _hist_file_inps(f, meta):
+    """Reads the inputs and start times of the commands in a history file,
+    using the offsets of the inputs in its metadata.
+    """
+    inps = []
+    with open(f, 'rb') as fp:
+        for offset, size, ts in meta['inps']:
+            fp.seek(offset)
+            inps.append((json.loads(fp.read(size).decode()), ts))
+    return inps
+
+
 class HistoryGC(Thread):
     """Shell history garbage collection."""
 
@@ -79,6 +214,7 @@ class HistoryGC(Thread):
         super().__init__(*args, **kwargs)
         self.daemon = True
         self.size = size
+        self.sizes = {}
         self.wait_for_shell = wait_for_shell
         self.start()
         self.gc_units_to_rmfiles = {'commands': _gc_commands_to_rmfiles,
@@ -98,6 +234,8 @@ class HistoryGC(Thread):
         rmfiles_fn = self.gc_units_to_rmfiles.get(units)
         if rmfiles_fn is None:
             raise ValueError('Units type {0!r} not understood'.format(units))
+        if units == 'b':
+            rmfiles_fn = functools.partial(rmfiles_fn, sizes=self.sizes)
 
         for _, _, f in rmfiles_fn(hsize, files):
             try:
@@ -110,37 +248,38 @@ class HistoryGC(Thread):
         excluded.
 
         This is sorted by the last closed time. Returns a list of (timestamp,
-        file) tuples.
+        number of commands, file) tuples. The sizes of the files, in bytes,
+        are recorded in the ``sizes`` attribute.
+
+        The file metadata is read concurrently and kept in the history
+        index, so that only history files which have changed since the last
+        call are actually opened.
         """
-        _ = self  # this could be a function but is intimate to this class
         # pylint: disable=no-member
         xdd = builtins.__xonsh_env__.get('XONSH_DATA_DIR')
         xdd = expanduser_abs_path(xdd)
-
-        fs = [f for f in iglob(os.path.join(xdd, 'xonsh-*.json'))]
+        entries = _hist_scan(xdd)
         files = []
-        for f in fs:
-            try:
-                lj = LazyJSON(f, reopen=False)
-                if only_unlocked and lj['locked']:
-                    continue
-                # info: closing timestamp, number of commands, filename
-                files.append((lj['ts'][1] or time.time(),
-                              len(lj.sizes['cmds']) - 1,
-                              f))
-                lj.close()
-            except (IOError, OSError, ValueError):
+        sizes = {}
+        for f, meta in entries:
+            if only_unlocked and meta['locked']:
                 continue
+            # info: closing timestamp, number of commands, filename
+            files.append((meta['ts'] or time.time(), meta['ncmds'], f))
+            sizes[f] = meta['size']
         files.sort()
+        self.sizes = sizes
         return files
 
 
 class HistoryFlusher(Thread):
     """Flush shell history to disk periodically."""
 
-    def __init__(self, filename, buffer, queue, cond, at_exit=False, *args,
-                 **kwargs):
-        """Thread for flushing history."""
+    def __init__(self, filename, buffer, queue, cond, at_exit=False,
+                 index=None, *args, **kwargs):
+        """Thread for flushing history. If a HistoryIndex is given, the
+        flushed commands are also added to it.
+        """
         super(HistoryFlusher, self).__init__(*args, **kwargs)
         self.filename = filename
         self.buffer = buffer
@@ -148,6 +287,7 @@ class HistoryFlusher(Thread):
         queue.append(self)
         self.cond = cond
         self.at_exit = at_exit
+        self.index = index
         if at_exit:
             self.dump()
             queue.popleft()
@@ -168,12 +308,19 @@ class HistoryFlusher(Thread):
         """Write the cached history to external storage."""
         with open(self.filename, 'r', newline='\n') as f:
             hist = LazyJSON(f).load()
+        start = len(hist['cmds'])
         hist['cmds'].extend(self.buffer)
         if self.at_exit:
             hist['ts'][1] = time.time()  # apply end time
             hist['locked'] = False
         with open(self.filename, 'w', newline='\n') as f:
             ljdump(hist, f, sort_keys=True)
+        if self.index is not None:
+            try:
+                self.index.add(self.filename, start, self.buffer,
+                               sessionid=hist.get('sessionid'))
+            except (sqlite3.Error, OSError):
+                pass  # the index is caught up on the next search
 
 
 class CommandField(Sequence):
@@ -274,20 +421,14 @@ def _all_xonsh_parser(*args):
     """
     data_dir = builtins.__xonsh_env__.get('XONSH_DATA_DIR')
     data_dir = expanduser_abs_path(data_dir)
-
-    files = [os.path.join(data_dir, f) for f in os.listdir(data_dir)
-             if f.startswith('xonsh-') and f.endswith('.json')]
-    file_hist = []
-    for f in files:
+    commands = []
+    for f, meta in _hist_scan(data_dir):
         try:
-            json_file = LazyJSON(f, reopen=False)
-            file_hist.append(json_file.load()['cmds'])
-        except ValueError:
-            # Invalid json file
-            pass
-    commands = [(c['inp'][:-1] if c['inp'].endswith('\n') else c['inp'],
-                 c['ts'][0])
-                for commands in file_hist for c in commands if c]
+            inps = _hist_file_inps(f, meta)
+        except (IOError, OSError, ValueError):
+            continue
+        commands.extend((inp[:-1] if inp.endswith('\n') else inp, ts)
+                        for inp, ts in inps)
     commands.sort(key=operator.itemgetter(1))
     return [(c, t, ind) for ind, (c, t) in enumerate(commands)]
 
@@ -360,6 +501,28 @@ def _bash_hist_parser(location=None):
               file=sys.stderr)
 
 
+def _hist_index_update(index):
+    """Brings a history index up to date with the history files on disk.
+    Commands that were not added by a flusher, such as those from before the
+    index existed, are indexed and garbage collected files are removed.
+    """
+    indexed = index.indexed()
+    files = {os.path.basename(f): (f, meta['ncmds']) for f, meta in
+             _hist_scan(index.data_dir, index=index)}
+    for key in set(indexed) - set(files):
+        index.remove(key)
+    for key, (f, ncmds) in files.items():
+        n = indexed.get(key, 0)
+        if ncmds <= n:
+            continue
+        try:
+            with LazyJSON(f, reopen=False) as lj:
+                hist = lj.load()
+        except (IOError, OSError, ValueError):
+            continue
+        index.add(f, n, hist['cmds'][n:], sessionid=hist.get('sessionid'))
+
+
 @functools.lru_cache()
 def _hist_create_parser():
     """Create a parser for the "history" command."""
@@ -404,6 +567,28 @@ def _hist_create_parser():
                       help='display n\'th history entry if n is a '
                       'simple int, or range of entries if it '
                       'is Python slice notation')
+    # search action
+    search = subp.add_parser('search', help='searches the inputs and outputs '
+                                            'of the history of all sessions')
+    search.add_argument('query', help='text to search for, case-insensitively')
+    search.add_argument('-p', '--prefix', dest='prefix', default=False,
+                        action='store_true',
+                        help='matches words that start with the query, '
+                             'rather than any substring')
+    search.add_argument('-f', '--field', dest='field', default='all',
+                        choices=['inp', 'out', 'all'],
+                        help='which part of the commands to search, '
+                             'default all')
+    search.add_argument('--rtn', dest='rtn', default=None, type=int,
+                        help='only matches commands with this return code')
+    search.add_argument('--after', dest='after', default=None,
+                        help='only matches commands started after this time, '
+                             'a timestamp or "YYYY-MM-DD[ HH:MM[:SS]]"')
+    search.add_argument('--before', dest='before', default=None,
+                        help='only matches commands started before this time, '
+                             'a timestamp or "YYYY-MM-DD[ HH:MM[:SS]]"')
+    search.add_argument('-n', dest='limit', default=None, type=int,
+                        help='only shows the n most recent matches')
     # 'id' subcommand
     subp.add_parser('id', help='displays the current session id')
     # 'file' subcommand
@@ -537,7 +722,7 @@ class History(object):
     """Xonsh session history."""
 
     def __init__(self, filename=None, sessionid=None, buffersize=100, gc=True,
-                 **meta):
+                 index=False, **meta):
         """Represents a xonsh session's history as an in-memory buffer that is
         periodically flushed to disk.
 
@@ -556,6 +741,10 @@ class History(object):
             'cmds' and 'sessionid' are not allowed and will be overwritten.
         gc : bool, optional
             Run garbage collector flag.
+        index : bool, optional
+            Flag for whether flushed commands are added to the history
+            search index in the same directory as the history file. This
+            may be turned off at runtime with $XONSH_HISTORY_INDEX.
         """
         self.sessionid = sid = uuid.uuid4() if sessionid is None else sessionid
         if filename is None:
@@ -575,9 +764,14 @@ class History(object):
         self.last_cmd_rtn = None
         meta['cmds'] = []
         meta['sessionid'] = str(sid)
-        with open(self.filename, 'w', newline='\n') as f:
-            ljdump(meta, f, sort_keys=True)
+        # the file is only written when the first commands are flushed, so
+        # that sessions which never record a command don't touch the disk
+        self._meta = meta
         self.gc = HistoryGC() if gc else None
+        self.index = None
+        if index:
+            data_dir = os.path.dirname(os.path.abspath(self.filename))
+            self.index = HistoryIndex(data_dir)
         # command fields that are known
         self.tss = CommandField('ts', self)
         self.inps = CommandField('inp', self)
@@ -617,6 +811,12 @@ class History(object):
             hf = None
         return hf
 
+    def _create_file(self):
+        """Writes the metadata of the session to a new history file."""
+        with open(self.filename, 'w', newline='\n') as f:
+            ljdump(self._meta, f, sort_keys=True)
+        self._meta = None
+
     def flush(self, at_exit=False):
         """Flushes the current command buffer to disk.
 
@@ -633,8 +833,14 @@ class History(object):
         """
         if len(self.buffer) == 0:
             return
+        if self._meta is not None:
+            self._create_file()
+        index = self.index
+        if index is not None and \
+                not builtins.__xonsh_env__.get('XONSH_HISTORY_INDEX'):
+            index = None
         hf = HistoryFlusher(self.filename, tuple(self.buffer), self._queue,
-                            self._cond, at_exit=at_exit)
+                            self._cond, at_exit=at_exit, index=index)
         self.buffer.clear()
         return hf
 
@@ -652,6 +858,38 @@ class History(object):
         """
         return _show(*args, **kwargs)
 
+    def search(self, query, prefix=False, fields=('inp', 'out'), rtn=None,
+               after=None, before=None, limit=None):
+        """Searches the inputs and outputs of the history of all sessions,
+        including the commands of this session which have not been flushed
+        yet. See xonsh.history_index.HistoryIndex.search() for a description
+        of the arguments. Returns a list of command dicts sorted by their
+        start time.
+        """
+        index = self.index
+        if index is None:
+            data_dir = os.path.dirname(os.path.abspath(self.filename))
+            index = HistoryIndex(data_dir)
+        _hist_index_update(index)
+        after = to_timestamp(after)
+        before = to_timestamp(before)
+        results = index.search(query, prefix=prefix, fields=fields, rtn=rtn,
+                               after=after, before=before, limit=limit)
+        fname = os.path.basename(self.filename)
+        start = len(self) - len(self.buffer)
+        for i, cmd in enumerate(self.buffer, start):
+            if not cmd_matches(cmd, query, prefix=prefix, fields=fields,
+                               rtn=rtn, after=after, before=before):
+                continue
+            results.append({'file': fname, 'sessionid': str(self.sessionid),
+                            'idx': i, 'inp': cmd.get('inp'),
+                            'out': cmd.get('out'), 'rtn': cmd.get('rtn'),
+                            'ts': list(cmd.get('ts') or [None, None])})
+        results.sort(key=lambda r: r['ts'][0] or 0.0)
+        if limit is not None:
+            results = results[-limit:] if limit > 0 else []
+        return results
+
 
 def _info(ns, hist):
     """Display information about the shell history."""
@@ -670,6 +908,33 @@ def _info(ns, hist):
         print('\n'.join(lines))
 
 
+def _search(ns, hist):
+    """Search the inputs and outputs of the shell history."""
+    fields = ('inp', 'out') if ns.field == 'all' else (ns.field,)
+    try:
+        results = hist.search(ns.query, prefix=ns.prefix, fields=fields,
+                              rtn=ns.rtn, after=ns.after, before=ns.before,
+                              limit=ns.limit)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return
+    except sqlite3.Error as e:
+        print('history index error: {0}'.format(e), file=sys.stderr)
+        return
+    for r in results:
+        tsb = r['ts'][0]
+        when = '?' if tsb is None else \
+            datetime.datetime.fromtimestamp(tsb).strftime('%Y-%m-%d %H:%M:%S')
+        inp = r['inp'] or ''
+        inp = inp[:-1] if inp.endswith('\n') else inp
+        prefix = '{0} [{1}] '.format(when, r['rtn'])
+        for line_ind, line in enumerate(inp.split('\n')):
+            if line_ind == 0:
+                print(prefix + line)
+            else:
+                print(' ' * len(prefix) + line)
+
+
 def _gc(ns, hist):
     """Start and monitor garbage collection of the shell history."""
     hist.gc = gc = HistoryGC(wait_for_shell=False, size=ns.size)
@@ -689,6 +954,7 @@ _HIST_MAIN_ACTIONS = {
     'file': lambda ns, hist: print(hist.filename),
     'info': _info,
     'diff': _dh_main_action,
+    'search': _search,
     'gc': _gc,
     }
 
@@ -0,0 +1,370 @@
+# -*- coding: utf-8 -*-
+"""Incremental full-text index over the xonsh history files.
+
+The index is an SQLite database in ``$XONSH_DATA_DIR`` that maps tokens to
+commands. Two kinds of tokens are stored for the input and output of every
+command:
+
+* lower-cased character trigrams, which answer substring queries, and
+* lower-cased words, which answer word-prefix queries.
+
+Candidate commands are found from the posting lists and then verified
+against the stored text, so results are always exact.
+
+The database also keeps the metadata of every history file, which is used
+to scan the history files without opening the ones that haven't changed.
+"""
+import os
+import re
+import json
+import sqlite3
+import datetime
+
+from xonsh.lazyasd import LazyObject
+
+INDEX_FILENAME = 'history-index.sqlite'
+
+FIELDS = ('inp', 'out')
+FIELD_IDS = {'inp': 0, 'out': 1}
+
+WORD_RE = LazyObject(lambda: re.compile(r'\w+'), globals(), 'WORD_RE')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    file TEXT PRIMARY KEY,
+    sessionid TEXT,
+    ncmds INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS cmds (
+    id INTEGER PRIMARY KEY,
+    file TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    inp TEXT,
+    out TEXT,
+    rtn INTEGER,
+    tsb REAL,
+    tse REAL
+);
+CREATE INDEX IF NOT EXISTS cmds_file ON cmds (file);
+CREATE INDEX IF NOT EXISTS cmds_tsb ON cmds (tsb);
+CREATE TABLE IF NOT EXISTS grams (
+    gram TEXT NOT NULL,
+    field INTEGER NOT NULL,
+    cmd INTEGER NOT NULL,
+    PRIMARY KEY (gram, field, cmd)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS grams_cmd ON grams (cmd);
+CREATE TABLE IF NOT EXISTS words (
+    word TEXT NOT NULL,
+    field INTEGER NOT NULL,
+    cmd INTEGER NOT NULL,
+    PRIMARY KEY (word, field, cmd)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS words_cmd ON words (cmd);
+CREATE TABLE IF NOT EXISTS scanned (
+    file TEXT PRIMARY KEY,
+    meta TEXT NOT NULL
+);
+"""
+
+
+def trigrams(s):
+    """Returns the set of lower-cased character trigrams in a string."""
+    s = s.lower()
+    return {s[i:i+3] for i in range(len(s) - 2)}
+
+
+def words(s):
+    """Returns the set of lower-cased words in a string."""
+    return {w.lower() for w in WORD_RE.findall(s)}
+
+
+def matches(text, query, prefix=False):
+    """Tests whether some text matches a query. Substring queries are
+    case-insensitive. Prefix queries match if any word in the text starts
+    with the query.
+    """
+    if not text:
+        return False
+    query = query.lower()
+    if prefix:
+        return any(w.startswith(query) for w in words(text))
+    return query in text.lower()
+
+
+def to_timestamp(x):
+    """Converts a float, datetime, or a 'YYYY-MM-DD[ HH:MM[:SS]]' string
+    into a timestamp. None is passed through.
+    """
+    if x is None or isinstance(x, float):
+        return x
+    elif isinstance(x, int):
+        return float(x)
+    elif isinstance(x, datetime.datetime):
+        return x.timestamp()
+    try:
+        return float(x)
+    except ValueError:
+        pass
+    for fmt in ('%Y-%m-%d', '%Y-%m-%d %H:%M', '%Y-%m-%d %H:%M:%S'):
+        try:
+            return datetime.datetime.strptime(x, fmt).timestamp()
+        except ValueError:
+            continue
+    raise ValueError('{0!r} is not a valid time'.format(x))
+
+
+def cmd_matches(cmd, query, prefix=False, fields=FIELDS, rtn=None,
+                after=None, before=None):
+    """Tests whether a history command dict matches a search. The arguments
+    are the same as for HistoryIndex.search(), except that the times must
+    already be timestamps.
+    """
+    if rtn is not None and cmd.get('rtn') != rtn:
+        return False
+    tsb = (cmd.get('ts') or [None])[0]
+    if after is not None and (tsb is None or tsb < after):
+        return False
+    if before is not None and (tsb is None or tsb > before):
+        return False
+    return any(matches(_field_text(cmd, f), query, prefix=prefix)
+               for f in fields)
+
+
+def _field_text(cmd, field):
+    text = cmd.get(field)
+    return text if isinstance(text, str) else None
+
+
+class HistoryIndex(object):
+    """An incremental inverted index of xonsh history inputs and outputs."""
+
+    def __init__(self, data_dir, filename=INDEX_FILENAME, timeout=10.0):
+        """
+        Parameters
+        ----------
+        data_dir : str
+            Directory that the index lives in, typically $XONSH_DATA_DIR.
+        filename : str, optional
+            Basename of the index database.
+        timeout : float, optional
+            Seconds to wait for other xonsh processes to release the index.
+        """
+        self.data_dir = data_dir
+        self.filename = os.path.join(data_dir, filename)
+        self.timeout = timeout
+        self._schema_ready = False
+
+    def _connect(self):
+        # connections are not shared between threads, so make a new one for
+        # every operation. These are cheap compared to the queries themselves.
+        conn = sqlite3.connect(self.filename, timeout=self.timeout)
+        if not self._schema_ready:
+            conn.executescript(_SCHEMA)
+            self._schema_ready = True
+        return conn
+
+    def add(self, fname, start, cmds, sessionid=None):
+        """Adds commands from a history file to the index. Commands that
+        have already been indexed are skipped, so this may safely be called
+        more than once with overlapping commands.
+
+        Parameters
+        ----------
+        fname : str
+            The history file that the commands belong to.
+        start : int
+            The index of the first of the commands in the history file.
+        cmds : sequence of dicts
+            The commands to add.
+        sessionid : str, optional
+            The session identifier of the history file.
+        """
+        key = os.path.basename(fname)
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute('BEGIN IMMEDIATE')
+                row = conn.execute('SELECT ncmds FROM files WHERE file = ?',
+                                   (key,)).fetchone()
+                nindexed = 0 if row is None else row[0]
+                for i, cmd in enumerate(cmds, start):
+                    if i < nindexed or not cmd:
+                        continue
+                    self._add_cmd(conn, key, i, cmd)
+                nindexed = max(nindexed, start + len(cmds))
+                conn.execute('INSERT OR REPLACE INTO files VALUES (?, ?, ?)',
+                             (key, sessionid, nindexed))
+        finally:
+            conn.close()
+
+    def _add_cmd(self, conn, key, i, cmd):
+        tsb, tse = (list(cmd.get('ts') or ()) + [None, None])[:2]
+        rtn = cmd.get('rtn')
+        cur = conn.execute(
+            'INSERT INTO cmds (file, idx, inp, out, rtn, tsb, tse) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?)',
+            (key, i, _field_text(cmd, 'inp'), _field_text(cmd, 'out'),
+             rtn if isinstance(rtn, int) else None, tsb, tse))
+        cid = cur.lastrowid
+        for field in FIELDS:
+            text = _field_text(cmd, field)
+            if not text:
+                continue
+            fid = FIELD_IDS[field]
+            conn.executemany('INSERT OR IGNORE INTO grams VALUES (?, ?, ?)',
+                             [(g, fid, cid) for g in trigrams(text)])
+            conn.executemany('INSERT OR IGNORE INTO words VALUES (?, ?, ?)',
+                             [(w, fid, cid) for w in words(text)])
+
+    def indexed(self):
+        """Returns a dict mapping history file basenames to the number of
+        their commands which are in the index.
+        """
+        conn = self._connect()
+        try:
+            rows = conn.execute('SELECT file, ncmds FROM files').fetchall()
+        finally:
+            conn.close()
+        return dict(rows)
+
+    def scanned(self):
+        """Returns a dict mapping history file basenames to the metadata that
+        was stored for them by set_scanned().
+        """
+        conn = self._connect()
+        try:
+            rows = conn.execute('SELECT file, meta FROM scanned').fetchall()
+        finally:
+            conn.close()
+        return {key: json.loads(meta) for key, meta in rows}
+
+    def set_scanned(self, changed, removed=()):
+        """Stores the metadata of the history files that have changed, as a
+        dict mapping their basenames to JSON-serializable metadata, and
+        forgets the metadata of removed files.
+        """
+        conn = self._connect()
+        try:
+            with conn:
+                conn.executemany(
+                    'INSERT OR REPLACE INTO scanned VALUES (?, ?)',
+                    [(key, json.dumps(meta)) for key, meta in changed.items()])
+                conn.executemany('DELETE FROM scanned WHERE file = ?',
+                                 [(key,) for key in removed])
+        finally:
+            conn.close()
+
+    def remove(self, fname):
+        """Removes all of the commands from a history file from the index."""
+        key = os.path.basename(fname)
+        conn = self._connect()
+        try:
+            with conn:
+                ids = 'SELECT id FROM cmds WHERE file = ?'
+                conn.execute('DELETE FROM grams WHERE cmd IN (' + ids + ')',
+                             (key,))
+                conn.execute('DELETE FROM words WHERE cmd IN (' + ids + ')',
+                             (key,))
+                conn.execute('DELETE FROM cmds WHERE file = ?', (key,))
+                conn.execute('DELETE FROM files WHERE file = ?', (key,))
+        finally:
+            conn.close()
+
+    def search(self, query, prefix=False, fields=FIELDS, rtn=None,
+               after=None, before=None, limit=None):
+        """Searches the index.
+
+        Parameters
+        ----------
+        query : str
+            Text to search for, case-insensitively.
+        prefix : bool, optional
+            If True, match commands that contain a word starting with the
+            query. Otherwise, match commands that contain the query anywhere.
+        fields : sequence of str, optional
+            Which of 'inp' and 'out' to search.
+        rtn : int, optional
+            Only match commands with this return code.
+        after, before : float, datetime, or str, optional
+            Only match commands started in this time range.
+        limit : int, optional
+            Only return the most recent matches, up to this number.
+
+        Returns
+        -------
+        results : list of dicts
+            Matching commands sorted by start time, with the keys 'file',
+            'sessionid', 'idx', 'inp', 'out', 'rtn', and 'ts'.
+        """
+        if limit is not None and limit <= 0:
+            return []
+        fids = [FIELD_IDS[f] for f in fields]
+        candidates = []
+        args = []
+        for fid in fids:
+            sql, a = self._candidates_sql(query, prefix, fid)
+            if sql is None:
+                candidates = None
+                break
+            candidates.append(sql)
+            args.extend(a)
+        sql = ('SELECT c.file, f.sessionid, c.idx, c.inp, c.out, c.rtn, '
+               'c.tsb, c.tse FROM cmds AS c LEFT JOIN files AS f '
+               'ON c.file = f.file')
+        conds = []
+        if candidates is not None:
+            conds.append('c.id IN (' + ' UNION '.join(candidates) + ')')
+        if rtn is not None:
+            conds.append('c.rtn = ?')
+            args.append(rtn)
+        after = to_timestamp(after)
+        if after is not None:
+            conds.append('c.tsb >= ?')
+            args.append(after)
+        before = to_timestamp(before)
+        if before is not None:
+            conds.append('c.tsb <= ?')
+            args.append(before)
+        if conds:
+            sql += ' WHERE ' + ' AND '.join(conds)
+        sql += ' ORDER BY c.tsb DESC'
+        results = []
+        conn = self._connect()
+        try:
+            for row in conn.execute(sql, args):
+                file, sid, idx, inp, out, r, tsb, tse = row
+                texts = {'inp': inp, 'out': out}
+                if not any(matches(texts[f], query, prefix=prefix)
+                           for f in fields):
+                    continue
+                results.append({'file': file, 'sessionid': sid, 'idx': idx,
+                                'inp': inp, 'out': out, 'rtn': r,
+                                'ts': [tsb, tse]})
+                if limit is not None and len(results) >= limit:
+                    break
+        finally:
+            conn.close()
+        results.reverse()
+        return results
+
+    def _candidates_sql(self, query, prefix, fid):
+        """Returns SQL and arguments that select the ids of the candidate
+        commands for a query in a field, or (None, None) if the query is too
+        short to use the index.
+        """
+        if prefix:
+            qwords = words(query)
+            if len(qwords) != 1:
+                return None, None
+            w = qwords.pop()
+            return ('SELECT cmd FROM words WHERE field = ? AND word >= ? '
+                    'AND word < ?', [fid, w, w + '\U0010ffff'])
+        grams = trigrams(query)
+        if not grams:
+            return None, None
+        grams = sorted(grams)
+        marks = ', '.join(['?'] * len(grams))
+        return ('SELECT cmd FROM grams WHERE field = ? AND gram IN (' +
+                marks + ') GROUP BY cmd HAVING COUNT(*) = ?',
+                [fid] + grams + [len(grams)])
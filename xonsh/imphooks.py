@@ -2,16 +2,80 @@
 """Import hooks for importing xonsh source files.
 
 This module registers the hooks it defines when it is imported.
+
+The compiled code of xonsh modules is cached in ``__pycache__`` directories
+next to their sources, like the bytecode of Python modules. A cache file is
+only used if the size and modification time of the source, the version of
+xonsh, and the Python bytecode version all match the ones it was written
+with, so that imports of unchanged modules never run the parser.
 """
 import builtins
 from importlib.abc import MetaPathFinder, SourceLoader
 from importlib.machinery import ModuleSpec
+from importlib.util import MAGIC_NUMBER
 import os
 import sys
+import struct
+import marshal
 
+from xonsh import __version__ as XONSH_VERSION
 from xonsh.execer import Execer
 from xonsh.platform import scandir
 
+XSH_BYTECODE_SUFFIX = '.xsh.pyc'
+
+
+def cache_from_source(path):
+    """Returns the path of the cached code of a xonsh source file, or None if
+    the Python implementation has no cache tag.
+    """
+    tag = sys.implementation.cache_tag
+    if tag is None:
+        return None
+    head, tail = os.path.split(path)
+    base = tail[:-4] if tail.endswith('.xsh') else tail
+    return os.path.join(head, '__pycache__', base + '.' + tag +
+                        XSH_BYTECODE_SUFFIX)
+
+
+def _cache_header(st):
+    """Returns the header of the cached code for a source file with the given
+    stat result.
+    """
+    return (MAGIC_NUMBER + struct.pack('<qq', st.st_mtime_ns, st.st_size) +
+            XONSH_VERSION.encode() + b'\0')
+
+
+def _load_cache(cachefname, header):
+    """Returns the code in a cache file, or None if the file doesn't exist or
+    its header doesn't match.
+    """
+    try:
+        with open(cachefname, 'rb') as f:
+            if f.read(len(header)) != header:
+                return None
+            return marshal.load(f)
+    except (OSError, EOFError, ValueError, TypeError):
+        return None
+
+
+def _write_cache(cachefname, header, code):
+    """Writes code to a cache file, without ever leaving a partially written
+    file behind. Errors are ignored, since the cache is only an optimization.
+    """
+    tmpfname = '{0}.{1}'.format(cachefname, os.getpid())
+    try:
+        os.makedirs(os.path.dirname(cachefname), exist_ok=True)
+        with open(tmpfname, 'wb') as f:
+            f.write(header)
+            marshal.dump(code, f)
+        os.replace(tmpfname, cachefname)
+    except OSError:
+        try:
+            os.unlink(tmpfname)
+        except OSError:
+            pass
+
 
 class XonshImportHook(MetaPathFinder, SourceLoader):
     """Implements the import hook for xonsh source files."""
@@ -20,6 +84,7 @@ class XonshImportHook(MetaPathFinder, SourceLoader):
         super(XonshImportHook, self).__init__(*args, **kwargs)
         self._filenames = {}
         self._execer = None
+        self._path_cache = {}  # directory -> (mtime, names of xonsh modules)
 
     @property
     def execer(self):
@@ -48,15 +113,40 @@ class XonshImportHook(MetaPathFinder, SourceLoader):
         for p in path:
             if not isinstance(p, str):
                 continue
-            if not os.path.isdir(p):
-                continue
-            if fname not in (x.name for x in scandir(p)):
+            if name not in self._xsh_modules(p):
                 continue
             spec = ModuleSpec(fullname, self)
             self._filenames[fullname] = os.path.join(p, fname)
             break
         return spec
 
+    def invalidate_caches(self):
+        """Forgets the cached directory listings. This is called by
+        ``importlib.invalidate_caches()``.
+        """
+        self._path_cache.clear()
+
+    def _xsh_modules(self, path):
+        """Returns the names of the xonsh modules in a directory. These are
+        cached until the modification time of the directory changes, like
+        the listings of importlib's FileFinder.
+        """
+        try:
+            mtime = os.stat(path).st_mtime
+        except OSError:
+            return frozenset()
+        key = os.path.abspath(path)
+        cached = self._path_cache.get(key)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+        try:
+            names = frozenset(x.name[:-4] for x in scandir(path)
+                              if x.name.endswith('.xsh'))
+        except OSError:
+            names = frozenset()
+        self._path_cache[key] = (mtime, names)
+        return names
+
     #
     # SourceLoader methods
     #
@@ -66,14 +156,27 @@ class XonshImportHook(MetaPathFinder, SourceLoader):
 
     def get_data(self, path):
         """Gets the bytes for a path."""
-        raise NotImplementedError
+        with open(path, 'rb') as f:
+            return f.read()
 
     def get_code(self, fullname):
-        """Gets the code object for a xonsh file."""
+        """Gets the code object for a xonsh file, from its cache if the file
+        hasn't changed since it was cached.
+        """
         filename = self._filenames.get(fullname, None)
         if filename is None:
             msg = "xonsh file {0!r} could not be found".format(fullname)
             raise ImportError(msg)
+        try:
+            header = _cache_header(os.stat(filename))
+        except OSError:
+            msg = "xonsh file {0!r} could not be found".format(fullname)
+            raise ImportError(msg)
+        cachefname = cache_from_source(filename)
+        if cachefname is not None:
+            code = _load_cache(cachefname, header)
+            if code is not None:
+                return code
         with open(filename, 'r') as f:
             src = f.read()
         src = src if src.endswith('\n') else src + '\n'
@@ -81,7 +184,20 @@ class XonshImportHook(MetaPathFinder, SourceLoader):
         execer.filename = filename
         ctx = {}  # dummy for modules
         code = execer.compile(src, glbs=ctx, locs=ctx)
+        if cachefname is not None and not sys.dont_write_bytecode:
+            _write_cache(cachefname, header, code)
         return code
 
 
-sys.meta_path.append(XonshImportHook())
+def install_hook():
+    """Puts the xonsh import hook in sys.meta_path, unless it is already
+    there.
+    """
+    for hook in sys.meta_path:
+        if isinstance(hook, XonshImportHook):
+            break
+    else:
+        sys.meta_path.append(XonshImportHook())
+
+
+install_hook()
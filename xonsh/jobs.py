@@ -4,9 +4,11 @@ import os
 import sys
 import time
 import ctypes
+import heapq
 import signal
 import builtins
 import functools
+import threading
 import subprocess
 import collections
 
@@ -17,6 +19,14 @@ tasks = LazyObject(collections.deque, globals(), 'tasks')
 # Track time stamp of last exit command, so that two consecutive attempts to
 # exit can kill all jobs and exit.
 _last_exit_time = None
+# Job numbers that are free again, below the highest number in use.
+_free_job_nums = []
+# Job numbers whose status has changed in the background. These are appended
+# by the SIGCHLD handler, and handled by _clear_dead_jobs() outside of it.
+_changed_jobs = collections.deque()
+# Lines describing background jobs that have finished or stopped, to be
+# printed before the next prompt.
+_job_notices = []
 
 
 if ON_DARWIN:
@@ -61,6 +71,18 @@ if ON_WINDOWS:
     def _set_pgrp(info):
         pass
 
+    def _install_sigchld_handler(chain=False):
+        pass
+
+    def _watch_job(num, info):
+        pass
+
+    def _unwatch_job(info):
+        pass
+
+    def _sigchld_installed():
+        return False
+
     def wait_for_active_job(signal_to_send=None):
         """
         Wait for the active job to finish, to be killed by SIGINT, or to be
@@ -106,6 +128,110 @@ else:
 
     _shell_pgrp = os.getpgrp()
 
+    # Maps the pids of the processes of jobs that are still running, or
+    # stopped, to their job numbers. The process group of a job is the pid of
+    # its first process, so this indexes jobs by process group too.
+    _pid_jobs = {}
+    # The SIGCHLD handler that was replaced by ours, which ours calls.
+    _chained_sigchld_handler = None
+
+    def _sigchld_installed():
+        return signal.getsignal(signal.SIGCHLD) is _sigchld_handler
+
+    def _install_sigchld_handler(chain=False):
+        """Starts reaping the processes of background jobs as they exit.
+        Signal handlers may only be set from the main thread. A handler that
+        someone else has set is left alone, in which case the jobs are polled
+        instead, unless chain is true, in which case it is called by ours.
+        """
+        global _chained_sigchld_handler
+        if threading.current_thread() is not threading.main_thread():
+            return
+        handler = signal.getsignal(signal.SIGCHLD)
+        if handler is _sigchld_handler:
+            return
+        elif handler in (signal.SIG_DFL, None):
+            _chained_sigchld_handler = None
+        elif chain and callable(handler):
+            _chained_sigchld_handler = handler
+        else:
+            return
+        signal.signal(signal.SIGCHLD, _sigchld_handler)
+        # restart interrupted system calls, rather than failing them
+        signal.siginterrupt(signal.SIGCHLD, False)
+
+    def _watch_job(num, info):
+        _install_sigchld_handler()
+        # proxy stages have no pid, or the pid of the shell itself
+        mypid = os.getpid()
+        pids = [pid for pid in info['pids']
+                if pid is not None and pid != mypid]
+        info['nalive'] = len(pids)
+        # the processes may have exited before they were registered, in
+        # which case their SIGCHLD has come and gone, so they are reaped here,
+        # where the handler can't interrupt
+        signal.pthread_sigmask(signal.SIG_BLOCK, [signal.SIGCHLD])
+        try:
+            for pid in pids:
+                _pid_jobs[pid] = num
+            if info['bg']:
+                for pid in pids:
+                    _reap(pid, num, info)
+        finally:
+            signal.pthread_sigmask(signal.SIG_UNBLOCK, [signal.SIGCHLD])
+
+    def _unwatch_job(info):
+        for pid in info['pids']:
+            _pid_jobs.pop(pid, None)
+
+    def _reap(pid, num, job):
+        """Reaps a process of a job if it has exited, or records that it has
+        stopped, without waiting for it.
+        """
+        try:
+            wpid, wcode = os.waitpid(pid, os.WNOHANG | os.WUNTRACED)
+        except ChildProcessError:
+            wpid, wcode = pid, None  # reaped by someone else
+        if wpid == 0:
+            return
+        if wcode is not None and os.WIFSTOPPED(wcode):
+            job['status'] = 'stopped'
+            _changed_jobs.append(num)
+            return
+        _pid_jobs.pop(pid, None)
+        obj = job['obj']
+        if pid == obj.pid and wcode is not None:
+            if os.WIFSIGNALED(wcode):
+                obj.signal = (os.WTERMSIG(wcode), os.WCOREDUMP(wcode))
+                obj.returncode = -os.WTERMSIG(wcode)
+            else:
+                obj.signal = None
+                obj.returncode = os.WEXITSTATUS(wcode)
+        job['nalive'] -= 1
+        if job['nalive'] <= 0 or pid == obj.pid:
+            job['status'] = 'done'
+            _changed_jobs.append(num)
+
+    def _sigchld_handler(signum, frame):
+        """Reaps the processes of jobs which are not in the foreground, and
+        records their new status. This only touches the job that a process
+        belongs to, never the job table itself, so that it is safe to
+        interrupt the shell anywhere. Foreground jobs are waited for by
+        wait_for_active_job(). The handler that this one replaced, if it was
+        chained, is called afterwards.
+        """
+        all_jobs = getattr(builtins, '__xonsh_all_jobs__', {})
+        for pid, num in list(_pid_jobs.items()):
+            job = all_jobs.get(num)
+            if job is None:
+                _pid_jobs.pop(pid, None)
+                continue
+            if not job['bg'] and job['status'] == 'running':
+                continue
+            _reap(pid, num, job)
+        if _chained_sigchld_handler is not None:
+            _chained_sigchld_handler(signum, frame)
+
     _block_when_giving = LazyObject(lambda: (signal.SIGTTOU, signal.SIGTTIN,
                                              signal.SIGTSTP, signal.SIGCHLD),
                                     globals(), '_block_when_giving')
@@ -179,7 +305,12 @@ else:
 
         _continue(active_task)
 
-        _, wcode = os.waitpid(obj.pid, os.WUNTRACED)
+        try:
+            _, wcode = os.waitpid(obj.pid, os.WUNTRACED)
+        except ChildProcessError:
+            # it exited, and was reaped, before it was in the foreground
+            remove_job(tasks[0])
+            return wait_for_active_job()
         if os.WIFSTOPPED(wcode):
             print()  # get a newline because ^Z will have been printed
             active_task['status'] = "stopped"
@@ -190,6 +321,8 @@ else:
         else:
             obj.returncode = os.WEXITSTATUS(wcode)
             obj.signal = None
+        if active_task['status'] != 'stopped':
+            remove_job(tasks[0])
 
         return wait_for_active_job()
 
@@ -213,55 +346,114 @@ def get_task(tid):
     return builtins.__xonsh_all_jobs__[tid]
 
 
+def remove_job(num):
+    """Removes a job from the job table, and frees its number. This is
+    for jobs whose processes are waited for by their owner.
+    """
+    job = builtins.__xonsh_all_jobs__.pop(num, None)
+    if job is None:
+        return
+    try:
+        tasks.remove(num)
+    except ValueError:
+        pass
+    _unwatch_job(job)
+    heapq.heappush(_free_job_nums, num)
+
+
 def _clear_dead_jobs():
-    to_remove = set()
-    for tid in tasks:
-        obj = get_task(tid)['obj']
-        if obj.poll() is not None:
-            to_remove.add(tid)
-    for job in to_remove:
-        tasks.remove(job)
-        del builtins.__xonsh_all_jobs__[job]
+    """Removes the jobs that have finished from the job table. Background
+    jobs that have finished or stopped are remembered, to be reported by
+    print_job_notices() in interactive mode.
+    """
+    all_jobs = builtins.__xonsh_all_jobs__
+    if not _sigchld_installed():
+        # without a SIGCHLD handler, every job has to be polled
+        for tid in tasks:
+            job = all_jobs[tid]
+            if job['obj'].poll() is not None:
+                job['status'] = 'done'
+                _changed_jobs.append(tid)
+    interactive = builtins.__xonsh_env__.get('XONSH_INTERACTIVE')
+    while _changed_jobs:
+        num = _changed_jobs.popleft()
+        job = all_jobs.get(num)
+        if job is None:
+            continue
+        status = job['status']
+        if job['bg'] and interactive and status in ('done', 'stopped'):
+            _job_notices.append(_format_job(num))
+        if status == 'done':
+            remove_job(num)
+
+
+def print_job_notices(outfile=None):
+    """Prints the background jobs that have finished or stopped since this
+    was last called. The shells call this before showing a prompt.
+    """
+    _clear_dead_jobs()
+    outfile = sys.stdout if outfile is None else outfile
+    while _job_notices:
+        print(_job_notices.pop(0), file=outfile)
 
 
-def print_one_job(num, outfile=sys.stdout):
-    """Print a line describing job number ``num``."""
-    try:
-        job = builtins.__xonsh_all_jobs__[num]
-    except KeyError:
-        return
-    pos = '+' if tasks[0] == num else '-' if tasks[1] == num else ' '
+def _format_job(num):
+    job = builtins.__xonsh_all_jobs__[num]
+    if len(tasks) > 0 and tasks[0] == num:
+        pos = '+'
+    elif len(tasks) > 1 and tasks[1] == num:
+        pos = '-'
+    else:
+        pos = ' '
     status = job['status']
     cmd = [' '.join(i) if isinstance(i, list) else i for i in job['cmds']]
     cmd = ' '.join(cmd)
     pid = job['pids'][-1]
     bg = ' &' if job['bg'] else ''
-    print('[{}]{} {}: {}{} ({})'.format(num, pos, status, cmd, bg, pid),
-          file=outfile)
+    return '[{}]{} {}: {}{} ({})'.format(num, pos, status, cmd, bg, pid)
+
+
+def print_one_job(num, outfile=sys.stdout):
+    """Print a line describing job number ``num``."""
+    if num not in builtins.__xonsh_all_jobs__:
+        return
+    print(_format_job(num), file=outfile)
 
 
 def get_next_job_number():
     """Get the lowest available unique job number (for the next job created).
     """
     _clear_dead_jobs()
-    i = 1
-    while i in builtins.__xonsh_all_jobs__:
-        i += 1
-    return i
+    all_jobs = builtins.__xonsh_all_jobs__
+    while _free_job_nums:
+        num = _free_job_nums[0]
+        if num not in all_jobs:
+            return num
+        heapq.heappop(_free_job_nums)
+    # every number up to the number of jobs is taken, unless the job table
+    # was changed from elsewhere
+    num = len(all_jobs) + 1
+    while num in all_jobs:
+        num += 1
+    return num
 
 
 def add_job(info):
     """
-    Add a new job to the jobs dictionary.
+    Add a new job to the jobs dictionary, and return its number.
     """
     num = get_next_job_number()
+    if _free_job_nums and _free_job_nums[0] == num:
+        heapq.heappop(_free_job_nums)
     info['started'] = time.time()
     info['status'] = "running"
     _set_pgrp(info)
     tasks.appendleft(num)
     builtins.__xonsh_all_jobs__[num] = info
+    _watch_job(num, info)
     if info['bg']:
         print_one_job(num)
+    return num
 
 
 def clean_jobs():
@@ -56,6 +56,22 @@ class LazyObject(object):
         obj = self._lazy_obj()
         yield from obj
 
+    def __getitem__(self, item):
+        obj = self._lazy_obj()
+        return obj[item]
+
+    def __contains__(self, item):
+        obj = self._lazy_obj()
+        return item in obj
+
+    def __len__(self):
+        obj = self._lazy_obj()
+        return len(obj)
+
+    def __call__(self, *args, **kwargs):
+        obj = self._lazy_obj()
+        return obj(*args, **kwargs)
+
 
 class LazyDict(abc.MutableMapping):
 
@@ -113,9 +129,13 @@ class LazyDict(abc.MutableMapping):
             del self._loaders[key]
             self._destruct()
 
+    def __contains__(self, key):
+        # checking for a key must not load its value
+        return key in self._d or key in self._loaders
+
     def __delitem__(self, key):
         if key in self._d:
-            del self._d[lkey]
+            del self._d[key]
         else:
             del self._loaders[key]
             self._destruct()
@@ -3,19 +3,18 @@
 
 Written using a hybrid of ``tokenize`` and PLY.
 """
+import re
 from io import BytesIO
 from keyword import kwlist
 
-try:
-    from ply.lex import LexToken
-except ImportError:
-    from xonsh.ply.lex import LexToken
-
 from xonsh.lazyasd import LazyObject
 from xonsh.platform import PYTHON_VERSION_INFO
 from xonsh.tokenize import (OP, IOREDIRECT, STRING, DOLLARNAME, NUMBER,
     SEARCHPATH, NEWLINE, INDENT, DEDENT, NL, COMMENT, ENCODING,
-    ENDMARKER, NAME, ERRORTOKEN, tokenize, TokenError)
+    ENDMARKER, NAME, ERRORTOKEN, tokenize, TokenError, TokenInfo,
+    Whitespace, Comment, Triple, SearchPath, IORedirect, Number, Operator,
+    Bracket, ContStr, Name_RE, group, endpats, triple_quoted, tabsize,
+    cookie_re, _get_normal_name)
 
 
 def _token_map():
@@ -288,13 +287,277 @@ def get_tokens(s):
             break
 
 
+def _master_re():
+    """The regex that matches the next token of ``fast_tokens()``, with a
+    named group for every kind of token. These are the alternatives of
+    ``tokenize.PseudoToken``, in the same order, so that both always match the
+    same tokens. A character that starts no token is matched by the 'error'
+    group, as it would be an ``ERRORTOKEN`` from ``tokenize``.
+    """
+    alts = [('cont', r'\\\r?\n'), ('end', r'\Z'), ('comment', Comment),
+            ('triple', Triple), ('searchpath', SearchPath),
+            ('ioredirect', IORedirect), ('number', Number),
+            ('newline', r'\r?\n'),
+            ('op', group(Operator, Bracket, r'\.\.\.', r'[:;.,@]')),
+            ('string', ContStr), ('name', Name_RE)]
+    body = '|'.join('(?P<{0}>{1})'.format(n, p) for n, p in alts)
+    return re.compile(Whitespace + '(?:' + body + r')|(?P<error>[\s\S])',
+                      re.UNICODE)
+
+
+master_re = LazyObject(_master_re, globals(), 'master_re')
+del _master_re
+
+
+def _triple_ends():
+    # unlike tokenize, which matches the rest of a string line by line,
+    # these match it in the whole buffer, so escaped newlines have to match
+    return {tok: re.compile(pat, re.UNICODE | re.DOTALL)
+            for tok, pat in endpats.items() if tok in triple_quoted}
+
+
+triple_ends = LazyObject(_triple_ends, globals(), 'triple_ends')
+del _triple_ends
+
+
+_OPENERS = {'(': ('LPAREN', True, ')'), '[': ('LBRACKET', True, ']'),
+            '{': ('LBRACE', True, '}'), '$(': ('DOLLAR_LPAREN', False, ')'),
+            '$[': ('DOLLAR_LBRACKET', False, ']'),
+            '${': ('DOLLAR_LBRACE', True, '}'),
+            '!(': ('BANG_LPAREN', False, ')'),
+            '![': ('BANG_LBRACKET', False, ']'),
+            '@(': ('AT_LPAREN', True, ')'),
+            '@$(': ('ATDOLLAR_LPAREN', False, ')')}
+_CLOSERS = {')': 'RPAREN', ']': 'RBRACKET', '}': 'RBRACE'}
+_KEYWORDS = frozenset(kwlist)
+
+
+class _Unsupported(Exception):
+    """Raised for input that ``fast_tokens()`` leaves to ``get_tokens()``."""
+
+
+def fast_tokens(s):
+    """
+    Given a string containing xonsh code, returns the list of the same PLY
+    tokens that ``get_tokens`` generates, or None if only ``get_tokens``
+    can make them. Rather than running ``tokenize`` line by line, this
+    matches ``master_re`` over the whole string, and handles each token
+    in place.
+
+    Input with byte order marks, encoding cookies other than UTF-8,
+    carriage returns, strings continued with a backslash, async code, or
+    inconsistent indentation is left to ``get_tokens``.
+    """
+    try:
+        return _fast_tokens(s)
+    except (_Unsupported, UnicodeEncodeError):
+        return None
+
+
+def _fast_tokens(s):
+    if '\r' in s or s.startswith('\ufeff'):
+        raise _Unsupported
+    for line in s.split('\n', 2)[:2]:
+        m = cookie_re.match(line)
+        if m is not None and _get_normal_name(m.group(1)) != 'utf-8':
+            raise _Unsupported
+    s.encode('utf-8')  # tokenize fails on lone surrogates
+    match = master_re.match
+    toks = []
+    append = toks.append
+    n = len(s)
+    pos = row = parenlev = 0
+    continued = False
+    indents = [0]
+    pymode = [(True, '', '', (0, 0))]
+    # the end of the last token that handle_token remembers
+    lastrow = lastcol = 0
+    while True:
+        # the start of a physical line
+        row += 1
+        bol = pos
+        if pos == n:
+            if parenlev > 0 or continued:
+                append(LexToken('ERRORTOKEN', 'EOF in multi-line statement',
+                                0, 0))
+                return toks
+            break
+        if parenlev == 0 and not continued:
+            column = 0
+            while pos < n:
+                c = s[pos]
+                if c == ' ':
+                    column += 1
+                elif c == '\t':
+                    column = (column // tabsize + 1) * tabsize
+                elif c == '\f':
+                    column = 0
+                else:
+                    break
+                pos += 1
+            if pos == n:
+                break
+            if s[pos] in '#\n':
+                # comments and blank lines make no tokens
+                pos = s.find('\n', pos) + 1 or n
+                continue
+            if column > indents[-1]:
+                indents.append(column)
+                append(LexToken('INDENT', s[bol:pos], row, 0))
+                lastrow, lastcol = row, pos - bol
+            while column < indents[-1]:
+                if column not in indents:
+                    raise _Unsupported  # an IndentationError
+                indents.pop()
+                append(LexToken('DEDENT', '', row, pos - bol))
+                lastrow, lastcol = row, pos - bol
+        else:
+            continued = False
+        while True:
+            m = match(s, pos)
+            kind = m.lastgroup
+            start, pos = m.span(kind)
+            tok = s[start:pos]
+            col = start - bol
+            if kind == 'triple':
+                em = triple_ends[tok].match(s, pos)
+                if em is None:
+                    append(LexToken('ERRORTOKEN', 'EOF in multi-line string',
+                                    0, 0))
+                    return toks
+            if (not pymode[-1][0] and lastrow == row and col > lastcol and
+                    kind != 'cont' and kind != 'end'):
+                # whitespace is a token in subprocess mode
+                append(LexToken('WS', s[bol + lastcol:start], row, lastcol))
+            if kind == 'name':
+                if tok[0] == '$':
+                    if tok[1:].isidentifier():
+                        append(LexToken('DOLLAR_NAME', tok, row, col))
+                        lastrow, lastcol = row, pos - bol
+                    else:
+                        _unexpected(append, OP, tok, row, col, s, bol, pos)
+                elif tok[0].isidentifier():
+                    if tok == 'async' or tok == 'await':
+                        raise _Unsupported
+                    if pymode[-1][0]:
+                        typ = tok.upper() if tok in _KEYWORDS else 'NAME'
+                    else:
+                        typ = ('AND' if tok == 'and' else
+                               'OR' if tok == 'or' else 'NAME')
+                    append(LexToken(typ, tok, row, col))
+                    lastrow, lastcol = row, pos - bol
+                else:
+                    _unexpected(append, OP, tok, row, col, s, bol, pos)
+            elif kind == 'op':
+                if tok in _OPENERS:
+                    typ, mode, matcher = _OPENERS[tok]
+                    parenlev += 1
+                    pymode.append((mode, tok, matcher, (row, col)))
+                    append(LexToken(typ, tok, row, col))
+                    lastrow, lastcol = row, pos - bol
+                elif tok in _CLOSERS:
+                    parenlev -= 1
+                    if parenlev < 0:
+                        raise _Unsupported  # get_tokens loses track of them
+                    mode, orig, matcher, opos = pymode.pop()
+                    if tok == matcher:
+                        append(LexToken(_CLOSERS[tok], tok, row, col))
+                        lastrow, lastcol = row, pos - bol
+                    else:
+                        e = '"{}" at {} ends "{}" at {} (expected "{}")'
+                        e = e.format(tok, (row, col), orig, opos, matcher)
+                        append(LexToken('ERRORTOKEN', e, row, col))
+                elif tok == '&&':
+                    append(LexToken('AND', 'and', row, col))
+                elif tok == '||':
+                    append(LexToken('OR', 'or', row, col))
+                elif (OP, tok) in token_map:
+                    append(LexToken(token_map[OP, tok], tok, row, col))
+                    lastrow, lastcol = row, pos - bol
+                else:
+                    _unexpected(append, OP, tok, row, col, s, bol, pos)
+            elif kind == 'newline':
+                if parenlev > 0:
+                    break  # a NL
+                append(LexToken('NEWLINE', tok, row, col))
+                lastrow, lastcol = row, pos - bol
+                break
+            elif kind == 'number':
+                append(LexToken('NUMBER', tok, row, col))
+                lastrow, lastcol = row, pos - bol
+            elif kind == 'string':
+                if tok[-1] == '\n':
+                    raise _Unsupported  # continued with a backslash
+                append(LexToken('STRING', tok, row, col))
+                lastrow, lastcol = row, pos - bol
+            elif kind == 'triple':
+                pos = em.end()
+                tok = s[start:pos]
+                append(LexToken('STRING', tok, row, col))
+                nl = tok.count('\n')
+                if nl > 0:
+                    row += nl
+                    bol = s.rfind('\n', 0, pos) + 1
+                lastrow, lastcol = row, pos - bol
+            elif kind == 'ioredirect':
+                append(LexToken('IOREDIRECT', tok, row, col))
+                lastrow, lastcol = row, pos - bol
+            elif kind == 'searchpath':
+                append(LexToken('SEARCHPATH', tok, row, col))
+                lastrow, lastcol = row, pos - bol
+            elif kind == 'comment':
+                pass
+            elif kind == 'error':
+                if tok == ' ':
+                    if not pymode[-1][0]:
+                        append(LexToken('WS', tok, row, col))
+                        lastrow, lastcol = row, pos - bol
+                else:
+                    typ = 'ERRORTOKEN' if pymode[-1][0] else 'NAME'
+                    append(LexToken(typ, tok, row, col))
+                    lastrow, lastcol = row, pos - bol
+            elif kind == 'cont':
+                continued = True
+                break
+            else:  # the end of the last line
+                break
+    for indent in indents[1:]:
+        append(LexToken('DEDENT', '', row, 0))
+    return toks
+
+
+def _unexpected(append, typ, tok, row, col, s, bol, pos):
+    """Appends the error token for a token that the lexer doesn't know."""
+    eol = s.find('\n', pos) + 1 or len(s)
+    info = TokenInfo(typ, tok, (row, col), (row, pos - bol), s[bol:eol])
+    append(LexToken('ERRORTOKEN', 'Unexpected token: {0}'.format(info),
+                    row, col))
+
+
+class LexToken(object):
+    """A PLY token, which the parser takes from the lexer. Unlike the tokens
+    of ``ply.lex``, these have no ``__dict__``, since a large script lexes
+    into very many of them.
+    """
+
+    __slots__ = ('type', 'value', 'lineno', 'lexpos', 'lexer')
+
+    def __init__(self, type, value, lineno, lexpos):
+        self.type = type
+        self.value = value
+        self.lineno = lineno
+        self.lexpos = lexpos
+
+    def __str__(self):
+        return 'LexToken({0},{1!r},{2},{3})'.format(self.type, self.value,
+                                                   self.lineno, self.lexpos)
+
+    __repr__ = __str__
+
+
 # synthesize a new PLY token
 def _new_token(type, value, pos):
-    o = LexToken()
-    o.type = type
-    o.value = value
-    o.lineno, o.lexpos = pos
-    return o
+    return LexToken(type, value, pos[0], pos[1])
 
 
 class Lexer(object):
@@ -310,11 +573,15 @@ class Lexer(object):
             The last token seen.
         lineno : int
             The last line number seen.
+        fast : bool
+            Whether the tokens are made by ``fast_tokens()`` when it can make
+            them, rather than by ``get_tokens()``.
 
         """
         self.fname = ''
         self.last = None
         self.beforelast = None
+        self.fast = True
 
     def build(self, **kwargs):
         """Part of the PLY lexer API."""
@@ -325,7 +592,11 @@ class Lexer(object):
 
     def input(self, s):
         """Calls the lexer on the string s."""
-        self.token_stream = get_tokens(s)
+        toks = fast_tokens(s) if self.fast else None
+        if toks is None:
+            self.token_stream = get_tokens(s)
+        else:
+            self.token_stream = iter(toks)
 
     def token(self):
         """Retrieves the next token."""
@@ -15,16 +15,11 @@ except ImportError:
 
 from xonsh import __version__
 from xonsh.lazyasd import LazyObject
-from xonsh.environ import DEFAULT_VALUES
-from xonsh.shell import Shell
-from xonsh.pretty import pprint, pretty
-from xonsh.proc import HiddenCompletedCommand
-from xonsh.jobs import ignore_sigtstp
-from xonsh.tools import setup_win_unicode_console, print_color
-from xonsh.platform import HAS_PYGMENTS, ON_WINDOWS
-from xonsh.codecache import run_script_with_cache, run_code_with_cache
-
 
+# These are only imported when they are used, so that running a command on a
+# xonsh server doesn't have to import the rest of xonsh.
+Shell = LazyObject(lambda: importlib.import_module('xonsh.shell').Shell,
+                   globals(), 'Shell')
 pygments = LazyObject(lambda: importlib.import_module('pygments'),
                       globals(), 'pygments')
 pyghooks = LazyObject(lambda: importlib.import_module('xonsh.pyghooks'),
@@ -89,6 +84,20 @@ parser.add_argument('--cache-everything',
                     dest='cacheall',
                     action='store_true',
                     default=False)
+parser.add_argument('--timings',
+                    help='print how long the code cache took to load or '
+                         'compile the run control files, sourced files, and '
+                         'scripts, and the parse time that it saved',
+                    dest='timings',
+                    action='store_true',
+                    default=False)
+parser.add_argument('--server',
+                    help='serve the commands and scripts of xonsh processes '
+                         'that are started with the same '
+                         '$XONSH_SERVER_SOCKET, by forking this process',
+                    dest='server',
+                    action='store_true',
+                    default=False)
 parser.add_argument('-D',
                     dest='defines',
                     help='define an environment variable, in the form of '
@@ -120,6 +129,11 @@ parser.add_argument('args',
 def _pprint_displayhook(value):
     if value is None:
         return
+    # lazy imports
+    from xonsh.pretty import pretty
+    from xonsh.proc import HiddenCompletedCommand
+    from xonsh.tools import print_color
+    from xonsh.platform import HAS_PYGMENTS
     builtins._ = None  # Set '_' to None to avoid recursion
     if isinstance(value, HiddenCompletedCommand):
         builtins._ = value
@@ -142,13 +156,13 @@ class XonshMode(enum.Enum):
     script_from_file = 1
     script_from_stdin = 2
     interactive = 3
+    server = 4
 
 
-def premain(argv=None):
-    """Setup for main xonsh entry point, returns parsed arguments."""
-    if setproctitle is not None:
-        setproctitle(' '.join(['xonsh'] + sys.argv[1:]))
-    builtins.__xonsh_ctx__ = {}
+def _parse_args(argv=None):
+    """Parses the command line arguments, and works out the mode that xonsh
+    runs in.
+    """
     args, other = parser.parse_known_args(argv)
     if args.file is not None:
         arguments = (argv or sys.argv)
@@ -165,11 +179,44 @@ def premain(argv=None):
         args.args = arguments[file_index+1:]
     if args.help:
         parser.print_help()
-        exit()
+        sys.exit()
     if args.version:
         version = '/'.join(('xonsh', __version__)),
         print(version)
-        exit()
+        sys.exit()
+    if args.server:
+        args.mode = XonshMode.server
+    elif args.command is not None:
+        args.mode = XonshMode.single_command
+    elif args.file is not None:
+        args.mode = XonshMode.script_from_file
+    elif not sys.stdin.isatty() and not args.force_interactive:
+        args.mode = XonshMode.script_from_stdin
+    else:
+        args.mode = XonshMode.interactive
+    return args
+
+
+def _setup_args(args):
+    """Applies the command line arguments that may differ between the
+    commands that are run by the same shell.
+    """
+    shell = builtins.__xonsh_shell__
+    shell.execer.scriptcache = args.scriptcache
+    shell.execer.cacheall = args.cacheall
+    env = builtins.__xonsh_env__
+    if args.defines is not None:
+        env.update([x.split('=', 1) for x in args.defines])
+    env['XONSH_INTERACTIVE'] = False
+
+
+def premain(argv=None):
+    """Setup for main xonsh entry point, returns parsed arguments."""
+    from xonsh.platform import ON_WINDOWS  # lazy import
+    if setproctitle is not None:
+        setproctitle(' '.join(['xonsh'] + sys.argv[1:]))
+    builtins.__xonsh_ctx__ = {}
+    args = _parse_args(argv)
     shell_kwargs = {'shell_type': args.shell_type,
                     'completer': False,
                     'login': False,
@@ -183,20 +230,13 @@ def premain(argv=None):
     if args.norc:
         shell_kwargs['rc'] = ()
     setattr(sys, 'displayhook', _pprint_displayhook)
-    if args.command is not None:
-        args.mode = XonshMode.single_command
-        shell_kwargs['shell_type'] = 'none'
-    elif args.file is not None:
-        args.mode = XonshMode.script_from_file
-        shell_kwargs['shell_type'] = 'none'
-    elif not sys.stdin.isatty() and not args.force_interactive:
-        args.mode = XonshMode.script_from_stdin
-        shell_kwargs['shell_type'] = 'none'
-    else:
-        args.mode = XonshMode.interactive
+    if args.mode == XonshMode.interactive:
         shell_kwargs['completer'] = True
         shell_kwargs['login'] = True
-    from xonsh import imphooks
+    else:
+        shell_kwargs['shell_type'] = 'none'
+    from xonsh.imphooks import install_hook  # lazy import
+    install_hook()
     shell = builtins.__xonsh_shell__ = Shell(**shell_kwargs)
     env = builtins.__xonsh_env__
     env['XONSH_LOGIN'] = shell_kwargs['login']
@@ -204,13 +244,33 @@ def premain(argv=None):
         env.update([x.split('=', 1) for x in args.defines])
     env['XONSH_INTERACTIVE'] = False
     if ON_WINDOWS:
+        from xonsh.tools import setup_win_unicode_console  # lazy import
         setup_win_unicode_console(env.get('WIN_UNICODE_CONSOLE', True))
     return args
 
 
-def main(argv=None):
-    """Main entry point for xonsh cli."""
-    args = premain(argv)
+def _print_timings():
+    from xonsh import xonfig  # lazy import
+    print(xonfig.xonfig_main(['cache', '--timings']), end='', file=sys.stderr)
+
+
+def _run_on_server(argv=None):
+    """Runs xonsh on the server at $XONSH_SERVER_SOCKET, if it is set, and
+    returns the exit code. Returns None when xonsh has to run in this
+    process instead.
+    """
+    path = os.environ.get('XONSH_SERVER_SOCKET')
+    argv = sys.argv[1:] if argv is None else argv
+    if not path or '--server' in argv:
+        return None
+    from xonsh import server  # lazy import
+    return server.request(path, argv)
+
+
+def _run(args):
+    """Runs xonsh in the mode given by the parsed arguments."""
+    # lazy imports
+    from xonsh.codecache import run_script_with_cache, run_code_with_cache
     env = builtins.__xonsh_env__
     shell = builtins.__xonsh_shell__
     if args.mode == XonshMode.single_command:
@@ -232,8 +292,17 @@ def main(argv=None):
         code = sys.stdin.read()
         run_code_with_cache(code, shell.execer, glb=shell.ctx, loc=None,
                             mode='exec')
+    elif args.mode == XonshMode.server:
+        from xonsh import server  # lazy import
+        path = env.get('XONSH_SERVER_SOCKET')
+        if not path:
+            print('xonsh: $XONSH_SERVER_SOCKET must be set to run a server',
+                  file=sys.stderr)
+            sys.exit(1)
+        server.serve(path, args)
     else:
         # otherwise, enter the shell
+        from xonsh.jobs import ignore_sigtstp  # lazy import
         env['XONSH_INTERACTIVE'] = True
         ignore_sigtstp()
         if (env['XONSH_INTERACTIVE'] and
@@ -242,13 +311,28 @@ def main(argv=None):
             print('Could not find xonsh configuration or run control files.')
             from xonsh import xonfig  # lazy import
             xonfig.xonfig_main(['wizard', '--confirm'])
+        if args.timings:
+            _print_timings()
         shell.cmdloop()
+    if args.timings and args.mode != XonshMode.interactive:
+        _print_timings()
+
+
+def main(argv=None):
+    """Main entry point for xonsh cli."""
+    rtn = _run_on_server(argv)
+    if rtn is not None:
+        sys.exit(rtn)
+    args = premain(argv)
+    _run(args)
     postmain(args)
 
 
 def postmain(args=None):
     """Teardown for main xonsh entry point, accepts parsed arguments."""
+    from xonsh.platform import ON_WINDOWS  # lazy import
     if ON_WINDOWS:
+        from xonsh.tools import setup_win_unicode_console  # lazy import
         setup_win_unicode_console(enable=False)
     if hasattr(builtins, '__xonsh_shell__'):
         del builtins.__xonsh_shell__
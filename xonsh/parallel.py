@@ -0,0 +1,225 @@
+# -*- coding: utf-8 -*-
+"""Runs many subprocess commands at the same time.
+
+The commands are started from the calling thread, at most a given number at
+a time, and each one is added to the job table while it runs. The output of
+every command is buffered, and only handed over once the command has
+finished, so that the outputs of different commands never interleave.
+"""
+import os
+import time
+import argparse
+import builtins
+import subprocess
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+from xonsh.jobs import add_job, remove_job
+from xonsh.platform import ON_POSIX
+from xonsh.proc import CompletedCommand, foreground
+from xonsh.tools import XonshError, XonshCalledProcessError
+
+REPLACE_TOKEN = '{}'
+"""Argument of the parallel command that is replaced by each input line."""
+
+
+def default_jobs():
+    """Returns the default number of commands that run at the same time."""
+    return os.cpu_count() or 1
+
+
+def _decode(b, env):
+    s = b.decode(encoding=env.get('XONSH_ENCODING'),
+                 errors=env.get('XONSH_ENCODING_ERRORS'))
+    return s.replace('\r\n', '\n')
+
+
+class _Job(object):
+    """A command of a parallel run that has been started."""
+
+    def __init__(self, index, cmd, proc, num):
+        self.index = index
+        self.cmd = cmd
+        self.proc = proc
+        self.num = num
+        self.start = time.time()
+
+
+def _start(index, cmd, env, detyped):
+    """Starts a command, and adds it to the job table."""
+    # imported here, since built_ins imports the aliases, which import this
+    from xonsh.built_ins import resolve_alias, _subproc_pre
+    cmd = list(cmd)
+    if len(cmd) == 0:
+        raise XonshError('xonsh: parallel: empty command')
+    cmd, alias, aliased_cmd = resolve_alias(cmd)
+    if callable(aliased_cmd):
+        e = 'xonsh: parallel: cannot run callable alias: {0}'
+        raise XonshError(e.format(cmd[0]))
+    kwargs = {}
+    if ON_POSIX:
+        kwargs['preexec_fn'] = _subproc_pre
+    try:
+        proc = subprocess.Popen(aliased_cmd, stdin=subprocess.DEVNULL,
+                                stdout=subprocess.PIPE,
+                                stderr=subprocess.PIPE,
+                                env=detyped, **kwargs)
+    except PermissionError:
+        e = 'xonsh: subprocess mode: permission denied: {0}'
+        raise XonshError(e.format(aliased_cmd[0]))
+    except FileNotFoundError:
+        e = 'xonsh: subprocess mode: command not found: {0}'
+        raise XonshError(e.format(aliased_cmd[0]))
+    num = add_job({'cmds': [aliased_cmd], 'pids': [proc.pid], 'obj': proc,
+                   'bg': False})
+    return _Job(index, cmd, proc, num)
+
+
+def _finish(job, out, err, env):
+    """Removes a finished command from the job table, and returns its
+    CompletedCommand.
+    """
+    remove_job(job.num)
+    return CompletedCommand(stdout=_decode(out, env),
+                            stderr=_decode(err, env),
+                            pid=job.proc.pid,
+                            returncode=job.proc.returncode,
+                            args=job.cmd,
+                            executed_cmd=job.proc.args,
+                            timestamp=(job.start, time.time()))
+
+
+def iparallel(cmds, jobs=None, ordered=True):
+    """Runs subprocess commands concurrently, and yields the completed
+    commands.
+
+    Parameters
+    ----------
+    cmds : iterable of lists of str
+        The commands to run. Aliases are expanded, but callable aliases
+        can't be run in parallel. This is only consumed as commands are
+        started.
+    jobs : int, optional
+        Maximum number of commands that run at the same time, by default the
+        number of CPUs.
+    ordered : bool, optional
+        Whether the commands are yielded in the order they were given, or
+        as soon as they complete.
+
+    Yields
+    ------
+    CompletedCommand
+        The completed commands, with their output as a str.
+
+    Raises
+    ------
+    XonshCalledProcessError
+        If a command fails while $RAISE_SUBPROC_ERROR is set.
+
+    The commands that are still running are killed when the iteration is
+    interrupted, for example by ctrl-c or by an exception.
+    """
+    jobs = default_jobs() if jobs is None else max(int(jobs), 1)
+    env = builtins.__xonsh_env__
+    detyped = env.detype()
+    raise_error = env.get('RAISE_SUBPROC_ERROR')
+    cmds = enumerate(cmds)
+    running = {}  # future of communicate() -> _Job
+    done = {}  # index -> CompletedCommand, when ordered
+    nyielded = 0
+    exhausted = False
+    executor = ThreadPoolExecutor(max_workers=jobs)
+    try:
+        while True:
+            while not exhausted and len(running) < jobs:
+                try:
+                    index, cmd = next(cmds)
+                except StopIteration:
+                    exhausted = True
+                    break
+                job = _start(index, cmd, env, detyped)
+                running[executor.submit(job.proc.communicate)] = job
+            if not running:
+                break
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in sorted(finished, key=lambda f: running[f].index):
+                job = running.pop(future)
+                out, err = future.result()
+                cc = _finish(job, out, err, env)
+                if raise_error and cc.returncode:
+                    raise XonshCalledProcessError(cc.returncode,
+                                                  cc.executed_cmd, cc.stdout,
+                                                  cc.stderr, cc)
+                if ordered:
+                    done[job.index] = cc
+                else:
+                    yield cc
+            while nyielded in done:
+                yield done.pop(nyielded)
+                nyielded += 1
+    finally:
+        for job in running.values():
+            try:
+                job.proc.kill()
+            except OSError:
+                pass
+            remove_job(job.num)
+        executor.shutdown(wait=True)
+
+
+def parallel(cmds, jobs=None, ordered=True):
+    """Runs subprocess commands concurrently, and returns a list of the
+    completed commands. See iparallel() for the parameters.
+    """
+    return list(iparallel(cmds, jobs=jobs, ordered=ordered))
+
+
+def _pl_create_parser():
+    p = argparse.ArgumentParser(prog='parallel',
+                                description='Runs a command once for each '
+                                            'line of the standard input, '
+                                            'several at a time.')
+    p.add_argument('-j', '--jobs', type=int, default=None,
+                   help='maximum number of commands that run at the same '
+                        'time, by default the number of CPUs')
+    p.add_argument('-k', '--keep-order', action='store_true', default=False,
+                   help='print the outputs in the order of the input lines, '
+                        'rather than as the commands finish')
+    p.add_argument('command', nargs=argparse.REMAINDER,
+                   help='the command to run. Each {} in it is replaced by the '
+                        'input line, which is appended if there is no {}.')
+    return p
+
+
+def _pl_commands(command, lines):
+    replace = any(REPLACE_TOKEN in arg for arg in command)
+    for line in lines:
+        line = line.rstrip('\r\n')
+        if not line:
+            continue
+        if replace:
+            yield [arg.replace(REPLACE_TOKEN, line) for arg in command]
+        else:
+            yield command + [line]
+
+
+@foreground
+def parallel_main(args=None, stdin=None, stdout=None, stderr=None):
+    """This is the parallel command entry point. Each command's output is
+    printed at once when it finishes. The return code is 1 if any command
+    failed.
+    """
+    parser = _pl_create_parser()
+    try:
+        ns = parser.parse_args(args)
+    except SystemExit:
+        return 2
+    if len(ns.command) == 0 or stdin is None:
+        parser.print_usage(file=stderr)
+        return 2
+    failed = False
+    cmds = _pl_commands(ns.command, stdin)
+    for cc in iparallel(cmds, jobs=ns.jobs, ordered=ns.keep_order):
+        print(cc.stdout, end='', file=stdout, flush=True)
+        print(cc.stderr, end='', file=stderr, flush=True)
+        failed = failed or cc.returncode != 0
+    return int(failed)
@@ -339,7 +339,12 @@ class BaseParser(object):
         """
 
         def listfunc(self, p):
-            p[0] = p[1] if len(p) == 2 else p[1] + p[2]
+            p0 = p[1]
+            if len(p) == 3:
+                # extends the list in place, since nothing else refers to it
+                # while it is being built
+                p0 += p[2]
+            p[0] = p0
 
         listfunc.__doc__ = ('{0}_list : {0}\n'
                             '         | {0}_list {0}').format(rulename)
@@ -351,9 +356,10 @@ class BaseParser(object):
         '_tok' is appended to the rule name.
         """
 
+        uprule = rulename.upper()
+
         def tokfunc(self, p):
             s, t = self._yacc_lookahead_token()
-            uprule = rulename.upper()
             if s is not None and s.type == uprule:
                 p[0] = s
             elif t is not None and t.type == uprule:
@@ -447,8 +453,9 @@ class BaseParser(object):
     def p_file_stmts_files(self, p):
         """file_stmts : file_stmts newline_or_stmt"""
         # file_input newline_or_stmt ENDMARKER
-        p2 = empty_list_if_newline(p[2])
-        p[0] = p[1] + p2
+        p0 = p[1]
+        p0 += empty_list_if_newline(p[2])
+        p[0] = p0
 
     def p_newline_or_stmt(self, p):
         """newline_or_stmt : NEWLINE
@@ -516,7 +523,12 @@ class BaseParser(object):
         """decorators : decorator
                       | decorators decorator
         """
-        p[0] = [p[1]] if len(p) == 2 else p[1] + [p[2]]
+        if len(p) == 2:
+            p[0] = [p[1]]
+        else:
+            p0 = p[1]
+            p0.append(p[2])
+            p[0] = p0
 
     def p_decorated(self, p):
         """decorated : decorators classdef_or_funcdef"""
@@ -793,7 +805,9 @@ class BaseParser(object):
         if len(p) == 2:
             p[0] = p[1]
         else:
-            p[0] = p[1] + p[2]
+            p0 = p[1]
+            p0 += p[2]
+            p[0] = p0
 
     def p_semi_opt(self, p):
         """semi_opt : SEMI
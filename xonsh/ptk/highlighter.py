@@ -0,0 +1,326 @@
+# -*- coding: utf-8 -*-
+"""Incremental syntax highlighting of xonsh input for prompt_toolkit.
+
+Rather than lexing the whole buffer with pygments on every keystroke, the
+input is tokenized with the xonsh tokenizer and the highlighted lines are
+kept between keystrokes. When the buffer changes, tokenizing restarts at the
+nearest line before the edit at which the tokenizer was in a clean state,
+and stops as soon as it is back in a clean state in the unchanged lines after
+the edit.
+"""
+import builtins
+from keyword import kwlist
+
+from pygments.token import (Keyword, Name, Comment, String, Error, Number,
+                            Operator, Punctuation, Text)
+from prompt_toolkit.layout.lexers import Lexer
+
+from xonsh.lazyasd import LazyObject
+from xonsh.platform import PYTHON_VERSION_INFO
+from xonsh.tokenize import (OP, IOREDIRECT, STRING, DOLLARNAME, NUMBER,
+                            SEARCHPATH, NEWLINE, NL, COMMENT, NAME,
+                            ERRORTOKEN, generate_tokens, TokenError)
+
+KEYWORDS = frozenset(kwlist)
+
+SUBPROC_OPENERS = frozenset(['$(', '$[', '!(', '![', '@$('])
+PYTHON_OPENERS = frozenset(['@(', '${'])
+OPENERS = frozenset(['(', '[', '{']) | SUBPROC_OPENERS | PYTHON_OPENERS
+CLOSERS = frozenset([')', ']', '}'])
+PUNCTUATION = frozenset(['(', ')', '[', ']', '{', '}', ',', ':', ';', '.'])
+
+PYTHON_FOLLOWERS = frozenset(['=', '(', '.', '[', ',', ':', ')', ']', '}',
+                              '+=', '-=', '*=', '/=', '//=', '%=', '**=',
+                              '@=', '&=', '|=', '^=', '>>=', '<<=', '==',
+                              '!='])
+"""Operators which, when they follow a name at the start of a statement, mean
+that the statement is Python rather than a subprocess command.
+"""
+
+
+def _token_colors():
+    tc = {STRING: String, NUMBER: Number, COMMENT: Comment.Single,
+          DOLLARNAME: Name.Variable, SEARCHPATH: String.Backtick,
+          IOREDIRECT: Operator}
+    if PYTHON_VERSION_INFO >= (3, 5, 0):
+        from xonsh.tokenize import ASYNC, AWAIT
+        tc[ASYNC] = Keyword
+        tc[AWAIT] = Keyword
+    return tc
+
+
+TOKEN_COLORS = LazyObject(_token_colors, globals(), 'TOKEN_COLORS')
+"""Mapping from tokenize token types to pygments tokens, for the types whose
+color doesn't depend on the context.
+"""
+del _token_colors
+
+
+class Highlighter(object):
+    """Incrementally highlights xonsh source code.
+
+    Commands at the start of subprocess statements are highlighted as
+    ``Name.Builtin`` if they are aliases or known commands, and as ``Error``
+    otherwise. Known commands are looked up with the commands cache's
+    ``lazyin()``, so highlighting never touches the file system.
+    """
+
+    def __init__(self, ctx=None):
+        """
+        Parameters
+        ----------
+        ctx : Mapping, optional
+            The execution context. Names in it are not highlighted as
+            commands.
+        """
+        self.ctx = {} if ctx is None else ctx
+        self.reset()
+
+    def reset(self):
+        """Forgets the previously highlighted source."""
+        self.lines = []
+        self.fragments = []
+        self.clean = []  # whether the tokenizer is clean at each line
+        self.ntokenized = 0  # lines tokenized by the last update
+
+    def highlight(self, lines):
+        """Returns a list of the highlighted lines of source code, each of
+        which is a list of (pygments token, text) tuples.
+
+        Parameters
+        ----------
+        lines : list of str
+            The lines of source code, without newline characters.
+        """
+        lines = list(lines)
+        old = self.lines
+        if lines == old:
+            self.ntokenized = 0
+            return self.fragments
+        n, nold = len(lines), len(old)
+        prefix = 0
+        while prefix < min(n, nold) and lines[prefix] == old[prefix]:
+            prefix += 1
+        suffix = 0
+        while suffix < min(n, nold) - prefix and \
+                lines[n - suffix - 1] == old[nold - suffix - 1]:
+            suffix += 1
+        # restart from a line at which the tokenizer was in a clean state,
+        # without indentation so that it never sees an inconsistent dedent
+        start = prefix
+        while start > 0 and not (start < nold and self.clean[start] and
+                                 not old[start][:1].isspace()):
+            start -= 1
+
+        def resync(i, clean):
+            # lines after the edit whose tokenizer state is clean both now
+            # and before the edit can be copied from before the edit
+            j = i - n + nold
+            return (clean and i >= n - suffix and i > prefix and
+                    0 <= j < nold and self.clean[j])
+
+        toks, clean, stop, err = _tokenize(lines, start, resync)
+        frags = _fragments(lines, start, stop, self._color(toks), err)
+        j = stop - n + nold
+        self.fragments = self.fragments[:start] + frags + self.fragments[j:]
+        self.clean = self.clean[:start] + clean + self.clean[j:]
+        self.lines = lines
+        self.ntokenized = stop - start
+        return self.fragments
+
+    def _color(self, toks):
+        """Returns (pygments token, start, end) tuples for the tokens."""
+        colored = []
+        modes = []  # stack of (subprocess mode, xonsh bracket) tuples
+        subproc = False
+        cmdpos = True
+        ntoks = len(toks)
+        for i, (typ, string, start, end) in enumerate(toks):
+            if typ == NEWLINE or typ == NL:
+                if not modes:
+                    subproc = False
+                    cmdpos = True
+                continue
+            if typ == NAME:
+                if cmdpos:
+                    nxt = toks[i + 1] if i + 1 < ntoks else None
+                    color, subproc = self._command_color(string, nxt, end,
+                                                         subproc)
+                elif string in KEYWORDS:
+                    color = Keyword
+                elif not subproc and string in builtins.__dict__:
+                    color = Name.Builtin
+                else:
+                    color = Name
+                if subproc and string in ('and', 'or'):
+                    color = Operator.Word
+                    cmdpos = True
+                else:
+                    cmdpos = False
+            elif typ == OP:
+                if string in SUBPROC_OPENERS:
+                    modes.append((subproc, True))
+                    subproc, cmdpos = True, True
+                    color = Keyword
+                elif string in PYTHON_OPENERS:
+                    modes.append((subproc, True))
+                    subproc, cmdpos = False, False
+                    color = Keyword
+                elif string in OPENERS:
+                    modes.append((subproc, False))
+                    color = Punctuation
+                    cmdpos = False
+                elif string in CLOSERS:
+                    subproc, xonshy = modes.pop() if modes else (False, False)
+                    color = Keyword if xonshy else Punctuation
+                    cmdpos = False
+                elif subproc and string in ('|', ';', '&&', '||'):
+                    color = Operator
+                    cmdpos = True
+                elif string == ';' and not modes:
+                    color = Punctuation
+                    subproc, cmdpos = False, True
+                elif string in PUNCTUATION:
+                    color = Punctuation
+                    cmdpos = False
+                else:
+                    color = Operator
+                    cmdpos = False
+            elif typ == ERRORTOKEN:
+                color = Text if string.isspace() else Error
+                cmdpos = False
+            else:
+                color = TOKEN_COLORS.get(typ)
+                if color is None:
+                    continue
+                cmdpos = False
+            colored.append((color, start, end))
+        return colored
+
+    def _command_color(self, name, nxt, end, subproc):
+        """Returns the color of a name at the start of a statement, and
+        whether the statement is in subprocess mode.
+        """
+        if name in KEYWORDS:
+            return Keyword, subproc
+        if not subproc:
+            if nxt is not None and nxt[0] == OP and (
+                    nxt[1] in PYTHON_FOLLOWERS or
+                    (nxt[2] == end and nxt[1] in ('/', '-'))):
+                # Python code, or part of a path or a longer name
+                return Name, False
+            if name in self.ctx:
+                return Name, False
+        if name in builtins.aliases or \
+                builtins.__xonsh_commands_cache__.lazyin(name):
+            return Name.Builtin, True
+        if not subproc and name in builtins.__dict__:
+            return Name.Builtin, False
+        return Error, True
+
+
+def _tokenize(lines, start, resync):
+    """Tokenizes lines from a starting line until resync(line, clean) is true
+    at the beginning of a line, or the end of the source.
+
+    Returns
+    -------
+    toks : list of (type, string, start, end) tuples
+        The tokens, with absolute (line, column) positions.
+    clean : list of bool
+        Whether the tokenizer was in a clean state at each of the lines.
+    stop : int
+        The line that tokenizing stopped at.
+    err : TokenError or IndentationError or None
+        The error that stopped tokenizing before the end, if any.
+    """
+    n = len(lines)
+    it = iter(lines[start:])
+    readline = lambda: next(it) + '\n'
+    toks = []
+    clean = []
+    depth = 0
+    line = start  # the line whose beginning is next
+    last = NEWLINE
+    err = None
+    try:
+        for tok in generate_tokens(readline):
+            typ, string = tok.type, tok.string
+            srow = tok.start[0] + start - 1
+            while line <= srow and line < n:
+                c = last in (NEWLINE, NL) and depth == 0
+                if line > start and resync(line, c):
+                    return toks, clean, line, None
+                clean.append(c)
+                line += 1
+            if typ == OP:
+                if string in OPENERS:
+                    depth += 1
+                elif string in CLOSERS:
+                    depth = max(depth - 1, 0)
+            toks.append((typ, string, (srow, tok.start[1]),
+                         (tok.end[0] + start - 1, tok.end[1])))
+            last = typ
+    except (TokenError, IndentationError) as e:
+        err = e
+    while line < n:
+        clean.append(False)
+        line += 1
+    return toks, clean, n, err
+
+
+def _fragments(lines, start, stop, colored, err=None):
+    """Splits colored spans into lists of (pygments token, text) tuples for
+    each of the lines from start to stop. The text between spans is Text,
+    or String after an unterminated string.
+    """
+    frags = [[] for _ in range(start, stop)]
+    row, col = start, 0
+
+    def emit(color, erow, ecol):
+        nonlocal row, col
+        while row < erow and row < stop:
+            text = lines[row][col:]
+            if text:
+                frags[row - start].append((color, text))
+            row, col = row + 1, 0
+        if row < stop:
+            text = lines[row][col:ecol]
+            if text:
+                frags[row - start].append((color, text))
+            col = max(col, ecol)
+
+    for color, (srow, scol), (erow, ecol) in colored:
+        if (srow, scol) < (row, col):
+            continue
+        emit(Text, srow, scol)
+        emit(color, erow, ecol)
+    rest = String if err is not None and 'string' in str(err) else Text
+    emit(rest, stop, 0)
+    return frags
+
+
+class PromptToolkitLexer(Lexer):
+    """A prompt_toolkit lexer which highlights xonsh input incrementally.
+    Call reset() whenever a new prompt is started.
+    """
+
+    def __init__(self, ctx=None):
+        self.highlighter = Highlighter(ctx=ctx)
+
+    def reset(self):
+        """Forgets the previously highlighted input."""
+        self.highlighter.reset()
+
+    def lex_document(self, cli, document):
+        """Returns a function that returns the highlighted tokens of a line
+        of the document.
+        """
+        lines = self.highlighter.highlight(document.lines)
+
+        def get_line(lineno):
+            try:
+                return lines[lineno]
+            except IndexError:
+                return []
+        return get_line
@@ -1,28 +1,114 @@
 # -*- coding: utf-8 -*-
 """History object for use with prompt_toolkit."""
+import os
 import time
 import builtins
-from threading import Thread
+from threading import Thread, RLock
 
 import prompt_toolkit.history
+from prompt_toolkit.auto_suggest import (AutoSuggest, AutoSuggestFromHistory,
+                                         Suggestion)
 from xonsh import lazyjson
 
 
+class _TrieNode(object):
+    """A node of a radix trie of history lines. The label is the part of the
+    lines below the node that follows the label of its parent, and line is
+    the most recent of those lines.
+    """
+
+    __slots__ = ('label', 'line', 'children')
+
+    def __init__(self, label, line, children=None):
+        self.label = label
+        self.line = line
+        self.children = children  # first char of the label -> node
+
+
 class PromptToolkitHistory(prompt_toolkit.history.History):
     """History class that implements the promt-toolkit history interface
     with the xonsh backend.
+
+    Besides the flat list of entries that prompt-toolkit expects, this keeps
+    the individual lines of the entries in a radix trie. Every node of the
+    trie remembers the most recent line below it, so the most recent line
+    with a prefix is found in time proportional to the length of the prefix.
     """
 
     def __init__(self, load_prev=True, wait_for_gc=True, *args, **kwargs):
         """Initialize history object."""
         super().__init__()
         self.strings = []
+        self._trie = _TrieNode('', None)
+        self._lock = RLock()
         if load_prev:
             PromptToolkitHistoryAdder(self, wait_for_gc=wait_for_gc)
 
     def append(self, entry):
         """Append new entry to the history."""
-        self.strings.append(entry)
+        with self._lock:
+            self.strings.append(entry)
+            for line in entry.splitlines():
+                self._touch(line)
+
+    def extend(self, entries):
+        """Append many new entries to the history at once."""
+        with self._lock:
+            self.strings.extend(entries)
+            for entry in entries:
+                for line in entry.splitlines():
+                    self._touch(line)
+
+    def _touch(self, line):
+        """Inserts a line into the trie, as the most recent line of every
+        node on its path.
+        """
+        node = self._trie
+        n = len(line)
+        i = 0
+        while True:
+            node.line = line
+            if i == n:
+                return
+            children = node.children
+            if children is None:
+                children = node.children = {}
+            c = line[i]
+            child = children.get(c)
+            if child is None:
+                children[c] = _TrieNode(line[i:], line)
+                return
+            label = child.label
+            if not line.startswith(label, i):
+                # splits the edge where the line leaves it
+                k = len(os.path.commonprefix([label, line[i:]]))
+                child.label = label[k:]
+                child = children[c] = _TrieNode(label[:k], child.line,
+                                                {label[k]: child})
+            node = child
+            i += len(child.label)
+
+    def most_recent_with_prefix(self, prefix):
+        """Returns the most recent history line that starts with the prefix,
+        or None if there is no such line.
+        """
+        with self._lock:
+            node = self._trie
+            i = 0
+            while i < len(prefix):
+                children = node.children
+                child = None if children is None else children.get(prefix[i])
+                if child is None:
+                    return None
+                label = child.label
+                if len(prefix) - i <= len(label):
+                    return child.line if label.startswith(prefix[i:]) \
+                        else None
+                if not prefix.startswith(label, i):
+                    return None
+                node = child
+                i += len(label)
+            return node.line
 
     def __getitem__(self, index):
         return self.strings[index]
@@ -34,6 +120,30 @@ class PromptToolkitHistory(prompt_toolkit.history.History):
         return iter(self.strings)
 
 
+class PromptToolkitAutoSuggest(AutoSuggest):
+    """Suggests the most recent matching line of history, like
+    prompt_toolkit's AutoSuggestFromHistory. When the buffer's history is a
+    PromptToolkitHistory, this uses its index rather than searching through
+    the whole history on every keystroke.
+    """
+
+    def __init__(self):
+        self._fallback = AutoSuggestFromHistory()
+
+    def get_suggestion(self, cli, buffer, document):
+        history = buffer.history
+        if not isinstance(history, PromptToolkitHistory):
+            return self._fallback.get_suggestion(cli, buffer, document)
+        # consider only the last line for the suggestion
+        text = document.text.rsplit('\n', 1)[-1]
+        if not text.strip():
+            return None
+        line = history.most_recent_with_prefix(text)
+        if line is None:
+            return None
+        return Suggestion(line[len(text):])
+
+
 class PromptToolkitHistoryAdder(Thread):
 
     def __init__(self, ptkhist, wait_for_gc=True, *args, **kwargs):
@@ -57,20 +167,26 @@ class PromptToolkitHistoryAdder(Thread):
         for _, _, f in files:
             try:
                 lj = lazyjson.LazyJSON(f, reopen=False)
+                last = ptkhist[-1] if len(ptkhist) > 0 else None
+                lines = []
                 for cmd in lj['cmds']:
                     line = cmd['inp'].rstrip()
                     if line == 'EOF':
                         continue
-                    if len(ptkhist) == 0 or line != ptkhist[-1]:
-                        ptkhist.append(line)
-                        if buf is None:
-                            buf = self._buf()
-                            if buf is None:
-                                continue
-                        buf.reset(initial_document=buf.document)
+                    if line != last:
+                        lines.append(line)
+                        last = line
                 lj.close()
             except (IOError, OSError):
                 continue
+            if not lines:
+                continue
+            ptkhist.extend(lines)
+            if buf is None:
+                buf = self._buf()
+                if buf is None:
+                    continue
+            buf.reset(initial_document=buf.document)
 
     def _buf(self):
         # Thread-safe version of
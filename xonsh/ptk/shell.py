@@ -3,8 +3,6 @@
 import builtins
 
 from prompt_toolkit.key_binding.manager import KeyBindingManager
-from prompt_toolkit.auto_suggest import AutoSuggestFromHistory
-from prompt_toolkit.layout.lexers import PygmentsLexer
 from prompt_toolkit.shortcuts import print_tokens
 from prompt_toolkit.filters import Condition
 from prompt_toolkit.styles import PygmentsStyle
@@ -13,12 +11,13 @@ from pygments.token import Token
 
 from xonsh.base_shell import BaseShell
 from xonsh.tools import print_exception
+from xonsh.jobs import print_job_notices
 from xonsh.environ import partial_format_prompt
 from xonsh.platform import ptk_version, ptk_version_info
-from xonsh.pyghooks import (XonshLexer, partial_color_tokenize,
-                            xonsh_style_proxy)
+from xonsh.pyghooks import partial_color_tokenize, xonsh_style_proxy
 from xonsh.ptk.completer import PromptToolkitCompleter
-from xonsh.ptk.history import PromptToolkitHistory
+from xonsh.ptk.history import PromptToolkitHistory, PromptToolkitAutoSuggest
+from xonsh.ptk.highlighter import PromptToolkitLexer
 from xonsh.ptk.key_bindings import load_xonsh_bindings
 from xonsh.ptk.shortcuts import Prompter
 
@@ -31,6 +30,7 @@ class PromptToolkitShell(BaseShell):
         self.prompter = Prompter()
         self.history = PromptToolkitHistory()
         self.pt_completer = PromptToolkitCompleter(self.completer, self.ctx)
+        self.lexer = PromptToolkitLexer(self.ctx)
 
         key_bindings_manager_args = {
                 'enable_auto_suggest_bindings': True,
@@ -47,6 +47,8 @@ class PromptToolkitShell(BaseShell):
         kwarg flags whether the input should be stored in PTK's in-memory
         history.
         """
+        if not self.need_more_lines:
+            print_job_notices()
         env = builtins.__xonsh_env__
         mouse_support = env.get('MOUSE_SUPPORT')
         if store_in_history:
@@ -80,7 +82,11 @@ class PromptToolkitShell(BaseShell):
                     'display_completions_in_columns': multicolumn,
                     }
             if builtins.__xonsh_env__.get('COLOR_INPUT'):
-                prompt_args['lexer'] = PygmentsLexer(XonshLexer)
+                # bring the known commands up to date once per prompt, so
+                # that highlighting doesn't have to on every keystroke
+                builtins.__xonsh_commands_cache__.all_commands
+                self.lexer.reset()
+                prompt_args['lexer'] = self.lexer
             line = self.prompter.prompt(**prompt_args)
         return line
 
@@ -109,7 +115,7 @@ class PromptToolkitShell(BaseShell):
         """Enters a loop that reads and execute input from user."""
         if intro:
             print(intro)
-        auto_suggest = AutoSuggestFromHistory()
+        auto_suggest = PromptToolkitAutoSuggest()
         while not builtins.__xonsh_exit__:
             try:
                 line = self.singleline(auto_suggest=auto_suggest)
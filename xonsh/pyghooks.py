@@ -2,8 +2,8 @@
 """Hooks for pygments syntax highlighting."""
 import os
 import re
-import string
 import builtins
+import functools
 import importlib
 from warnings import warn
 from collections import ChainMap
@@ -20,7 +20,7 @@ import pygments.util
 
 from xonsh.lazyasd import LazyObject
 from xonsh.tools import (ON_WINDOWS, intensify_colors_for_cmd_exe,
-                         expand_gray_colors_for_cmd_exe)
+                         expand_gray_colors_for_cmd_exe, parse_template)
 from xonsh.tokenize import SearchPath
 
 
@@ -99,10 +99,16 @@ def norm_name(name):
     """Normalizes a color name."""
     return name.replace('#', 'HEX').replace('BGHEX', 'BACKGROUND_HEX')
 
+
+COLOR_CACHE_SIZE = 1024
+"""Number of color names whose tokens are remembered."""
+
+
+@functools.lru_cache(maxsize=COLOR_CACHE_SIZE)
 def color_by_name(name, fg=None, bg=None):
     """Converts a color name to a color token, foreground name,
     and background name.  Will take into consideration current foreground
-    and background colors, if provided.
+    and background colors, if provided. The results are cached.
 
     Parameters
     ----------
@@ -209,16 +215,11 @@ def partial_color_tokenize(template):
 
 
 def _partial_color_tokenize_main(template, styles):
-    formatter = string.Formatter()
-    bopen = '{'
-    bclose = '}'
-    colon = ':'
-    expl = '!'
     color = Color.NO_COLOR
     fg = bg = None
     value = ''
     toks = []
-    for literal, field, spec, conv in formatter.parse(template):
+    for literal, field, spec, conv, raw in parse_template(template):
         if field is None:
             value += literal
         elif field in KNOWN_COLORS or '#' in field:
@@ -231,18 +232,8 @@ def _partial_color_tokenize_main(template, styles):
                         styles[color]  # ensure color is available
                 color = next_color
                 value = ''
-        elif field is not None:
-            parts = [literal, bopen, field]
-            if conv is not None and len(conv) > 0:
-                parts.append(expl)
-                parts.append(conv)
-            if spec is not None and len(spec) > 0:
-                parts.append(colon)
-                parts.append(spec)
-            parts.append(bclose)
-            value += ''.join(parts)
         else:
-            value += literal
+            value += literal + raw
     toks.append((color, value))
     return toks, color
 
@@ -322,11 +313,15 @@ class XonshStyle(Style):
             self._smap = get_style_by_name(value)().styles.copy()
         except (ImportError, pygments.util.ClassNotFound):
             self._smap = XONSH_BASE_STYLE.copy()
-        compound = CompoundColorMap(ChainMap(self.trap, cmap, PTK_STYLE, self._smap))
-        self.styles = ChainMap(self.trap, cmap, PTK_STYLE, self._smap, compound)
-        self._style_name = value
         if ON_WINDOWS:
             self.enhance_colors_for_cmd_exe()
+        # flatten the static maps so that a lookup searches fewer of them
+        compiled = dict(self._smap)
+        compiled.update(PTK_STYLE)
+        compiled.update(cmap)
+        compound = CompoundColorMap(ChainMap(self.trap, compiled))
+        self.styles = ChainMap(self.trap, compiled, compound)
+        self._style_name = value
 
     @style_name.deleter
     def style_name(self):
@@ -342,7 +337,7 @@ class XonshStyle(Style):
         if 'CONEMUANSI' not in env:
             # Auto suggest needs to be a darker shade to be distinguishable
             # from the default color
-            self.styles[Token.AutoSuggestion] = '#444444'
+            self.trap[Token.AutoSuggestion] = '#444444'
             if env.get('INTENSIFY_COLORS_ON_WIN', False):
                 self._smap.update(expand_gray_colors_for_cmd_exe(self._smap))
                 self._smap.update(intensify_colors_for_cmd_exe(self._smap))
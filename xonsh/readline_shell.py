@@ -26,6 +26,7 @@ from xonsh.base_shell import BaseShell
 from xonsh.ansi_colors import partial_color_format, color_style_names, color_style
 from xonsh.environ import partial_format_prompt, multiline_prompt
 from xonsh.tools import print_exception
+from xonsh.jobs import print_job_notices
 from xonsh.platform import HAS_PYGMENTS, ON_WINDOWS, ON_CYGWIN, ON_DARWIN
 
 pygments = LazyObject(lambda: importlib.import_module('pygments'),
@@ -217,6 +218,8 @@ class ReadlineShell(BaseShell, Cmd):
         flags whether the input should be stored in readline's in-memory
         history.
         """
+        if not self.need_more_lines:
+            print_job_notices()
         if not store_in_history:  # store current position to remove it later
             try:
                 import readline
@@ -0,0 +1,407 @@
+# -*- coding: utf-8 -*-
+"""A xonsh server, which runs scripts and commands for thin clients.
+
+Starting xonsh takes much longer than running a short script, so a warm
+xonsh process may be started with ``xonsh --server``. It listens on the
+Unix socket named by $XONSH_SERVER_SOCKET, and forks a child for every
+request, which already has the builtins loaded and the run control files
+run. The client, which is ``xonsh`` itself whenever $XONSH_SERVER_SOCKET is
+set, passes its arguments, working directory, environment and standard
+streams to the child, and exits with the child's exit code. When there is
+no server listening on the socket, or the request can't be served, the
+client runs the command itself.
+
+Interactive sessions, and requests that need a different startup than the
+server's (``-l``, ``--no-rc``, ``--config-path`` and ``--shell-type``), are
+always run by the client. The run control files are only run once, when the
+server starts, so variables they set are kept unless the client's
+environment sets them.
+
+This module only imports the standard library at the top level, so that the
+client stays cheap.
+"""
+import os
+import sys
+import json
+import stat
+import array
+import errno
+import signal
+import socket
+import struct
+import selectors
+
+_LEN = struct.Struct('!I')
+_INT = struct.Struct('!i')
+_STDIO = (0, 1, 2)
+_FORWARDED_SIGNALS = ('SIGINT', 'SIGTERM', 'SIGHUP', 'SIGQUIT')
+REFUSED = -1
+"""The pid sent to a client when the server won't run its request."""
+
+
+def can_serve():
+    """Returns whether the platform supports passing file descriptors over
+    Unix sockets.
+    """
+    return hasattr(socket, 'AF_UNIX') and hasattr(socket, 'SCM_RIGHTS')
+
+
+def _recv_exactly(sock, n):
+    """Receives n bytes, or fewer if the connection is closed."""
+    buf = b''
+    while len(buf) < n:
+        chunk = sock.recv(n - len(buf))
+        if not chunk:
+            break
+        buf += chunk
+    return buf
+
+
+def _recv_int(sock):
+    buf = _recv_exactly(sock, _INT.size)
+    if len(buf) < _INT.size:
+        return None
+    return _INT.unpack(buf)[0]
+
+
+def send_request(sock, argv, cwd, env, fds=_STDIO):
+    """Sends a request to a server, with the file descriptors that become
+    the standard streams of the command.
+    """
+    data = json.dumps({'argv': list(argv), 'cwd': cwd,
+                       'env': dict(env)}).encode('utf-8')
+    data = _LEN.pack(len(data)) + data
+    anc = [(socket.SOL_SOCKET, socket.SCM_RIGHTS, array.array('i', fds))]
+    n = sock.sendmsg([data], anc)
+    sock.sendall(data[n:])
+
+
+def recv_request(sock, nfds=len(_STDIO)):
+    """Receives a request from a client. Returns the request as a dict with
+    'argv', 'cwd' and 'env' keys, and the list of file descriptors that were
+    passed with it, which the caller has to close.
+    """
+    fds = array.array('i')
+    msg, ancdata, flags, _ = sock.recvmsg(
+        _LEN.size, socket.CMSG_LEN(nfds * fds.itemsize))
+    for level, kind, data in ancdata:
+        if level == socket.SOL_SOCKET and kind == socket.SCM_RIGHTS:
+            data = data[:len(data) - (len(data) % fds.itemsize)]
+            fds.frombytes(data)
+    fds = list(fds)
+    try:
+        if flags & socket.MSG_CTRUNC or len(fds) != nfds:
+            raise ValueError('expected {0} file descriptors, got '
+                             '{1}'.format(nfds, len(fds)))
+        msg += _recv_exactly(sock, _LEN.size - len(msg))
+        if len(msg) < _LEN.size:
+            raise ValueError('connection closed')
+        size = _LEN.unpack(msg)[0]
+        data = _recv_exactly(sock, size)
+        if len(data) < size:
+            raise ValueError('connection closed')
+        req = json.loads(data.decode('utf-8'))
+    except Exception:
+        for fd in fds:
+            os.close(fd)
+        raise
+    return req, fds
+
+
+def exit_code(status):
+    """Converts a wait status into the exit code of a shell."""
+    if os.WIFSIGNALED(status):
+        return 128 + os.WTERMSIG(status)
+    return os.WEXITSTATUS(status)
+
+
+def _owned_socket(path):
+    """Returns whether path is a Unix socket owned by the current user."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return False
+    return stat.S_ISSOCK(st.st_mode) and st.st_uid == os.getuid()
+
+
+#
+# Client
+#
+
+def request(path, argv):
+    """Runs xonsh with the given arguments on the server listening at path.
+    Returns the exit code, or None if the command has to run in this process
+    because there is no server or it refused the request.
+    """
+    if not can_serve() or not _owned_socket(path):
+        return None
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        try:
+            sock.connect(path)
+            send_request(sock, argv, os.getcwd(), os.environ)
+            pid = _recv_int(sock)
+        except OSError:
+            return None
+        if pid is None or pid == REFUSED:
+            return None
+        # signals from the terminal only reach this process
+        def forward(signum, frame):
+            try:
+                os.kill(pid, signum)
+            except OSError:
+                pass
+        for name in _FORWARDED_SIGNALS:
+            if hasattr(signal, name):
+                signal.signal(getattr(signal, name), forward)
+        rtn = _recv_int(sock)
+    finally:
+        sock.close()
+    if rtn is None:
+        print('xonsh: lost the connection to the server', file=sys.stderr)
+        rtn = 1
+    return rtn
+
+
+#
+# Server
+#
+
+def _update_env(env, environ, base):
+    """Updates a xonsh environment with the os.environ of a client, given
+    the os.environ that the server started with. Variables that are the same
+    as when the server started keep the values that they were given by the
+    run control files.
+    """
+    for key in set(base) - set(environ):
+        if env.is_manually_set(key):
+            del env[key]
+    for key, val in environ.items():
+        if base.get(key) != val:
+            env[key] = val
+
+
+def _setup_request(req, fds, base, server_args):
+    """Sets up a forked child for a request, and returns its parsed
+    arguments, or None if the server can't run it.
+    """
+    # imported here, since the client doesn't need them
+    import builtins
+    from xonsh import main
+    from xonsh.jobs import _shell_tty
+    for fd, target in zip(fds, _STDIO):
+        os.dup2(fd, target)
+        os.close(fd)
+    os.chdir(req['cwd'])
+    os.environ.clear()
+    os.environ.update(req['env'])
+    env = builtins.__xonsh_env__
+    _update_env(env, req['env'], base)
+    env['PWD'] = req['cwd']
+    if hasattr(_shell_tty, 'cache_clear'):
+        _shell_tty.cache_clear()  # the terminal may be the client's
+    sys.argv = [sys.argv[0]] + req['argv']
+    if main.setproctitle is not None:
+        main.setproctitle(' '.join(['xonsh'] + req['argv']))
+    args = main._parse_args(req['argv'])
+    for attr in ('login', 'norc', 'config_path', 'shell_type'):
+        if getattr(args, attr) != getattr(server_args, attr):
+            return None
+    if args.mode not in (main.XonshMode.single_command,
+                         main.XonshMode.script_from_file,
+                         main.XonshMode.script_from_stdin):
+        return None
+    return args
+
+
+def _serve_child(conn, req, fds, base, server_args):
+    """Runs a request in the child that was forked for it, and never
+    returns. The child sends its pid to the client unless it refuses the
+    request, and the server sends the exit code when the child has exited.
+    """
+    code = 1
+    answered = False
+    try:
+        args = _setup_request(req, fds, base, server_args)
+        answered = True
+        if args is None:
+            conn.sendall(_INT.pack(REFUSED))
+            os._exit(0)
+        conn.sendall(_INT.pack(os.getpid()))
+        conn.close()
+        from xonsh import main
+        main._setup_args(args)
+        main._run(args)
+        code = 0
+    except SystemExit as e:
+        if e.code is None:
+            code = 0
+        elif isinstance(e.code, int):
+            code = e.code
+        else:
+            print(e.code, file=sys.stderr)
+    except BaseException:
+        import traceback
+        traceback.print_exc()
+    finally:
+        try:
+            if not answered:
+                # e.g. --help, or a bad argument
+                conn.sendall(_INT.pack(os.getpid()))
+            # the atexit module has no public way of running its handlers
+            import atexit
+            atexit._run_exitfuncs()
+            sys.stdout.flush()
+            sys.stderr.flush()
+        finally:
+            os._exit(code)
+
+
+def _bind(path):
+    """Returns a socket listening at path, which only the current user can
+    connect to. A stale socket left by a server that died is replaced.
+    """
+    if _owned_socket(path):
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(path)
+        except OSError:
+            os.unlink(path)
+        else:
+            msg = 'xonsh: a server is already listening at {0}'
+            raise OSError(errno.EADDRINUSE, msg.format(path))
+        finally:
+            probe.close()
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    oldmask = os.umask(0o177)
+    try:
+        sock.bind(path)
+    finally:
+        os.umask(oldmask)
+    sock.listen(socket.SOMAXCONN)
+    return sock
+
+
+def serve(path, args):
+    """Serves requests on the Unix socket at path until the server is
+    interrupted or terminated. The xonsh builtins and shell must already be
+    loaded, with the startup options in args.
+    """
+    if not can_serve():
+        raise OSError(errno.ENOTSUP, 'xonsh: the server needs Unix sockets')
+    import builtins
+    hist = getattr(builtins, '__xonsh_history__', None)
+    if hist is not None and hist.gc is not None:
+        hist.gc.join()  # threads don't survive forking
+    base = dict(os.environ)
+    listener = _bind(path)
+    rfd, wfd = os.pipe()
+    import fcntl  # lazy import, since it is only on Unix
+    flags = fcntl.fcntl(wfd, fcntl.F_GETFL)
+    fcntl.fcntl(wfd, fcntl.F_SETFL, flags | os.O_NONBLOCK)
+    oldwakeup = signal.set_wakeup_fd(wfd)
+    oldchld = signal.signal(signal.SIGCHLD, lambda signum, frame: None)
+    sel = selectors.DefaultSelector()
+    sel.register(listener, selectors.EVENT_READ)
+    sel.register(rfd, selectors.EVENT_READ)
+    children = {}  # pid -> connection to the client
+    try:
+        while True:
+            for key, _ in sel.select():
+                if key.fileobj is listener:
+                    _accept(listener, sel, children, (listener, rfd, wfd),
+                            base, args)
+                elif key.fileobj == rfd:
+                    os.read(rfd, 512)
+                else:
+                    _hangup(key.fileobj, sel, children)
+            _reap(sel, children)
+    finally:
+        signal.signal(signal.SIGCHLD, oldchld)
+        signal.set_wakeup_fd(oldwakeup)
+        for conn in children.values():
+            conn.close()
+        sel.close()
+        listener.close()
+        os.close(rfd)
+        os.close(wfd)
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+
+
+def _accept(listener, sel, children, closing, base, args):
+    """Accepts a connection, and forks a child to run its request."""
+    conn, _ = listener.accept()
+    try:
+        conn.settimeout(10.0)
+        req, fds = recv_request(conn)
+    except (OSError, ValueError):
+        conn.close()
+        return
+    sys.stdout.flush()
+    sys.stderr.flush()
+    pid = os.fork()
+    if pid == 0:
+        signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+        signal.set_wakeup_fd(-1)
+        sel.close()
+        for other in children.values():
+            other.close()
+        for f in closing:
+            if isinstance(f, int):
+                os.close(f)
+            else:
+                f.close()
+        conn.settimeout(None)
+        _serve_child(conn, req, fds, base, args)
+    for fd in fds:
+        os.close(fd)
+    children[pid] = conn
+    sel.register(conn, selectors.EVENT_READ)
+
+
+def _hangup(conn, sel, children):
+    """Sends SIGHUP to the child of a client that closed its connection."""
+    for pid, c in children.items():
+        if c is conn:
+            break
+    else:
+        return
+    try:
+        data = conn.recv(1)
+    except OSError:
+        data = b''
+    if data:
+        return
+    sel.unregister(conn)
+    try:
+        os.kill(pid, signal.SIGHUP)
+    except OSError:
+        pass
+
+
+def _reap(sel, children):
+    """Sends the exit codes of the children that have exited to their
+    clients.
+    """
+    while children:
+        try:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+        except ChildProcessError:
+            break
+        if pid == 0:
+            break
+        conn = children.pop(pid, None)
+        if conn is None:
+            continue
+        try:
+            sel.unregister(conn)
+        except KeyError:
+            pass
+        try:
+            conn.sendall(_INT.pack(exit_code(status)))
+        except OSError:
+            pass
+        conn.close()
@@ -21,8 +21,12 @@ import os
 import re
 import sys
 import ast
+import copy
 import glob
+import time
+import bisect
 import string
+import fnmatch
 import ctypes
 import builtins
 import pathlib
@@ -242,21 +246,25 @@ def find_next_break(line, mincol=0, lexer=None):
     return maxcol
 
 
-def subproc_toks(line, mincol=-1, maxcol=None, lexer=None, returnline=False):
+def subproc_toks(line, mincol=-1, maxcol=None, lexer=None, returnline=False,
+                 line_toks=None):
     """Excapsulates tokens in a source code line in a uncaptured
     subprocess ![] starting at a minimum column. If there are no tokens
-    (ie in a comment line) this returns None.
+    (ie in a comment line) this returns None. The tokens of the line may be
+    given as line_toks, when it has already been lexed, and are not changed.
     """
-    if lexer is None:
-        lexer = builtins.__xonsh_execer__.parser.lexer
+    if line_toks is None:
+        if lexer is None:
+            lexer = builtins.__xonsh_execer__.parser.lexer
+        lexer.reset()
+        lexer.input(line)
+        line_toks = lexer
     if maxcol is None:
         maxcol = len(line) + 1
-    lexer.reset()
-    lexer.input(line)
     toks = []
     lparens = []
     end_offset = 0
-    for tok in lexer:
+    for tok in line_toks:
         pos = tok.lexpos
         if tok.type not in END_TOK_TYPES and pos >= maxcol:
             break
@@ -280,6 +288,7 @@ def subproc_toks(line, mincol=-1, maxcol=None, lexer=None, returnline=False):
             break
         elif tok.type == 'DEDENT':
             # fake a newline when dedenting without a newline
+            tok = toks[-1] = copy.copy(tok)
             tok.type = 'NEWLINE'
             tok.value = '\n'
             tok.lineno -= 1
@@ -1134,6 +1143,35 @@ def history_tuple_to_str(x):
     return '{0} {1}'.format(*x)
 
 
+_FORMATTER = string.Formatter()
+
+TEMPLATE_CACHE_SIZE = 256
+"""Number of parsed template strings to keep."""
+
+
+@functools.lru_cache(maxsize=TEMPLATE_CACHE_SIZE)
+def parse_template(template):
+    """Parses a format string, such as a prompt template, into a tuple of
+    (literal, field, spec, conv, raw) tuples, where the first four items are
+    as from string.Formatter().parse() and raw is the replacement field as
+    it appears in the template. The results are cached, so each template is
+    only parsed once. Raises a ValueError if the template is invalid.
+    """
+    ops = []
+    for literal, field, spec, conv in _FORMATTER.parse(template):
+        if field is None:
+            raw = None
+        else:
+            raw = '{' + field
+            if conv:
+                raw += '!' + conv
+            if spec:
+                raw += ':' + spec
+            raw += '}'
+        ops.append((literal, field, spec, conv, raw))
+    return tuple(ops)
+
+
 def format_color(string, **kwargs):
     """Formats strings that may contain colors. This simply dispatches to the
     shell instances method of the same name. The results of this function should
@@ -1512,7 +1550,7 @@ class CommandsCache(abc.Set):
             mtime = os.stat(path).st_mtime
             if mtime > max_mtime:
                 max_mtime = mtime
-        cache_valid = cache_valid and max_mtime > self._path_mtime
+        cache_valid = cache_valid and max_mtime <= self._path_mtime
         self._path_mtime = max_mtime
         if cache_valid:
             return self._cmds_cache
@@ -1545,6 +1583,115 @@ class CommandsCache(abc.Set):
         return len(self._cmds_cache)
 
 
+DirListing = collections.namedtuple('DirListing', ['names', 'dirs'])
+DirListing.__doc__ = """The cached contents of a directory.
+
+Attributes
+----------
+names : tuple of str
+    Sorted names of all of the entries in the directory.
+dirs : frozenset of str
+    Names of the entries which are directories, or links to directories.
+"""
+
+
+class DirListingCache(object):
+    """A cache of directory listings, shared by path completion and
+    globbing. Each listing is validated against the modification time of its
+    directory whenever it is used, so it costs a single stat() rather than a
+    full listing. The least recently used listings are evicted once more than
+    maxsize directories are cached.
+    """
+
+    racy_window = 2.0
+    """Listings of directories modified less than this many seconds before
+    they were listed are not reused, as further changes within the same
+    tick of the file system clock would not change the modification time.
+    """
+
+    def __init__(self, maxsize=128):
+        self.maxsize = maxsize
+        self._d = collections.OrderedDict()  # path -> (mtime, DirListing)
+        self._lock = threading.RLock()
+
+    def _lookup(self, path):
+        """Returns the key of a directory, its modification time, and its
+        cached listing if it is still valid, or None.
+        """
+        key = os.path.abspath(path)
+        mtime = os.stat(path).st_mtime
+        with self._lock:
+            cached = self._d.get(key)
+            if cached is not None and cached[0] == mtime:
+                self._d.move_to_end(key)
+                return key, mtime, cached[1]
+        return key, mtime, None
+
+    def _racy(self, mtime):
+        return time.time() - mtime <= self.racy_window
+
+    def entries(self, path):
+        """Returns the DirListing for a directory. Raises OSError if the
+        directory cannot be listed, just like os.listdir().
+        """
+        path = path or os.curdir
+        key, mtime, listing = self._lookup(path)
+        if listing is not None:
+            return listing
+        names = []
+        dirs = set()
+        for entry in scandir(path):
+            names.append(entry.name)
+            try:
+                if entry.is_dir():
+                    dirs.add(entry.name)
+            except OSError:
+                pass
+        names.sort()
+        listing = DirListing(tuple(names), frozenset(dirs))
+        with self._lock:
+            if not self._racy(mtime):
+                self._d[key] = (mtime, listing)
+                self._d.move_to_end(key)
+                while len(self._d) > self.maxsize:
+                    self._d.popitem(last=False)
+            else:
+                self._d.pop(key, None)
+        return listing
+
+    def listdir(self, path):
+        """Returns the sorted names of the entries in a directory."""
+        return self.entries(path).names
+
+    def isdir(self, path):
+        """Tests whether a path is a directory using the cached listing of its
+        parent directory, falling back to os.path.isdir(). A parent that was
+        modified too recently for its listing to be cached is not listed, as
+        it would be listed again for each of its entries.
+        """
+        head, tail = os.path.split(path)
+        if not tail:
+            return os.path.isdir(path)
+        try:
+            _, mtime, listing = self._lookup(head or os.curdir)
+            if listing is None:
+                if self._racy(mtime):
+                    return os.path.isdir(path)
+                listing = self.entries(head)
+            return tail in listing.dirs
+        except OSError:
+            return os.path.isdir(path)
+
+    def clear(self):
+        """Removes all of the cached listings."""
+        with self._lock:
+            self._d.clear()
+
+
+DIR_LISTING_CACHE = DirListingCache()
+"""The directory listing cache shared by completers and globbing."""
+
+
 WINDOWS_DRIVE_MATCHER = LazyObject(lambda: re.compile(r'^\w:'),
                                    globals(), 'WINDOWS_DRIVE_MATCHER')
 
@@ -1594,12 +1741,67 @@ def globpath(s, ignore_case=False, return_empty=False):
     return o if len(o) != 0 else no_match
 
 
+def _cached_glob_in_dir(dirname, pattern):
+    try:
+        names = DIR_LISTING_CACHE.listdir(dirname)
+    except OSError:
+        return []
+    head = pattern[:-1]
+    if pattern.endswith('*') and not glob.has_magic(head) and \
+            not ON_WINDOWS:
+        # case-sensitive prefix match, so bisect the sorted names
+        lo = bisect.bisect_left(names, head)
+        hi = bisect.bisect_left(names, head + '\U0010ffff', lo)
+        names = names[lo:hi]
+    if not pattern.startswith('.'):
+        names = [n for n in names if not n.startswith('.')]
+    return fnmatch.filter(names, pattern)
+
+
+def _cached_glob_literal(dirname, basename):
+    if basename == '':
+        if os.path.isdir(dirname):
+            return [basename]
+    elif os.path.lexists(os.path.join(dirname, basename)):
+        return [basename]
+    return []
+
+
+def cached_iglob(pathname):
+    """Non-recursive equivalent of glob.iglob() which lists directories
+    through the shared directory listing cache. Results are sorted within
+    each directory.
+    """
+    dirname, basename = os.path.split(pathname)
+    if not glob.has_magic(pathname):
+        if (basename and os.path.lexists(pathname)) or \
+                (not basename and os.path.isdir(dirname)):
+            yield pathname
+        return
+    if not dirname:
+        yield from _cached_glob_in_dir(os.curdir, basename)
+        return
+    if dirname != pathname and glob.has_magic(dirname):
+        dirs = cached_iglob(dirname)
+    else:
+        dirs = [dirname]
+    if glob.has_magic(basename):
+        glob_in_dir = _cached_glob_in_dir
+    else:
+        glob_in_dir = _cached_glob_literal
+    for d in dirs:
+        for name in glob_in_dir(d, basename):
+            yield os.path.join(d, name)
+
+
 def _iglobpath(s, ignore_case=False):
     s = builtins.__xonsh_expand_path__(s)
     if ignore_case:
         s = expand_case_matching(s)
+    if '**' not in s:
+        return cached_iglob(s), s
     if sys.version_info > (3, 5):
-        if '**' in s and '**/*' not in s:
+        if '**/*' not in s:
             s = s.replace('**', '**/*')
         # `recursive` is only a 3.5+ kwarg.
         return glob.iglob(s, recursive=True), s
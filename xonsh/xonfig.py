@@ -358,6 +358,45 @@ def _info(ns):
     return s
 
 
+def _cache_timings(timings, json_format=False):
+    if json_format:
+        data = [{'file': fname, 'cached': cached, 'seconds': t,
+                 'saved_seconds': saved}
+                for fname, cached, t, saved in timings]
+        return json.dumps(data, indent=1) + '\n'
+    data = [('file', 'cached', 'time', 'parse time saved')]
+    total = net_saved = 0.0
+    for fname, cached, t, saved in timings:
+        data.append((fname, 'yes' if cached else 'no',
+                     '{0:.1f} ms'.format(1e3 * t),
+                     '{0:.1f} ms'.format(1e3 * saved) if cached else ''))
+        total += t
+        net_saved += saved - t if cached else 0.0
+    data.append(('total', '', '{0:.1f} ms'.format(1e3 * total),
+                 '{0:.1f} ms'.format(1e3 * net_saved)))
+    widths = [max(len(row[i]) for row in data) for i in range(4)]
+    hr = '+' + '+'.join('-' * (w + 2) for w in widths) + '+\n'
+    s = hr
+    for i, row in enumerate(data):
+        s += '| ' + ' | '.join(c.ljust(w) for c, w in zip(row, widths))
+        s += ' |\n'
+        if i == 0 or i == len(data) - 2:
+            s += hr
+    return s + hr
+
+
+def _cache(ns):
+    from xonsh.codecache import code_cache
+    cache = code_cache()
+    if ns.clear:
+        cache.clear()
+    if ns.timings:
+        return _cache_timings(cache.timings, ns.json)
+    formatter = _xonfig_format_json if ns.json else _xonfig_format_human
+    s = formatter(cache.stats())
+    return s
+
+
 def _styles(ns):
     env = builtins.__xonsh_env__
     curr = env.get('XONSH_COLOR_STYLE')
@@ -450,6 +489,15 @@ def _xonfig_create_parser():
                      help='reports results as json')
     clrs = subp.add_parser('colors', help=('displays the color palette for '
                                            'the current xonsh color style'))
+    cache = subp.add_parser('cache', help=('displays statistics of the '
+                                           'compiled code cache'))
+    cache.add_argument('--json', action='store_true', default=False,
+                       help='reports results as json')
+    cache.add_argument('--clear', action='store_true', default=False,
+                       help='removes all of the cached code first')
+    cache.add_argument('--timings', action='store_true', default=False,
+                       help='displays how long recent compilations took, '
+                            'and the parse time the cache saved')
     return p
 
 
@@ -458,6 +506,7 @@ _XONFIG_MAIN_ACTIONS = {
     'wizard': _wizard,
     'styles': _styles,
     'colors': _colors,
+    'cache': _cache,
     }
 
 def xonfig_main(args=None):
@@ -1,11 +1,23 @@
 """Matplotlib hooks, for what its worth."""
+import sys
 import shutil
+import builtins
 
 import numpy as np
 import matplotlib
 import matplotlib.pyplot as plt
 
 from xonsh.tools import print_color, ON_WINDOWS
+from xonsh.ansi_colors import rgbs_to_256
+
+HALF_BLOCK = '\u2580'
+"""Upper half block character. Its foreground color is the top pixel of a
+character cell, and its background color is the bottom pixel.
+"""
+
+RESET = '\033[0m'
+FG_256 = ['38;5;{0}'.format(i) for i in range(256)]
+BG_256 = ['48;5;{0}'.format(i) for i in range(256)]
 
 def figure_to_rgb_array(fig, width, height):
     """Converts figure to a numpy array of rgb values
@@ -27,7 +39,7 @@ def figure_to_rgb_array(fig, width, height):
 
     # Draw the renderer and get the RGB buffer from the figure
     fig.canvas.draw()
-    buf = np.fromstring(fig.canvas.tostring_rgb(), dtype=np.uint8)
+    buf = np.frombuffer(fig.canvas.tostring_rgb(), dtype=np.uint8)
     buf.shape = (height, width, 3)
 
     # clean up and return
@@ -54,12 +66,119 @@ def buf_to_color_str(buf):
     return ''.join(pixels)
 
 
-def show():
+def _truecolor_codes(base, colors):
+    """Formats an array of 24 bit colors, packed as 0xrrggbb, into a list of
+    SGR color codes. Each distinct color is only formatted once.
+    """
+    fmt = base + ';2;{0};{1};{2}'
+    uniq, inverse = np.unique(colors, return_inverse=True)
+    codes = [fmt.format(c >> 16, (c >> 8) & 0xff, c & 0xff)
+             for c in uniq.tolist()]
+    return [codes[i] for i in inverse.tolist()]
+
+
+def buf_to_ansi(buf, truecolor=False, half_blocks=True):
+    """Converts an RGB array to a string of text with ANSI escape sequences,
+    which shows the image in a terminal.
+
+    Parameters
+    ----------
+    buf : numpy.ndarray
+        Array of RGB values, with shape (height, width, 3).
+    truecolor : bool, optional
+        Whether to use 24 bit colors, rather than the closest ANSI 256
+        colors.
+    half_blocks : bool, optional
+        Whether to show two rows of pixels in each line of text, with half
+        block characters. Otherwise, each pixel is a space character.
+
+    Returns
+    -------
+    s : str
+        The text, with one line per character row, and no trailing newline.
+    """
+    buf = np.asarray(buf)
+    if truecolor:
+        buf = buf.astype(np.uint32)
+        colors = (buf[..., 0] << 16) | (buf[..., 1] << 8) | buf[..., 2]
+    else:
+        colors = rgbs_to_256(buf)
+    if half_blocks:
+        fg, bg = colors[0::2], colors[1::2]
+        if len(bg) < len(fg):
+            bg = np.concatenate([bg, fg[-1:]])
+        char = HALF_BLOCK
+    else:
+        fg, bg = None, colors
+        char = ' '
+    height, width = bg.shape
+    if width == 0 or height == 0:
+        return ''
+    # a run of cells with the same colors starts wherever the colors differ
+    # from those of the previous cell, and at the start of every line
+    changed = np.empty(bg.shape, dtype=bool)
+    changed[:, 0] = True
+    changed[:, 1:] = bg[:, 1:] != bg[:, :-1]
+    if fg is not None:
+        changed[:, 1:] |= fg[:, 1:] != fg[:, :-1]
+    starts = np.flatnonzero(changed)
+    lengths = np.diff(np.append(starts, changed.size)).tolist()
+    newlines = (starts % width == 0).tolist()
+    bgs = bg.ravel()[starts]
+    if truecolor:
+        bgs = _truecolor_codes('48', bgs)
+    else:
+        bgs = [BG_256[c] for c in bgs.tolist()]
+    if fg is None:
+        escs = ['\033[' + b + 'm' for b in bgs]
+    else:
+        fgs = fg.ravel()[starts]
+        if truecolor:
+            fgs = _truecolor_codes('38', fgs)
+        else:
+            fgs = [FG_256[c] for c in fgs.tolist()]
+        escs = ['\033[' + f + ';' + b + 'm' for f, b in zip(fgs, bgs)]
+    out = []
+    for newline, esc, n in zip(newlines, escs, lengths):
+        if newline and out:
+            out.append(RESET + '\n')
+        out.append(esc)
+        out.append(char * n)
+    out.append(RESET)
+    return ''.join(out)
+
+
+def _supports_truecolor():
+    env = getattr(builtins, '__xonsh_env__', {})
+    return env.get('COLORTERM', '') in ('truecolor', '24bit')
+
+
+def show(truecolor=None, half_blocks=True):
+    """Shows the current figure in the terminal.
+
+    Parameters
+    ----------
+    truecolor : bool or None, optional
+        Whether to use 24 bit colors. By default, they are used if
+        $COLORTERM is ``truecolor`` or ``24bit``.
+    half_blocks : bool, optional
+        Whether to show two rows of pixels in each line of text.
+    """
     fig = plt.gcf()
     w, h = shutil.get_terminal_size()
+    h -= 1  # leave space for next prompt
     if ON_WINDOWS:
         w -= 1  # @melund reports that win terminals are too thin
-    h -= 1  # leave space for next prompt
+        # the console may not understand escape sequences, so let the shell
+        # translate the colors
+        buf = figure_to_rgb_array(fig, w, h)
+        print_color(buf_to_color_str(buf))
+        return
+    if truecolor is None:
+        truecolor = _supports_truecolor()
+    if half_blocks:
+        h *= 2
     buf = figure_to_rgb_array(fig, w, h)
-    s = buf_to_color_str(buf)
-    print_color(s)
+    s = buf_to_ansi(buf, truecolor=truecolor, half_blocks=half_blocks)
+    sys.stdout.write(s + '\n')
+    sys.stdout.flush()